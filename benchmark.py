@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Validation Throughput Benchmark
+Runs each bulk validation mode against the local mock provider server and
+reports keys/sec plus p50/p95/p99 per-key latency for every concurrency level.
+
+Results can be saved and later compared against, so every performance change
+can be measured against a fixed baseline:
+  python benchmark.py --keys 500 --latency 50 --output baseline.json
+  python benchmark.py --keys 500 --latency 50 --baseline baseline.json
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+
+from mock_providers import add_config_arguments, config_from_args, start_server
+
+# Rate limits are lifted by default so the benchmark measures the validators, not the pacing
+UNLIMITED_RATES = "openai=1000000,facebook=1000000,sentry=1000000"
+
+
+def make_secrets(provider, count):
+    """Generate well-formed, unique fake secrets that pass the offline pre-checks."""
+    secrets = []
+    for i in range(count):
+        digest = hashlib.sha256(f"{provider}-{i}".encode()).hexdigest()
+        if provider == "openai":
+            secrets.append(f"sk-proj-{digest[:48]}")
+        elif provider == "facebook":
+            secrets.append(f"EAA{digest}{digest[:40]}")
+        else:
+            secrets.append(f"sntryu_{digest}")
+    return secrets
+
+
+def run_openai_models(secrets, concurrency):
+    import test_openai_key
+    return test_openai_key.check_keys(secrets, concurrency=concurrency)
+
+
+def run_facebook_batch(secrets, concurrency):
+    import test_facebook_key
+    return test_facebook_key.check_tokens(secrets)
+
+
+def run_facebook_individual(secrets, concurrency):
+    import test_facebook_key
+    import transport
+    with transport.client("facebook") as session:
+        return [test_facebook_key.check_token_individually(session, token) for token in secrets]
+
+
+def run_sentry(secrets, concurrency):
+    import test_sentry_key
+    return test_sentry_key.check_tokens(secrets, concurrency=concurrency)
+
+
+def run_engine(provider):
+    """Runner for a provider spec on the shared validation engine."""
+    def runner(secrets, concurrency):
+        from validation_engine import ValidationEngine
+        engine = ValidationEngine(concurrency)
+        try:
+            return engine.run(engine.check(provider, secrets))
+        finally:
+            engine.close()
+    return runner
+
+
+# name: (provider, runner, whether the runner honours the concurrency level)
+MODES = {
+    "openai-models": ("openai", run_openai_models, True),
+    "facebook-batch": ("facebook", run_facebook_batch, False),
+    "facebook-individual": ("facebook", run_facebook_individual, False),
+    "facebook-engine": ("facebook", run_engine("facebook"), True),
+    "sentry": ("sentry", run_sentry, True),
+}
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def run_mode(name, count, concurrency):
+    provider, runner, _ = MODES[name]
+    secrets = make_secrets(provider, count)
+    started = time.monotonic()
+    results = runner(secrets, concurrency)
+    duration = time.monotonic() - started
+
+    latencies = sorted(result.get("elapsed", 0.0) for result in results)
+    statuses = {}
+    for result in results:
+        statuses[result["status"]] = statuses.get(result["status"], 0) + 1
+    return {
+        "mode": name,
+        "concurrency": concurrency,
+        "keys": len(results),
+        "duration": duration,
+        "keys_per_sec": len(results) / duration if duration else 0.0,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "statuses": statuses,
+    }
+
+
+def print_table(rows, baseline=None):
+    baseline_rows = {(row["mode"], row["concurrency"]): row for row in baseline or []}
+    print(f"\n  {'Mode':<22}{'Conc':>6}{'Keys':>7}{'Keys/sec':>11}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}  vs baseline")
+    for row in rows:
+        line = (f"  {row['mode']:<22}{row['concurrency']:>6}{row['keys']:>7}{row['keys_per_sec']:>11.1f}"
+                f"{row['p50_ms']:>9.1f}{row['p95_ms']:>9.1f}{row['p99_ms']:>9.1f}")
+        previous = baseline_rows.get((row["mode"], row["concurrency"]))
+        if previous and previous["keys_per_sec"]:
+            change = (row["keys_per_sec"] / previous["keys_per_sec"] - 1) * 100
+            line += f"  {change:+.1f}% keys/sec"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the bulk validation modes against mock providers.")
+    parser.add_argument("--keys", type=int, default=200, help="secrets per run (default: 200)")
+    parser.add_argument("--concurrency", default="1,10,50",
+                        help="comma-separated concurrency levels (default: 1,10,50)")
+    parser.add_argument("--modes", default=",".join(MODES),
+                        help=f"comma-separated modes to run (default: {','.join(MODES)})")
+    parser.add_argument("--rate-limits", default=UNLIMITED_RATES,
+                        help="value for SECRET_TESTER_RATE_LIMITS during the run (default: effectively unlimited)")
+    parser.add_argument("--hedge", action="store_true",
+                        help="hedge read-only probes that are slower than p95 (see tail_latency.py)")
+    parser.add_argument("--output", metavar="FILE", help="write the results as JSON")
+    parser.add_argument("--baseline", metavar="FILE", help="compare against results saved with --output")
+    add_config_arguments(parser)
+    args = parser.parse_args()
+
+    modes = [mode.strip() for mode in args.modes.split(",") if mode.strip()]
+    unknown = [mode for mode in modes if mode not in MODES]
+    if unknown:
+        print(f"✗ Unknown mode(s): {', '.join(unknown)}")
+        sys.exit(1)
+    levels = [max(1, int(level)) for level in args.concurrency.split(",")]
+
+    print("=" * 60)
+    print("Validation Throughput Benchmark")
+    print("=" * 60)
+
+    print("\n[Step 1] Starting mock provider server...")
+    server = start_server(config_from_args(args))
+    base_url = f"http://127.0.0.1:{server.server_port}"
+    os.environ["OPENAI_BASE_URL"] = f"{base_url}/v1"
+    os.environ["FACEBOOK_GRAPH_URL"] = base_url
+    os.environ["SENTRY_URL"] = base_url
+    os.environ["SECRET_TESTER_RATE_LIMITS"] = args.rate_limits
+    if args.hedge:
+        import tail_latency
+        tail_latency.enable_hedging()
+    print(f"✓ Mock providers listening on {base_url} (latency: {args.latency:g} ms)")
+
+    print(f"\n[Step 2] Running {len(modes)} mode(s) with {args.keys} key(s) each...")
+    rows = []
+    for mode in modes:
+        for level in (levels if MODES[mode][2] else [1]):
+            row = run_mode(mode, args.keys, level)
+            print(f"✓ {mode} (concurrency {level}): {row['keys_per_sec']:.1f} keys/sec")
+            rows.append(row)
+    server.shutdown()
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+
+    print("\n" + "=" * 60)
+    print("📊 BENCHMARK RESULTS")
+    print("=" * 60)
+    print_table(rows, baseline)
+    print("=" * 60)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"config": {key: value for key, value in vars(args).items()
+                                  if key not in ("output", "baseline")},
+                       "results": rows}, f, indent=2)
+        print(f"\n✓ Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
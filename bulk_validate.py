@@ -0,0 +1,369 @@
+#!/usr/bin/env python3
+"""
+Sharded, Resumable Bulk Validation
+Validates very large secret inventories with the shared validation engine,
+split across processes and hosts.
+
+Secrets are partitioned by a hash of their value, so every host can read the
+same inventory and pick out its own shard without coordination. Within a host
+the shard is split again between worker processes. Every verdict is appended
+to a per-worker journal as soon as it is known; a crashed or preempted run is
+simply started again with the same arguments and skips everything already
+journaled. Journals never contain secrets, only a salted hash and the
+redacted prefix.
+
+Usage:
+  # host 3 of 16, eight processes
+  python bulk_validate.py run inventory.txt --journal-dir runs/audit --shard 3/16 --processes 8
+  # after every shard has finished (journal directories copied together)
+  python bulk_validate.py merge runs/audit --output results.jsonl
+
+While a provider is down (see circuit_breaker.py) its secrets are parked
+instead of journaled and retried at the end of the part, once the provider
+answers again; any still unchecked are journaled as unavailable and picked up
+by the next run.
+
+Input has one secret per line. With the default `--provider auto` each secret
+is assigned to the provider whose offline pre-check it passes; lines matching
+no provider are skipped.
+"""
+
+import argparse
+import glob
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import circuit_breaker
+from precheck import detect_provider
+from provider_specs import SPECS
+from result_cache import result_metadata
+from secret_io import ACTIVE_STATUSES, STATUS_ERROR, STATUS_UNAVAILABLE, UNRESOLVED_STATUSES, redact
+
+PROVIDERS = tuple(SPECS)
+DEFAULT_CHUNK_SIZE = 500
+DEFAULT_CONCURRENCY = 10
+SALT_NAME = "journal.salt"
+
+
+def parse_shard(value):
+    """Parse 'i/N' into (i, N) with 0 <= i < N."""
+    index, _, count = value.partition("/")
+    try:
+        index, count = int(index), int(count)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected i/N, got '{value}'")
+    if count < 1 or not 0 <= index < count:
+        raise argparse.ArgumentTypeError(f"shard index must be between 0 and {count - 1}")
+    return index, count
+
+
+def partition_hash(secret):
+    """Stable, unsalted hash used to assign a secret to a shard; identical on every host."""
+    return int.from_bytes(hashlib.sha256(secret.encode()).digest()[:8], "big")
+
+
+def load_salt(journal_dir):
+    """Return the journal directory's salt, creating it on first use (safe across processes)."""
+    path = os.path.join(journal_dir, SALT_NAME)
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        # Another worker may still be writing it
+        for _ in range(50):
+            with open(path, "rb") as f:
+                salt = f.read()
+            if len(salt) == 32:
+                return salt
+            time.sleep(0.1)
+        raise RuntimeError(f"corrupt journal salt: {path}")
+    salt = secrets.token_bytes(32)
+    with os.fdopen(fd, "wb") as f:
+        f.write(salt)
+    return salt
+
+
+def record_id(salt, provider, secret):
+    return hmac.new(salt, f"{provider}:{secret}".encode(), hashlib.sha256).hexdigest()[:32]
+
+
+def journal_path(journal_dir, shard, part):
+    (index, count), (part_index, part_count) = shard, part
+    return os.path.join(journal_dir, f"shard-{index:04d}-of-{count:04d}.part-{part_index:03d}-of-{part_count:03d}.jsonl")
+
+
+def iter_journal(path):
+    """Yield the records of one journal, skipping a line torn by a crash mid-write."""
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+
+def load_done(journal_dir, shard, retry_errors=False):
+    """IDs already journaled for a shard, by any earlier worker layout."""
+    index, count = shard
+    done = set()
+    for path in glob.glob(os.path.join(journal_dir, f"shard-{index:04d}-of-{count:04d}.*.jsonl")):
+        for record in iter_journal(path):
+            if record["status"] == STATUS_UNAVAILABLE or (retry_errors and record["status"] == STATUS_ERROR):
+                continue
+            done.add(record["id"])
+    return done
+
+
+def iter_assigned(source, provider, shard, part):
+    """Yield (provider, secret) for the input lines that belong to this shard and part."""
+    (index, count), (part_index, part_count) = shard, part
+    with open(source, encoding="utf-8") as f:
+        for line in f:
+            secret = line.strip()
+            if not secret or secret.startswith("#"):
+                continue
+            value = partition_hash(secret)
+            if value % count != index or (value // count) % part_count != part_index:
+                continue
+            secret_provider = provider if provider != "auto" else detect_provider(secret)
+            if secret_provider is not None:
+                yield secret_provider, secret
+
+
+class Validator:
+    """Runs chunks of secrets through the shared validation engine, keeping its pools warm.
+
+    Facebook tokens go through the Graph API batch requests of
+    test_facebook_key.py instead, which check 25 tokens per round trip.
+    """
+
+    def __init__(self, concurrency):
+        from validation_engine import ValidationEngine
+        self.engine = ValidationEngine(concurrency)
+        self.facebook_session = None
+
+    def check(self, provider, secret_values, on_result, outage_wait=0):
+        """Validate secrets; those whose provider is down are reported unavailable after `outage_wait` seconds."""
+        if provider == "facebook":
+            import test_facebook_key
+            import transport
+            if self.facebook_session is None:
+                self.facebook_session = transport.client(provider)
+            test_facebook_key.check_tokens(secret_values, session=self.facebook_session, on_result=on_result,
+                                           outage_wait=outage_wait)
+        else:
+            self.engine.run(self.engine.check(provider, secret_values, on_result, outage_wait))
+
+    def close(self):
+        self.engine.close()
+        if self.facebook_session is not None:
+            self.facebook_session.close()
+
+
+def run_part(source, journal_dir, provider, shard, part, concurrency, chunk_size, retry_errors, processes):
+    """Validate one part of one shard; runs inside a worker process."""
+    import rate_limiter
+    rate_limiter.share_rates(processes)
+
+    salt = load_salt(journal_dir)
+    done = load_done(journal_dir, shard, retry_errors)
+    label = f"shard {shard[0]}/{shard[1]} part {part[0]}/{part[1]}"
+    counts = {"skipped": 0}
+    validator = Validator(concurrency)
+
+    # Secrets whose provider was down, retried once everything else is done
+    parked = {name: [] for name in PROVIDERS}
+
+    with open(journal_path(journal_dir, shard, part), "a", encoding="utf-8", buffering=1) as journal:
+        def journal_result(result):
+            secret = result["secret"]
+            record = {"id": record_id(salt, result["provider"], secret), "provider": result["provider"],
+                      "prefix": redact(secret), "status": result["status"], **result_metadata(result)}
+            journal.write(json.dumps(record) + "\n")
+            done.add(record["id"])
+            counts[result["status"]] = counts.get(result["status"], 0) + 1
+
+        def on_result(result):
+            if result["status"] == STATUS_UNAVAILABLE:
+                parked[result["provider"]].append(result["secret"])
+            else:
+                journal_result(result)
+
+        def flush(pending):
+            for chunk_provider, chunk in pending.items():
+                if chunk:
+                    validator.check(chunk_provider, chunk, on_result)
+            validated = sum(count for status, count in counts.items() if status != "skipped")
+            print(f"  [{label}] {validated} validated, {counts['skipped']} already journaled", flush=True)
+
+        pending = {name: [] for name in PROVIDERS}
+        queued = set()
+        try:
+            for secret_provider, secret in iter_assigned(source, provider, shard, part):
+                identifier = record_id(salt, secret_provider, secret)
+                if identifier in done or identifier in queued:
+                    counts["skipped"] += 1
+                    continue
+                queued.add(identifier)
+                pending[secret_provider].append(secret)
+                if sum(len(chunk) for chunk in pending.values()) >= chunk_size:
+                    flush(pending)
+                    pending = {name: [] for name in PROVIDERS}
+                    queued.clear()
+            flush(pending)
+
+            for chunk_provider, chunk in parked.items():
+                if chunk:
+                    print(f"  [{label}] retrying {len(chunk)} {chunk_provider} secret(s) parked during an outage",
+                          flush=True)
+                    validator.check(chunk_provider, chunk, journal_result, circuit_breaker.OUTAGE_WAIT)
+        finally:
+            validator.close()
+    return counts
+
+
+def print_counts(title, counts):
+    print("\n" + "=" * 60)
+    print(title)
+    print("=" * 60)
+    for status, count in sorted(counts.items()):
+        print(f"  {status}: {count}")
+    print("=" * 60)
+
+
+def run(args):
+    print("=" * 60)
+    print("Sharded Bulk Validation")
+    print("=" * 60)
+
+    print("\n[Step 1] Loading environment variables from .env file...")
+    try:
+        from dotenv import load_dotenv
+        load_dotenv()
+        print("✓ Environment variables loaded from .env file")
+    except ImportError:
+        print("⚠ python-dotenv package not found, using the process environment only")
+
+    if not os.path.isfile(args.input):
+        print(f"✗ Input not found: {args.input}")
+        sys.exit(1)
+    os.makedirs(args.journal_dir, exist_ok=True)
+    load_salt(args.journal_dir)
+
+    shard = args.shard
+    processes = max(1, args.processes)
+    print(f"\n[Step 2] Validating shard {shard[0]}/{shard[1]} of {args.input} with {processes} process(es)...")
+    print(f"  Journals: {args.journal_dir}")
+
+    totals = {}
+    worker_args = [(args.input, args.journal_dir, args.provider, shard, (part, processes),
+                    max(1, args.concurrency), max(1, args.chunk_size), args.retry_errors, processes)
+                   for part in range(processes)]
+    if processes == 1:
+        results = [run_part(*worker_args[0])]
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            futures = [executor.submit(run_part, *arguments) for arguments in worker_args]
+            results = [future.result() for future in as_completed(futures)]
+    for counts in results:
+        for status, count in counts.items():
+            totals[status] = totals.get(status, 0) + count
+
+    print_counts("🔑 SHARD SUMMARY", totals)
+    if totals.get(STATUS_UNAVAILABLE):
+        print(f"\n⚠ {totals[STATUS_UNAVAILABLE]} secret(s) were not checked because their provider was down; "
+              "rerun to check them")
+    if totals.get(STATUS_ERROR):
+        print(f"\n⚠ {totals[STATUS_ERROR]} secret(s) could not be checked; rerun with --retry-errors")
+    if totals.get(STATUS_UNAVAILABLE) or totals.get(STATUS_ERROR):
+        sys.exit(1)
+
+
+def merge(args):
+    """Combine every journal in the given directories into one result per secret.
+
+    A verdict beats an error or an unavailable provider for the same secret;
+    otherwise the later record wins. Only the position of each winning record
+    is held in memory.
+    """
+    print("=" * 60)
+    print("Merging Bulk Validation Journals")
+    print("=" * 60)
+
+    paths = sorted(path for directory in args.journal_dirs
+                   for path in glob.glob(os.path.join(directory, "shard-*.jsonl")))
+    if not paths:
+        print("✗ No journals found")
+        sys.exit(1)
+    print(f"\n[Step 1] Indexing {len(paths)} journal(s)...")
+
+    winners = {}
+    for file_index, path in enumerate(paths):
+        for line_index, record in enumerate(iter_journal(path)):
+            is_error = record["status"] in UNRESOLVED_STATUSES
+            previous = winners.get(record["id"])
+            if previous is None or is_error <= previous[2]:
+                winners[record["id"]] = (file_index, line_index, is_error)
+    print(f"✓ {len(winners)} unique secret(s)")
+
+    print(f"\n[Step 2] Writing {args.output}...")
+    keep = {(file_index, line_index) for file_index, line_index, _ in winners.values()}
+    del winners
+    counts = {}
+    with open(args.output, "w", encoding="utf-8") as output:
+        for file_index, path in enumerate(paths):
+            for line_index, record in enumerate(iter_journal(path)):
+                if (file_index, line_index) in keep:
+                    output.write(json.dumps(record) + "\n")
+                    key = f"{record['provider']} {record['status']}"
+                    counts[key] = counts.get(key, 0) + 1
+
+    print_counts("🔑 MERGED SUMMARY", counts)
+    active = sum(count for key, count in counts.items() if key.split(" ")[1] in ACTIVE_STATUSES)
+    print(f"\n✓ {active} active secret(s) written to {args.output}")
+
+
+def main():
+    import transport
+
+    parser = argparse.ArgumentParser(description="Validate large secret inventories in resumable shards.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="validate one shard of an inventory")
+    run_parser.add_argument("input", help="file with one secret per line")
+    run_parser.add_argument("--journal-dir", required=True, help="directory for the append-only journals")
+    run_parser.add_argument("--shard", type=parse_shard, default=(0, 1), metavar="i/N",
+                            help="only validate the secrets that hash into shard i of N (default: 0/1)")
+    run_parser.add_argument("--processes", type=int, default=1,
+                            help="worker processes splitting this shard (default: 1); provider rate limits are shared between them")
+    run_parser.add_argument("--provider", choices=("auto",) + PROVIDERS, default="auto",
+                            help="provider of every secret, or 'auto' to detect it per secret (default: auto)")
+    run_parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                            help=f"secrets checked at once per process (default: {DEFAULT_CONCURRENCY})")
+    run_parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE,
+                            help=f"secrets validated per round; bounds memory (default: {DEFAULT_CHUNK_SIZE})")
+    run_parser.add_argument("--retry-errors", action="store_true",
+                            help="validate again secrets whose journaled result is an error")
+    transport.add_transport_arguments(run_parser)
+
+    merge_parser = subparsers.add_parser("merge", help="combine shard journals into one result file")
+    merge_parser.add_argument("journal_dirs", nargs="+", help="journal directories to merge")
+    merge_parser.add_argument("--output", required=True, help="JSON-lines file to write")
+
+    args = parser.parse_args()
+    if args.command == "run":
+        if args.ca_bundle:
+            # Exported to the environment, so every worker process picks it up
+            transport.set_ca_bundle(args.ca_bundle)
+        run(args)
+    else:
+        merge(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Per-Host Circuit Breakers
+Stops bulk validation from hammering a provider that is down.
+
+Every provider host (graph.facebook.com, sentry.io, a self-hosted Sentry, ...)
+gets one breaker per process. After FAILURE_THRESHOLD consecutive connection
+errors, timeouts or 5xx responses the breaker opens and calls to that host fail
+straight away with ProviderUnavailable instead of each waiting out a timeout.
+Once the open period has passed a single probe request is let through: if it
+succeeds the breaker closes again, otherwise it stays open for twice as long
+(up to MAX_OPEN_SECONDS).
+
+Secrets that could not be checked because the provider failed to answer, or
+because its breaker was open, are reported as STATUS_UNAVAILABLE ("unknown,
+provider unavailable") rather than as errors. Bulk runs park them and retry
+them whenever the breaker lets a request through, for up to OUTAGE_WAIT
+seconds (SECRET_TESTER_OUTAGE_WAIT overrides it).
+"""
+
+import os
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+
+from secret_io import STATUS_UNAVAILABLE
+
+FAILURE_THRESHOLD = 5
+OPEN_SECONDS = 15.0
+MAX_OPEN_SECONDS = 240.0
+
+# How long a bulk run keeps parked secrets waiting for their provider to come back
+OUTAGE_WAIT = float(os.getenv("SECRET_TESTER_OUTAGE_WAIT", "300"))
+# Parked secrets look at their host's circuit this often, so they resume soon after it closes
+PARK_POLL = 1.0
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+
+class ProviderUnavailable(Exception):
+    """Raised instead of making a request while a host's breaker is open."""
+
+    def __init__(self, host, retry_in):
+        super().__init__(f"{host} is unavailable, next probe in {retry_in:.0f}s")
+        self.host = host
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    """Thread-safe breaker counting consecutive failures of one host."""
+
+    def __init__(self, host, threshold=FAILURE_THRESHOLD, open_seconds=OPEN_SECONDS):
+        self.host = host
+        self.threshold = threshold
+        self.base_open_seconds = open_seconds
+        self.open_seconds = open_seconds
+        self.state = CLOSED
+        self.failures = 0
+        self.retry_at = 0.0
+        self.trips = 0
+        self.rejected = 0
+        self.lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        return self.state != CLOSED
+
+    def retry_in(self):
+        """Seconds until a request may be sent again (0 while closed)."""
+        with self.lock:
+            if self.state == CLOSED:
+                return 0.0
+            return max(0.0, self.retry_at - time.monotonic())
+
+    def allow(self):
+        """Whether a request may go out now; the first one after the open period is the probe."""
+        with self.lock:
+            if self.state == CLOSED:
+                return True
+            now = time.monotonic()
+            # A probe that never reported back does not block the host for good
+            if now >= self.retry_at:
+                self.state = HALF_OPEN
+                self.retry_at = now + self.open_seconds
+                return True
+            self.rejected += 1
+            return False
+
+    def check(self):
+        if not self.allow():
+            raise ProviderUnavailable(self.host, self.retry_in())
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            if self.state != CLOSED:
+                self.state = CLOSED
+                self.open_seconds = self.base_open_seconds
+                print(f"✓ {self.host} is answering again, circuit closed", file=sys.stderr)
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.state == HALF_OPEN:
+                # The probe failed: stay away for longer
+                self.open_seconds = min(self.open_seconds * 2, MAX_OPEN_SECONDS)
+            elif self.state == OPEN or self.failures < self.threshold:
+                return
+            else:
+                self.trips += 1
+                print(f"⚠ {self.host} failed {self.failures} times in a row, "
+                      f"circuit open for {self.open_seconds:.0f}s", file=sys.stderr)
+            self.state = OPEN
+            self.retry_at = time.monotonic() + self.open_seconds
+
+    def record(self, status_code):
+        if status_code >= 500:
+            self.record_failure()
+        else:
+            self.record_success()
+
+    def stats(self):
+        with self.lock:
+            return {"state": self.state, "trips": self.trips, "rejected": self.rejected}
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def host_of(url):
+    return urlsplit(url).netloc or url
+
+
+def get_breaker(url):
+    """Return the process-wide breaker for the host of a URL."""
+    host = host_of(url)
+    with _breakers_lock:
+        if host not in _breakers:
+            _breakers[host] = CircuitBreaker(host)
+        return _breakers[host]
+
+
+def guarded(url, call, network_errors):
+    """Run a request through the host's breaker; `network_errors` are the exceptions that count as failures."""
+    breaker = get_breaker(url)
+    breaker.check()
+    try:
+        response = call()
+    except network_errors:
+        breaker.record_failure()
+        raise
+    breaker.record(response.status_code)
+    return response
+
+
+async def guarded_async(url, make_call, network_errors):
+    breaker = get_breaker(url)
+    breaker.check()
+    try:
+        response = await make_call()
+    except network_errors:
+        breaker.record_failure()
+        raise
+    breaker.record(response.status_code)
+    return response
+
+
+def unavailable_result(secret, provider, reason=None):
+    return {"secret": secret, "provider": provider, "status": STATUS_UNAVAILABLE,
+            "error": reason or "Provider unavailable"}
+
+
+def parked_delay(url, deadline):
+    """How long a parked secret should sleep before checking its host again.
+
+    0 means a request may go out now (the circuit closed, or a probe is due);
+    None means the deadline has passed and the secret stays unavailable.
+    """
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        return None
+    retry_in = get_breaker(url).retry_in()
+    if retry_in <= 0:
+        return 0.0
+    return min(remaining, retry_in, PARK_POLL)
+
+
+def wait_for(url, deadline):
+    """Block until a request to the host of `url` may go out again; False once the deadline has passed."""
+    while True:
+        delay = parked_delay(url, deadline)
+        if delay is None:
+            return False
+        if not delay:
+            return True
+        time.sleep(delay)
+
+
+def outage_summary():
+    """One line per host whose breaker opened during the run, for the end-of-run output."""
+    with _breakers_lock:
+        breakers = dict(_breakers)
+    lines = []
+    for host, breaker in sorted(breakers.items()):
+        stats = breaker.stats()
+        if stats["trips"]:
+            lines.append(f"{host}: circuit opened {stats['trips']} time(s), "
+                         f"{stats['rejected']} request(s) held back, now {stats['state']}")
+    return lines
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+Candidate Deduplication Index
+Persistent record of every candidate secret the scanners have seen, so a key
+that appears thousands of times in logs and repositories is validated once.
+
+Candidates are stored as HMAC-SHA256 hashes with a random per-index salt,
+never in the clear, together with their redacted prefix, occurrence counts
+and where they were found (up to MAX_LOCATIONS per scan). A Bloom filter kept in memory (and saved
+with the index) answers "never seen" without touching the disk; only possible
+repeats are confirmed against the exact SQLite set, and repeats within a scan
+are counted in memory and written in batches. Memory grows with the number of
+unique secrets in a scan, never with the size of the input.
+
+The index lives in ~/.cache/secret-tester/dedupe.sqlite unless
+SECRET_TESTER_INDEX points elsewhere.
+"""
+
+import hashlib
+import hmac
+import math
+import os
+import secrets
+import sqlite3
+import time
+
+from secret_io import redact
+
+DEFAULT_INDEX_PATH = os.path.join(os.path.expanduser("~"), ".cache", "secret-tester", "dedupe.sqlite")
+
+# The Bloom filter is sized for this many secrets and doubled whenever it fills up
+DEFAULT_CAPACITY = 1_000_000
+FALSE_POSITIVE_RATE = 0.001
+
+# Locations recorded per secret and run; occurrences beyond this are only counted
+MAX_LOCATIONS = 100
+
+# Writes are committed in batches of this many occurrences
+COMMIT_EVERY = 10_000
+
+# What add() found out about an occurrence
+OCCURRENCE_NEW = "new"          # never seen in any run
+OCCURRENCE_KNOWN = "known"      # first time in this run, seen in an earlier one
+OCCURRENCE_REPEAT = "repeat"    # already seen in this run
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS secrets (
+    secret_hash TEXT PRIMARY KEY,
+    provider TEXT NOT NULL,
+    prefix TEXT NOT NULL,
+    first_seen REAL NOT NULL,
+    last_seen REAL NOT NULL,
+    occurrences INTEGER NOT NULL,
+    last_run INTEGER NOT NULL,
+    run_occurrences INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS locations (
+    secret_hash TEXT NOT NULL,
+    location TEXT NOT NULL,
+    seen_at REAL NOT NULL,
+    PRIMARY KEY (secret_hash, location)
+) WITHOUT ROWID;
+"""
+
+
+def default_index_path():
+    return os.getenv("SECRET_TESTER_INDEX", DEFAULT_INDEX_PATH)
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over 32-byte digests, using double hashing."""
+
+    def __init__(self, capacity, error_rate=FALSE_POSITIVE_RATE):
+        self.capacity = capacity
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, digest):
+        first = int.from_bytes(digest[:8], "big")
+        step = int.from_bytes(digest[8:16], "big") | 1
+        return [(first + i * step) % self.size for i in range(self.hashes)]
+
+    def add(self, digest):
+        for position in self._positions(digest):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, digest):
+        return all(self.bits[position >> 3] & 1 << (position & 7) for position in self._positions(digest))
+
+
+class DedupeIndex:
+    """Bloom filter in front of an exact, on-disk set of salted candidate hashes.
+
+    Every open starts a new run; add() reports whether an occurrence is new,
+    known from an earlier run, or a repeat within this run.
+    """
+
+    def __init__(self, path=None, capacity=DEFAULT_CAPACITY):
+        self.path = path or default_index_path()
+        if self.path != ":memory:":
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, mode=0o700, exist_ok=True)
+            # The file holds the HMAC salt next to secret prefixes and locations, so only its owner may read it
+            os.close(os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600))
+        self.db = sqlite3.connect(self.path)
+        self.db.executescript(SCHEMA)
+        self.salt = self._meta("salt") or self._set_meta("salt", secrets.token_bytes(32))
+        self.run = int(self._meta("run") or 0) + 1
+        self._set_meta("run", str(self.run))
+        self.db.commit()
+
+        self.count = self.db.execute("SELECT COUNT(*) FROM secrets").fetchone()[0]
+        self.bloom = self._load_bloom(max(capacity, 2 * self.count))
+        self.run_occurrences = 0
+        # Occurrences recorded so far for each secret seen in this run
+        self.run_seen = {}
+        self.pending_counts = {}
+        self.pending_locations = []
+        self.pending_writes = 0
+
+    def _meta(self, key):
+        row = self.db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key, value):
+        self.db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+        return value
+
+    def _load_bloom(self, capacity):
+        """Reuse the saved filter if it matches the set, otherwise rebuild it from the hashes."""
+        saved = self._meta("bloom")
+        saved_count = self._meta("bloom_count")
+        saved_capacity = self._meta("bloom_capacity")
+        if saved is not None and saved_count is not None and int(saved_count) == self.count \
+                and saved_capacity is not None and int(saved_capacity) >= self.count:
+            bloom = BloomFilter(int(saved_capacity))
+            if len(saved) == len(bloom.bits):
+                bloom.bits = bytearray(saved)
+                return bloom
+        return self._rebuild_bloom(capacity)
+
+    def _rebuild_bloom(self, capacity):
+        bloom = BloomFilter(capacity)
+        for (secret_hash,) in self.db.execute("SELECT secret_hash FROM secrets"):
+            bloom.add(bytes.fromhex(secret_hash))
+        return bloom
+
+    def digest(self, provider, secret):
+        return hmac.new(self.salt, f"{provider}:{secret}".encode(), hashlib.sha256).digest()
+
+    def add(self, provider, secret, location):
+        """Record one occurrence and return OCCURRENCE_NEW, OCCURRENCE_KNOWN or OCCURRENCE_REPEAT."""
+        digest = self.digest(provider, secret)
+        secret_hash = digest.hex()
+        self.run_occurrences += 1
+
+        # Repeats within a run only bump buffered counters, written out by flush()
+        if secret_hash in self.run_seen:
+            outcome = OCCURRENCE_REPEAT
+            self.pending_counts[secret_hash] = self.pending_counts.get(secret_hash, 0) + 1
+        else:
+            outcome = self._first_in_run(provider, secret, digest, secret_hash)
+
+        occurrences = self.run_seen[secret_hash]
+        if occurrences < MAX_LOCATIONS:
+            self.pending_locations.append((secret_hash, location, time.time()))
+        self.run_seen[secret_hash] = occurrences + 1
+
+        self.pending_writes += 1
+        if self.pending_writes >= COMMIT_EVERY:
+            self.flush()
+        return outcome
+
+    def _first_in_run(self, provider, secret, digest, secret_hash):
+        now = time.time()
+        row = None
+        # A Bloom filter miss proves the secret has never been seen; skip the lookup
+        if digest in self.bloom:
+            row = self.db.execute("SELECT 1 FROM secrets WHERE secret_hash = ?", (secret_hash,)).fetchone()
+
+        if row is None:
+            self.db.execute(
+                "INSERT INTO secrets (secret_hash, provider, prefix, first_seen, last_seen, occurrences, "
+                "last_run, run_occurrences) VALUES (?, ?, ?, ?, ?, 1, ?, 1)",
+                (secret_hash, provider, redact(secret, 12), now, now, self.run),
+            )
+            self.bloom.add(digest)
+            self.count += 1
+            if self.count > self.bloom.capacity:
+                self.bloom = self._rebuild_bloom(2 * self.bloom.capacity)
+            self.run_seen[secret_hash] = 0
+            return OCCURRENCE_NEW
+
+        self.db.execute(
+            "UPDATE secrets SET last_seen = ?, occurrences = occurrences + 1, last_run = ?, run_occurrences = 1 "
+            "WHERE secret_hash = ?",
+            (now, self.run, secret_hash),
+        )
+        self.run_seen[secret_hash] = 0
+        return OCCURRENCE_KNOWN
+
+    def describe(self, provider, secret, limit=5):
+        """Occurrence counts and the most recent locations of a secret, or None if it was never seen."""
+        self.flush()
+        secret_hash = self.digest(provider, secret).hex()
+        row = self.db.execute(
+            "SELECT first_seen, occurrences, last_run, run_occurrences FROM secrets WHERE secret_hash = ?",
+            (secret_hash,),
+        ).fetchone()
+        if row is None:
+            return None
+        first_seen, occurrences, last_run, run_occurrences = row
+        locations = [location for (location,) in self.db.execute(
+            "SELECT location FROM locations WHERE secret_hash = ? ORDER BY seen_at DESC, location LIMIT ?",
+            (secret_hash, limit))]
+        return {
+            "first_seen": first_seen,
+            "total": occurrences,
+            "count": run_occurrences if last_run == self.run else 0,
+            "locations": locations,
+        }
+
+    def flush(self):
+        if self.pending_counts:
+            now = time.time()
+            self.db.executemany(
+                "UPDATE secrets SET last_seen = ?, occurrences = occurrences + ?, "
+                "run_occurrences = run_occurrences + ? WHERE secret_hash = ?",
+                [(now, count, count, secret_hash) for secret_hash, count in self.pending_counts.items()],
+            )
+        self.db.executemany(
+            "INSERT INTO locations (secret_hash, location, seen_at) VALUES (?, ?, ?) "
+            "ON CONFLICT (secret_hash, location) DO UPDATE SET seen_at = excluded.seen_at",
+            self.pending_locations,
+        )
+        self.db.commit()
+        self.pending_counts = {}
+        self.pending_locations = []
+        self.pending_writes = 0
+
+    def close(self):
+        self._set_meta("bloom", bytes(self.bloom.bits))
+        self._set_meta("bloom_count", str(self.count))
+        self._set_meta("bloom_capacity", str(self.bloom.capacity))
+        self.flush()
+        self.db.close()
+
+
+def open_index(path=None, persistent=True):
+    """Open the shared index, or a throwaway in-memory one if persistence is off or unavailable."""
+    if persistent:
+        try:
+            return DedupeIndex(path)
+        except sqlite3.Error as e:
+            print(f"⚠ Dedupe index unavailable ({e}), deduplicating this run only")
+    return DedupeIndex(":memory:")
+
+
+def add_index_arguments(parser):
+    parser.add_argument("--index", metavar="FILE",
+                        help="dedupe index database (default: $SECRET_TESTER_INDEX or "
+                             "~/.cache/secret-tester/dedupe.sqlite)")
+    parser.add_argument("--no-index", action="store_true",
+                        help="deduplicate within this run only, without reading or updating the index")
+    parser.add_argument("--new-only", action="store_true",
+                        help="only validate candidates that no earlier scan has seen")
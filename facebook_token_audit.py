@@ -0,0 +1,399 @@
+#!/usr/bin/env python3
+"""
+Facebook Token Audit
+Introspects many user and page access tokens with a single app access token
+(`app_id|app_secret`) and prints one aggregated report: validity, token types,
+expiry horizons, scope distribution and the list of invalid tokens.
+
+Unlike test_facebook_key.py, which authorizes every debug_token call with the
+token being checked, the app token authorizes the calls here. Tokens that
+cannot introspect themselves are still described, and 50 tokens are packed
+into each Graph API batch request, with several batches in flight over one
+shared HTTP/2 connection (see transport.py).
+
+Usage:
+  python facebook_token_audit.py tokens.txt --app-token "APP_ID|APP_SECRET"
+  FACEBOOK_APP_ID=... FACEBOOK_APP_SECRET=... python facebook_token_audit.py tokens.txt --json report.json
+
+The app token can also be given as FACEBOOK_APP_TOKEN. Tokens are only
+introspected; /me is not called, so "active" means debug_token reported the
+token as valid.
+"""
+
+import argparse
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import urlencode
+
+import httpx
+
+import circuit_breaker
+import rate_limiter
+import tail_latency
+import transport
+from instrumentation import RECORDER, add_metrics_arguments, export_metrics
+from precheck import split_plausible
+from secret_io import STATUS_ACTIVE, STATUS_ERROR, STATUS_INVALID, STATUS_UNAVAILABLE, read_secrets, redact
+from test_facebook_key import (
+    GRAPH_URL,
+    MAX_BATCH_REQUESTS,
+    NETWORK_ERRORS,
+    STATUS_LABELS,
+    app_token_from_env,
+    auth_params,
+    is_throttled,
+    parse_sub_response,
+    throttled_result,
+)
+
+DEFAULT_WORKERS = 8
+
+# (seconds from now, label) for the expiry histogram, in increasing order
+EXPIRY_HORIZONS = (
+    (24 * 3600, "within 24 hours"),
+    (7 * 24 * 3600, "within 7 days"),
+    (30 * 24 * 3600, "within 30 days"),
+    (90 * 24 * 3600, "within 90 days"),
+)
+EXPIRY_LATER = "in more than 90 days"
+EXPIRY_NEVER = "never (long-lived)"
+EXPIRY_PAST = "already expired"
+
+# Number of invalid tokens and scopes listed in the text report; the JSON report has all of them
+DISPLAY_LIMIT = 20
+
+
+def verify_app_token(session, app_token):
+    """Return the debug_token data of the app token itself, or raise ValueError if it is not usable."""
+    rate_limiter.acquire("facebook", app_token)
+    response = session.get(f"{GRAPH_URL}/debug_token",
+                           params={"input_token": app_token, **auth_params(app_token)},
+                           timeout=tail_latency.timeout("facebook"))
+    rate_limiter.update_from_headers("facebook", response.headers, app_token)
+    try:
+        body = response.json()
+    except ValueError:
+        body = {}
+    data = body.get("data", {})
+    if response.status_code != 200 or not data.get("is_valid", False):
+        error = body.get("error") or data.get("error") or {}
+        raise ValueError(error.get("message", f"status code {response.status_code}"))
+    if data.get("type", "APP") != "APP":
+        raise ValueError(f"expected an app token, got a {data['type']} token")
+    return data
+
+
+def introspection_result(token, code, body):
+    """Turn one debug_token sub-response into a result dict."""
+    if is_throttled(code, body):
+        return throttled_result(token, body)
+    result = {"secret": token, "provider": "facebook"}
+    data = body.get("data")
+    if code == 200 and data is not None:
+        result["token_data"] = data
+        if data.get("is_valid", False):
+            result["status"] = STATUS_ACTIVE
+        else:
+            result["status"] = STATUS_INVALID
+            result["error"] = data.get("error", {}).get("message", "Token is not valid")
+        return result
+
+    error = body.get("error", {})
+    result["status"] = STATUS_INVALID if code and code < 500 else STATUS_ERROR
+    result["error"] = error.get("message", "Unknown error") if code else "Sub-request timed out"
+    return result
+
+
+def introspect_chunk(session, app_token, tokens):
+    """Introspect up to MAX_BATCH_REQUESTS tokens with one batch POST authorized by the app token."""
+    batch = [{"method": "GET", "relative_url": f"debug_token?{urlencode({'input_token': token})}"}
+             for token in tokens]
+
+    def post_batch():
+        rate_limiter.acquire("facebook", app_token)
+        return session.post(GRAPH_URL, data={**auth_params(app_token), "batch": json.dumps(batch),
+                                             "include_headers": "false"}, timeout=30)
+
+    try:
+        response = circuit_breaker.guarded(GRAPH_URL, post_batch, NETWORK_ERRORS)
+    except (circuit_breaker.ProviderUnavailable, *NETWORK_ERRORS) as e:
+        return [circuit_breaker.unavailable_result(token, "facebook", str(e)) for token in tokens]
+    except httpx.HTTPError as e:
+        return [{"secret": token, "provider": "facebook", "status": STATUS_ERROR, "error": str(e)}
+                for token in tokens]
+    rate_limiter.update_from_headers("facebook", response.headers, app_token)
+    if response.status_code >= 500:
+        return [circuit_breaker.unavailable_result(token, "facebook", f"Graph API returned {response.status_code}")
+                for token in tokens]
+
+    try:
+        body = response.json()
+    except ValueError:
+        body = {}
+    if response.status_code != 200 or not isinstance(body, list):
+        if is_throttled(response.status_code, body if isinstance(body, dict) else {}):
+            return [throttled_result(token, body) for token in tokens]
+        message = body.get("error", {}).get("message") if isinstance(body, dict) else None
+        return [{"secret": token, "provider": "facebook", "status": STATUS_ERROR,
+                 "error": message or f"Batch request failed with status {response.status_code}"}
+                for token in tokens]
+
+    with RECORDER.span("parse_batch_response", "facebook", tokens=len(tokens)):
+        return [introspection_result(token, *parse_sub_response(sub_response))
+                for token, sub_response in zip(tokens, body)]
+
+
+def introspect_with_retries(session, app_token, tokens, deadline=0):
+    """Introspect one chunk, retrying throttled tokens with backoff.
+
+    Tokens the Graph API failed to answer for are parked and retried whenever
+    its circuit breaker lets a request through, until the `deadline` (a
+    time.monotonic() value).
+    """
+    results = []
+    while tokens:
+        parked = []
+        for result in introspect_throttled(session, app_token, tokens):
+            (parked if result["status"] == STATUS_UNAVAILABLE else results).append(result)
+        tokens = [result["secret"] for result in parked]
+        if tokens and not circuit_breaker.wait_for(GRAPH_URL, deadline):
+            return results + parked
+    return results
+
+
+def introspect_throttled(session, app_token, tokens):
+    results = []
+    for attempt in range(rate_limiter.MAX_RETRIES + 1):
+        retry = attempt < rate_limiter.MAX_RETRIES
+        throttled = []
+        for result in introspect_chunk(session, app_token, tokens):
+            if result.get("throttled") and retry:
+                throttled.append(result["secret"])
+            else:
+                results.append(result)
+        if not throttled:
+            break
+        tokens = throttled
+        time.sleep(rate_limiter.backoff_delay(attempt))
+    return results
+
+
+def audit_tokens(tokens, app_token, workers=DEFAULT_WORKERS, on_result=None, session=None,
+                 outage_wait=circuit_breaker.OUTAGE_WAIT):
+    """Introspect many tokens, `workers` batch requests at a time; malformed tokens are rejected offline."""
+    results, tokens = split_plausible("facebook", tokens)
+    if on_result:
+        for result in results:
+            on_result(result)
+    chunks = [tokens[start:start + MAX_BATCH_REQUESTS] for start in range(0, len(tokens), MAX_BATCH_REQUESTS)]
+
+    owns_session = session is None
+    if owns_session:
+        session = transport.client("facebook", max_connections=workers)
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            deadline = time.monotonic() + outage_wait
+            for chunk_results in executor.map(
+                    lambda chunk: introspect_with_retries(session, app_token, chunk, deadline), chunks):
+                for result in chunk_results:
+                    if on_result:
+                        on_result(result)
+                    results.append(result)
+        return results
+    finally:
+        if owns_session:
+            session.close()
+
+
+def expiry_horizon(expires_at, now):
+    if not expires_at:
+        return EXPIRY_NEVER
+    remaining = expires_at - now
+    if remaining <= 0:
+        return EXPIRY_PAST
+    for seconds, label in EXPIRY_HORIZONS:
+        if remaining <= seconds:
+            return label
+    return EXPIRY_LATER
+
+
+class AuditReport:
+    """Running aggregate of introspection results; only invalid and failed tokens are kept individually."""
+
+    def __init__(self, now=None):
+        self.now = now or time.time()
+        self.counts = {status: 0 for status in STATUS_LABELS}
+        self.types = {}
+        self.apps = {}
+        self.expiry = {label: 0 for label in [EXPIRY_PAST] + [label for _, label in EXPIRY_HORIZONS]
+                       + [EXPIRY_LATER, EXPIRY_NEVER]}
+        self.scopes = {}
+        self.invalid = []
+        self.errors = []
+        self.soonest = []
+
+    def add(self, result):
+        status = result["status"]
+        self.counts[status] = self.counts.get(status, 0) + 1
+        token_data = result.get("token_data", {})
+        if status == STATUS_INVALID:
+            self.invalid.append({"prefix": redact(result["secret"], 15), "error": result.get("error"),
+                                 "type": token_data.get("type"), "app_id": token_data.get("app_id")})
+            return
+        if status != STATUS_ACTIVE:
+            self.errors.append({"prefix": redact(result["secret"], 15), "error": result.get("error")})
+            return
+
+        token_type = token_data.get("type", "UNKNOWN")
+        self.types[token_type] = self.types.get(token_type, 0) + 1
+        app_id = token_data.get("app_id", "N/A")
+        self.apps[app_id] = self.apps.get(app_id, 0) + 1
+        for scope in token_data.get("scopes", ()):
+            self.scopes[scope] = self.scopes.get(scope, 0) + 1
+        expires_at = token_data.get("expires_at", 0)
+        self.expiry[expiry_horizon(expires_at, self.now)] += 1
+        if expires_at:
+            self.soonest.append((expires_at, redact(result["secret"], 15)))
+            # Only the tokens closest to expiry are listed; keep the list bounded
+            if len(self.soonest) > 2 * DISPLAY_LIMIT:
+                self.soonest = sorted(self.soonest)[:DISPLAY_LIMIT]
+
+    def to_dict(self):
+        return {
+            "generated_at": self.now,
+            "counts": dict(self.counts),
+            "token_types": dict(self.types),
+            "apps": dict(self.apps),
+            "expiry_horizons": dict(self.expiry),
+            "scopes": dict(sorted(self.scopes.items(), key=lambda item: -item[1])),
+            "expiring_soonest": [{"prefix": prefix, "expires_at": expires_at}
+                                 for expires_at, prefix in sorted(self.soonest)[:DISPLAY_LIMIT]],
+            "invalid": list(self.invalid),
+            "errors": list(self.errors),
+        }
+
+    def print(self):
+        active = self.counts.get(STATUS_ACTIVE, 0)
+        print("\n" + "=" * 60)
+        print("🔑 TOKEN AUDIT REPORT")
+        print("=" * 60)
+        for status, label in STATUS_LABELS.items():
+            print(f"  {label}: {self.counts.get(status, 0)}")
+
+        if active:
+            print("\n[Token types]")
+            for token_type, count in sorted(self.types.items(), key=lambda item: -item[1]):
+                print(f"  {token_type}: {count}")
+
+            print("\n[Expiry horizons]")
+            for label, count in self.expiry.items():
+                if count:
+                    print(f"  {label}: {count} ({count * 100 / active:.1f}%)")
+            for expires_at, prefix in sorted(self.soonest)[:5]:
+                expiry = datetime.fromtimestamp(expires_at).strftime("%Y-%m-%d %H:%M:%S")
+                print(f"  ⚠ {prefix} expires at {expiry}")
+
+            print("\n[Scopes]")
+            for scope, count in sorted(self.scopes.items(), key=lambda item: -item[1])[:DISPLAY_LIMIT]:
+                print(f"  {scope}: {count} ({count * 100 / active:.1f}%)")
+
+        if self.invalid:
+            print(f"\n[Invalid tokens] {len(self.invalid)}")
+            for entry in self.invalid[:DISPLAY_LIMIT]:
+                print(f"  ✗ {entry['prefix']}  {entry['error']}")
+            if len(self.invalid) > DISPLAY_LIMIT:
+                print(f"  ... and {len(self.invalid) - DISPLAY_LIMIT} more")
+        if self.errors:
+            print(f"\n[Not checked] {len(self.errors)}")
+            for entry in self.errors[:DISPLAY_LIMIT]:
+                print(f"  ⚠ {entry['prefix']}  {entry['error']}")
+        print("=" * 60)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Introspect many Facebook tokens with one app access token.")
+    parser.add_argument("tokens", help="file with one user or page token per line ('-' for stdin)")
+    parser.add_argument("--app-token", metavar="APP_ID|APP_SECRET",
+                        help="app access token (default: FACEBOOK_APP_TOKEN, or FACEBOOK_APP_ID and FACEBOOK_APP_SECRET)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help=f"batch requests in flight at once (default: {DEFAULT_WORKERS})")
+    parser.add_argument("--json", metavar="FILE", help="also write the full report, with every invalid token, to FILE")
+    transport.add_transport_arguments(parser)
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+    if args.ca_bundle:
+        transport.set_ca_bundle(args.ca_bundle)
+
+    print("=" * 60)
+    print("Facebook Token Audit")
+    print("=" * 60)
+
+    print("\n[Step 1] Loading environment variables from .env file...")
+    try:
+        from dotenv import load_dotenv
+        load_dotenv()
+        print("✓ Environment variables loaded from .env file")
+    except ImportError:
+        print("⚠ python-dotenv package not found, using the process environment only")
+
+    app_token = args.app_token or app_token_from_env()
+    if not app_token or "|" not in app_token:
+        print("✗ An app access token (APP_ID|APP_SECRET) is required!")
+        print("  Pass --app-token or set FACEBOOK_APP_TOKEN, or FACEBOOK_APP_ID and FACEBOOK_APP_SECRET")
+        sys.exit(1)
+
+    workers = max(1, args.workers)
+    session = transport.client("facebook", max_connections=workers)
+    try:
+        print("\n[Step 2] Verifying the app token...")
+        try:
+            with RECORDER.span("verify_app_token", "facebook"):
+                app_data = verify_app_token(session, app_token)
+        except transport.TLSError as e:
+            transport.print_tls_help(e)
+            sys.exit(1)
+        except (ValueError, httpx.HTTPError) as e:
+            print(f"✗ App token rejected: {e}")
+            sys.exit(1)
+        print(f"✓ App token valid for app {app_data.get('app_id', 'N/A')} ({app_data.get('application', 'N/A')})")
+
+        print(f"\n[Step 3] Reading tokens from {'stdin' if args.tokens == '-' else args.tokens}...")
+        tokens = read_secrets(args.tokens)
+        if not tokens:
+            print("✗ No tokens found in input!")
+            sys.exit(1)
+        print(f"✓ {len(tokens)} unique token(s) loaded")
+
+        print(f"\n[Step 4] Introspecting tokens, {MAX_BATCH_REQUESTS} per batch request, "
+              f"{workers} request(s) at a time...")
+        report = AuditReport()
+        started = time.monotonic()
+
+        def on_result(result):
+            RECORDER.count_verdict("facebook", result["status"])
+            report.add(result)
+
+        with RECORDER.span("audit_tokens", "facebook", tokens=len(tokens)):
+            audit_tokens(tokens, app_token, workers, on_result, session)
+        duration = time.monotonic() - started
+        print(f"✓ {len(tokens)} token(s) introspected in {duration:.1f}s")
+        for line in circuit_breaker.outage_summary():
+            print(f"⚠ Outage {line}")
+
+        report.print()
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump(report.to_dict(), f, indent=2)
+            print(f"\n✓ Report written to {args.json}")
+        if report.errors:
+            sys.exit(1)
+    finally:
+        session.close()
+        export_metrics(args)
+
+
+if __name__ == "__main__":
+    main()
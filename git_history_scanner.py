@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+Git History Secret Scanner
+Scans every blob in a repository's history for OpenAI, Facebook/Meta and
+Sentry secrets, using the same matchers as secret_scanner.py.
+
+Object IDs stream from `git rev-list --objects` straight into
+`git cat-file --batch`, and blob contents are scanned in fixed-size chunks,
+so no diff or blob is ever held in memory whole. Each blob is scanned once no
+matter how many commits contain it. The last scanned commit of every ref is
+recorded in a checkpoint, and later runs only look at newer history.
+Occurrences go into the same dedupe index as secret_scanner.py.
+
+Usage:
+  python git_history_scanner.py path/to/repo
+  python git_history_scanner.py path/to/repo --validate
+  python git_history_scanner.py path/to/repo --full   # ignore the checkpoint
+"""
+
+import argparse
+import collections
+import json
+import os
+import subprocess
+import sys
+import threading
+
+import dedupe_index
+from secret_scanner import (
+    MAX_SECRET_LENGTH,
+    find_secrets,
+    print_candidates,
+    print_validation_summary,
+    record_occurrence,
+    to_validate,
+    validate,
+)
+
+CHUNK_SIZE = 1024 * 1024
+CHECKPOINT_NAME = "secret-scan-checkpoint.json"
+
+
+def git(repo, *args):
+    return subprocess.run(
+        ["git", "-C", repo, *args], check=True, capture_output=True, text=True
+    ).stdout.strip()
+
+
+def list_refs(repo):
+    """Return {refname: commit} for every branch and tag.
+
+    Annotated tags are peeled to their commit; tags of trees or blobs are skipped.
+    """
+    output = git(repo, "for-each-ref",
+                 "--format=%(refname) %(objectname) %(objecttype) %(*objectname) %(*objecttype)",
+                 "refs/heads", "refs/tags")
+    refs = {}
+    for line in output.splitlines():
+        refname, objectname, objecttype, *peeled = line.split()
+        if objecttype == "tag":
+            peeled_name, peeled_type = peeled
+            if peeled_type == "tag":
+                # A tag of a tag: let git peel the whole chain
+                try:
+                    peeled_name = git(repo, "rev-parse", f"{objectname}^{{commit}}")
+                except subprocess.CalledProcessError:
+                    continue
+            elif peeled_type != "commit":
+                continue
+            objectname = peeled_name
+        elif objecttype != "commit":
+            continue
+        refs[refname] = objectname
+    return refs
+
+
+def commit_exists(repo, commit):
+    result = subprocess.run(["git", "-C", repo, "cat-file", "-e", f"{commit}^{{commit}}"],
+                            capture_output=True)
+    return result.returncode == 0
+
+
+def default_checkpoint_path(repo):
+    git_dir = git(repo, "rev-parse", "--absolute-git-dir")
+    return os.path.join(git_dir, CHECKPOINT_NAME)
+
+
+def load_checkpoint(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_checkpoint(path, refs):
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(refs, f, indent=2, sort_keys=True)
+    os.replace(temp_path, path)
+
+
+def feed_blob_ids(rev_list, cat_file, paths):
+    """Copy blob IDs from rev-list to cat-file, queueing each blob's path.
+
+    cat-file answers in request order, so the reader pops one path per object.
+    The queue only holds the blobs cat-file has not answered yet.
+    """
+    try:
+        for line in rev_list.stdout:
+            object_id, _, path = line.rstrip(b"\n").partition(b" ")
+            # Commits have no path; trees are filtered out by rev-list itself
+            if not path:
+                continue
+            paths.append(path.decode("utf-8", "replace"))
+            cat_file.stdin.write(object_id + b"\n")
+    finally:
+        cat_file.stdin.close()
+
+
+def scan_stream(stream, size):
+    """Scan `size` bytes from a stream in chunks, carrying an overlap between them.
+
+    The byte before each chunk's scan window is kept as well, so the patterns'
+    leading \\b sees the real preceding character at a chunk boundary.
+    """
+    found = []
+    buffer = b""
+    # Stream offset of buffer[0], and where in the buffer the next scan starts
+    base = 0
+    start = 0
+    remaining = size
+    while True:
+        chunk = stream.read(min(CHUNK_SIZE, remaining)) if remaining > 0 else b""
+        remaining -= len(chunk)
+        buffer += chunk
+        final = remaining <= 0 or not chunk
+
+        end = len(buffer) if final else max(start, len(buffer) - MAX_SECRET_LENGTH)
+        for provider, secret, offset in find_secrets(buffer, start, end):
+            found.append((provider, secret, base + offset))
+        if final:
+            break
+        keep = max(0, end - 1)
+        base += keep
+        start = end - keep
+        buffer = buffer[keep:]
+    return found
+
+
+def scan_history(repo, index, since=None):
+    """Scan every blob reachable from the current refs but not from `since`.
+
+    Occurrences are recorded in the dedupe index. Returns
+    (candidates, refs, blob_count) where candidates maps (provider, secret)
+    to whether an earlier scan had already seen it.
+    """
+    refs = list_refs(repo)
+    exclude = [commit for commit in (since or {}).values() if commit_exists(repo, commit)]
+    if not refs:
+        return {}, refs, 0
+
+    rev_list = subprocess.Popen(
+        ["git", "-C", repo, "rev-list", "--objects", "--filter=object:type=blob", *sorted(set(refs.values())), "--not", *exclude],
+        stdout=subprocess.PIPE,
+    )
+    cat_file = subprocess.Popen(
+        ["git", "-C", repo, "cat-file", "--batch"],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+    )
+
+    paths = collections.deque()
+    feeder = threading.Thread(target=feed_blob_ids, args=(rev_list, cat_file, paths), daemon=True)
+    feeder.start()
+
+    candidates = {}
+    blob_count = 0
+    for header in cat_file.stdout:
+        fields = header.decode().split()
+        path = paths.popleft() if paths else "?"
+        # Objects that vanished (e.g. in a shallow clone) are reported as "<id> missing"
+        if len(fields) != 3:
+            continue
+        object_id, object_type, size = fields[0], fields[1], int(fields[2])
+        if object_type == "blob":
+            blob_count += 1
+            for provider, secret, offset in scan_stream(cat_file.stdout, size):
+                location = f"blob {object_id} ({path})@{offset}"
+                record_occurrence(index, candidates, provider, secret, location)
+        else:
+            cat_file.stdout.read(size)
+        # Every object's contents are followed by a newline
+        cat_file.stdout.read(1)
+
+    feeder.join()
+    rev_list.wait()
+    cat_file.wait()
+    if rev_list.returncode or cat_file.returncode:
+        raise subprocess.CalledProcessError(rev_list.returncode or cat_file.returncode, "git")
+    return candidates, refs, blob_count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scan a git repository's history for secrets.")
+    parser.add_argument("repo", nargs="?", default=".", help="path to the repository (default: .)")
+    parser.add_argument("--checkpoint", metavar="FILE",
+                        help=f"checkpoint file (default: {CHECKPOINT_NAME} inside the git directory)")
+    parser.add_argument("--full", action="store_true",
+                        help="ignore the checkpoint and scan the whole history")
+    parser.add_argument("--validate", action="store_true",
+                        help="check every unique candidate against its provider")
+    parser.add_argument("--concurrency", type=int, default=10,
+                        help="concurrent OpenAI checks when validating (default: 10)")
+    dedupe_index.add_index_arguments(parser)
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("Git History Secret Scanner")
+    print("=" * 60)
+
+    print(f"\n[Step 1] Loading checkpoint for {args.repo}...")
+    try:
+        checkpoint_path = args.checkpoint or default_checkpoint_path(args.repo)
+    except (OSError, subprocess.CalledProcessError):
+        print(f"✗ Not a git repository: {args.repo}")
+        sys.exit(1)
+    since = {} if args.full else load_checkpoint(checkpoint_path)
+    if since:
+        print(f"✓ Resuming after the last scan of {len(since)} ref(s)")
+    else:
+        print("✓ No checkpoint, scanning the full history")
+
+    print("\n[Step 2] Scanning new history...")
+    index = dedupe_index.open_index(args.index, persistent=not args.no_index)
+    try:
+        candidates, refs, blob_count = scan_history(args.repo, index, since)
+        print(f"✓ Scanned {blob_count} new blob(s) across {len(refs)} ref(s)")
+        print_candidates(candidates, index)
+    except subprocess.CalledProcessError as e:
+        print(f"✗ git failed: {e}")
+        sys.exit(1)
+    finally:
+        index.close()
+    if candidates:
+        print("\n  Find the commits that introduced a blob with: git log --all --find-object=<blob>")
+
+    # Refs that disappeared keep their old checkpoint so they are not rescanned if restored
+    save_checkpoint(checkpoint_path, {**since, **refs})
+    print(f"\n✓ Checkpoint saved to {checkpoint_path}")
+
+    pending = to_validate(candidates, args.new_only)
+    if not args.validate or not pending:
+        return
+
+    print(f"\n[Step 3] Validating {len(pending)} unique candidate(s)...")
+    results = validate(pending, max(1, args.concurrency))
+
+    if print_validation_summary(results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
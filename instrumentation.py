@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+Validation Run Instrumentation
+Times every step of a validation run as a span and exports the results.
+
+HTTP calls made by clients carrying `httpx_event_hooks()` (every client from
+transport.py, and the OpenAI client) are broken down into TCP connect, TLS
+handshake and time to first byte. At the end of a run the recorder can write
+a JSON summary and a Prometheus textfile with per-provider latency histograms
+and verdict counters, ready for node_exporter's textfile collector.
+"""
+
+import bisect
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# DNS lookups happen inside the TCP connect and are counted as part of "connect"
+PHASES = ("connect", "tls", "ttfb", "total")
+MAX_RECORDS = 10000
+
+
+class Recorder:
+    """Thread-safe collector of spans, HTTP timings and verdict counters.
+
+    Histograms and phase totals are aggregated as requests complete, so memory
+    stays flat on long runs; only the first MAX_RECORDS raw spans and requests
+    are kept for the JSON summary.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.spans = []
+        self.requests = []
+        self.dropped = 0
+        # provider -> [count per bucket..., +Inf count], sum of durations
+        self.histograms = {}
+        self.duration_sums = {}
+        # provider -> phase -> {"count", "sum", "max"}
+        self.phases = {}
+        self.verdicts = {}
+
+    def _keep(self, records, record):
+        if len(records) < MAX_RECORDS:
+            records.append(record)
+        else:
+            self.dropped += 1
+
+    @contextmanager
+    def span(self, name, provider=None, **attributes):
+        started = time.monotonic()
+        error = None
+        try:
+            yield attributes
+        except BaseException as e:
+            error = type(e).__name__
+            raise
+        finally:
+            record = {"name": name, "duration": time.monotonic() - started, **attributes}
+            if provider:
+                record["provider"] = provider
+            if error and error != "SystemExit":
+                record["error"] = error
+            with self.lock:
+                self._keep(self.spans, record)
+
+    def record_request(self, provider, method, url, status, phases):
+        parts = urlsplit(url)
+        record = {"provider": provider, "method": method, "host": parts.hostname,
+                  "path": parts.path, "status": status, **phases}
+        with self.lock:
+            self._keep(self.requests, record)
+            if "total" in phases:
+                counts = self.histograms.setdefault(provider, [0] * (len(LATENCY_BUCKETS) + 1))
+                counts[bisect.bisect_left(LATENCY_BUCKETS, phases["total"])] += 1
+                self.duration_sums[provider] = self.duration_sums.get(provider, 0.0) + phases["total"]
+            provider_phases = self.phases.setdefault(provider, {})
+            for phase in PHASES:
+                if phase in phases:
+                    stats = provider_phases.setdefault(phase, {"count": 0, "sum": 0.0, "max": 0.0})
+                    stats["count"] += 1
+                    stats["sum"] += phases[phase]
+                    stats["max"] = max(stats["max"], phases[phase])
+
+    def count_verdict(self, provider, status):
+        with self.lock:
+            key = (provider, status)
+            self.verdicts[key] = self.verdicts.get(key, 0) + 1
+
+    def summary(self):
+        with self.lock:
+            return {
+                "started_at": self.started,
+                "duration": time.time() - self.started,
+                "spans": list(self.spans),
+                "requests": list(self.requests),
+                "records_dropped": self.dropped,
+                "http_phases": {provider: {phase: dict(stats) for phase, stats in phases.items()}
+                                for provider, phases in self.phases.items()},
+                "verdicts": [{"provider": provider, "status": status, "count": count}
+                             for (provider, status), count in sorted(self.verdicts.items())],
+            }
+
+    def write_json(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.summary(), f, indent=2)
+
+    def prometheus_text(self):
+        """Render the histograms and counters in the Prometheus text exposition format."""
+        with self.lock:
+            histograms = {provider: list(counts) for provider, counts in self.histograms.items()}
+            duration_sums = dict(self.duration_sums)
+            phases = {provider: {phase: dict(stats) for phase, stats in provider_phases.items()}
+                      for provider, provider_phases in self.phases.items()}
+            verdicts = dict(self.verdicts)
+
+        lines = [
+            "# HELP secret_tester_request_duration_seconds Provider HTTP request latency.",
+            "# TYPE secret_tester_request_duration_seconds histogram",
+        ]
+        for provider, counts in sorted(histograms.items()):
+            cumulative = 0
+            for bucket, count in zip(LATENCY_BUCKETS + ("+Inf",), counts):
+                cumulative += count
+                lines.append(f'secret_tester_request_duration_seconds_bucket{{provider="{provider}",le="{bucket}"}} {cumulative}')
+            lines.append(f'secret_tester_request_duration_seconds_sum{{provider="{provider}"}} {duration_sums[provider]:.6f}')
+            lines.append(f'secret_tester_request_duration_seconds_count{{provider="{provider}"}} {cumulative}')
+
+        lines += [
+            "# HELP secret_tester_http_phase_seconds Time spent per HTTP phase (connect including DNS, tls, ttfb).",
+            "# TYPE secret_tester_http_phase_seconds summary",
+        ]
+        for provider, provider_phases in sorted(phases.items()):
+            for phase in PHASES[:-1]:
+                stats = provider_phases.get(phase, {"count": 0, "sum": 0.0})
+                lines.append(f'secret_tester_http_phase_seconds_sum{{provider="{provider}",phase="{phase}"}} {stats["sum"]:.6f}')
+                lines.append(f'secret_tester_http_phase_seconds_count{{provider="{provider}",phase="{phase}"}} {stats["count"]}')
+
+        lines += [
+            "# HELP secret_tester_validations_total Validation verdicts by provider and status.",
+            "# TYPE secret_tester_validations_total counter",
+        ]
+        for (provider, status), count in sorted(verdicts.items()):
+            lines.append(f'secret_tester_validations_total{{provider="{provider}",status="{status}"}} {count}')
+
+        lines += [
+            "# HELP secret_tester_last_run_timestamp_seconds When the last validation run finished.",
+            "# TYPE secret_tester_last_run_timestamp_seconds gauge",
+            f"secret_tester_last_run_timestamp_seconds {time.time():.0f}",
+        ]
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        """Write a Prometheus textfile; written to a temp file and renamed so scrapes never see half a file."""
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(self.prometheus_text())
+        os.replace(temp_path, path)
+
+
+# Process-wide recorder used by the scripts
+RECORDER = Recorder()
+
+
+class _HttpxTrace:
+    """httpcore trace callback collecting the start/complete times of each phase."""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.events = {}
+
+    def __call__(self, event_name, info):
+        self.events[event_name] = time.monotonic()
+
+    def phases(self):
+        events = self.events
+
+        def between(start, end):
+            if start in events and end in events:
+                return events[end] - events[start]
+            return None
+
+        phases = {
+            "connect": between("connection.connect_tcp.started", "connection.connect_tcp.complete"),
+            "tls": between("connection.start_tls.started", "connection.start_tls.complete"),
+        }
+        for protocol in ("http11", "http2"):
+            ttfb = between(f"{protocol}.send_request_headers.started",
+                           f"{protocol}.receive_response_headers.complete")
+            if ttfb is not None:
+                phases["ttfb"] = ttfb
+        phases["total"] = time.monotonic() - self.started
+        return {phase: value for phase, value in phases.items() if value is not None}
+
+
+class _AsyncHttpxTrace(_HttpxTrace):
+    async def __call__(self, event_name, info):
+        self.events[event_name] = time.monotonic()
+
+
+def httpx_event_hooks(provider, recorder=None, asynchronous=False):
+    """Event hooks for an httpx client that record every request with a phase breakdown.
+
+    httpx resolves names inside the TCP connect, so DNS time is part of "connect".
+    """
+    recorder = recorder or RECORDER
+    trace_class = _AsyncHttpxTrace if asynchronous else _HttpxTrace
+
+    def on_request(request):
+        request.extensions["trace"] = trace_class()
+
+    def on_response(response):
+        trace = response.request.extensions.get("trace")
+        if isinstance(trace, _HttpxTrace):
+            recorder.record_request(provider, response.request.method, str(response.request.url),
+                                    response.status_code, trace.phases())
+
+    if not asynchronous:
+        return {"request": [on_request], "response": [on_response]}
+
+    async def on_request_async(request):
+        on_request(request)
+
+    async def on_response_async(response):
+        on_response(response)
+
+    return {"request": [on_request_async], "response": [on_response_async]}
+
+
+def add_metrics_arguments(parser):
+    parser.add_argument("--metrics-json", metavar="FILE",
+                        help="write a JSON summary of step timings, HTTP phases and verdicts to FILE")
+    parser.add_argument("--metrics-prom", metavar="FILE",
+                        help="write Prometheus textfile metrics (latency histograms, verdict counters) to FILE")
+
+
+def export_metrics(args, recorder=None):
+    recorder = recorder or RECORDER
+    if args.metrics_json:
+        recorder.write_json(args.metrics_json)
+    if args.metrics_prom:
+        recorder.write_prometheus(args.metrics_prom)
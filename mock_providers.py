@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+"""
+Mock Provider Server
+Local stand-in for the OpenAI, Facebook Graph and Sentry endpoints used by the
+key test scripts, so that they can be tested and benchmarked offline.
+
+Endpoints (all served from one port):
+  OpenAI:   GET /v1/models, POST /v1/chat/completions
+  Facebook: GET /debug_token, GET /v18.0/me, POST / (batch requests)
+  Sentry:   GET /api/0/organizations/, GET /api/0/organizations/<slug>/ and
+            GET /api/0/organizations/<slug>/{projects,teams,members}/
+
+Every token is deterministically assigned an outcome (active, invalid or
+forbidden) from a hash of its value, following the configured mix. Latency,
+random 5xx errors, transient 429s and Sentry pagination are configurable.
+
+Usage:
+  python mock_providers.py --port 8080 --latency 50 --mix active=0.7,invalid=0.2,forbidden=0.1
+
+Then point the scripts at it:
+  OPENAI_BASE_URL=http://127.0.0.1:8080/v1 FACEBOOK_GRAPH_URL=http://127.0.0.1:8080 \\
+  SENTRY_URL=http://127.0.0.1:8080 python test_sentry_key.py
+
+With --certfile and --keyfile the server speaks HTTPS, for testing --ca-bundle.
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import re
+import socket
+import ssl
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+# "forbidden" is each provider's active-but-limited answer: an exhausted OpenAI
+# quota, a Facebook /me permission error or a Sentry 403.
+OUTCOMES = ("active", "invalid", "forbidden")
+
+# Facebook permissions handed out to mock tokens, besides public_profile
+MOCK_SCOPES = ("email", "pages_show_list", "pages_read_engagement", "ads_read", "ads_management",
+               "business_management", "instagram_basic", "pages_manage_posts")
+
+PROJECTS_PATH = re.compile(r"^/api/0/organizations/([^/]+)/(projects|teams|members)/$")
+ORGANIZATION_PATH = re.compile(r"^/api/0/organizations/([^/]+)/$")
+
+# Scopes reported in the `access` list of every mock organization's detail endpoint
+MOCK_SENTRY_ACCESS = ["org:read", "project:read", "team:read", "member:read"]
+
+
+class MockConfig:
+    """Behaviour of the mock server; shared by all handler threads."""
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, throttle_rate=0.0,
+                 mix=None, orgs=3, projects=10, page_size=100, slow_rate=0.0, slow_latency=0.0, outage=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.mix = mix or {"active": 1.0}
+        self.orgs = orgs
+        self.projects = projects
+        self.page_size = page_size
+        # (start, duration) in seconds after the config is created, during which every request fails
+        self.outage = outage
+        self.started = time.monotonic()
+
+    def in_outage(self):
+        if not self.outage:
+            return False
+        start, duration = self.outage
+        return start <= time.monotonic() - self.started < start + duration
+
+    def outcome(self, token):
+        """Deterministically map a token onto one of OUTCOMES according to the mix."""
+        digest = hashlib.sha256(token.encode()).digest()
+        point = int.from_bytes(digest[:8], "big") / 2 ** 64
+        total = sum(self.mix.values()) or 1.0
+        cumulative = 0.0
+        for outcome in OUTCOMES:
+            cumulative += self.mix.get(outcome, 0.0) / total
+            if point < cumulative:
+                return outcome
+        return "active"
+
+
+def parse_outage(value):
+    start, _, duration = value.partition(":")
+    try:
+        return float(start), float(duration)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected START:DURATION in seconds, got '{value}'")
+
+
+def parse_mix(value):
+    mix = {}
+    for item in value.split(","):
+        name, _, weight = item.partition("=")
+        name = name.strip()
+        if name not in OUTCOMES:
+            raise argparse.ArgumentTypeError(f"unknown outcome '{name}' (expected one of {', '.join(OUTCOMES)})")
+        mix[name] = float(weight)
+    return mix
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    config = MockConfig()
+
+    def setup(self):
+        super().setup()
+        # Headers and body are written separately; without this, Nagle's
+        # algorithm adds ~40 ms to every keep-alive response.
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, body, headers=None):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def simulate_network(self):
+        """Apply latency and random failures; return True if a failure was sent."""
+        config = self.config
+        delay = config.latency + random.uniform(-config.jitter, config.jitter)
+        if random.random() < config.slow_rate:
+            # A slow edge node: the latency tail that hedged requests are meant to cut
+            delay += config.slow_latency
+        if delay > 0:
+            time.sleep(delay)
+        if config.in_outage():
+            self.send_json(503, {"error": {"message": "Mock outage"}, "detail": "Mock outage"})
+            return True
+        if random.random() < config.error_rate:
+            self.send_json(500, {"error": {"message": "Mock server error"}, "detail": "Mock server error"})
+            return True
+        if random.random() < config.throttle_rate:
+            self.send_json(429, {"error": {"message": "Mock rate limit", "code": "rate_limit_exceeded"},
+                                 "detail": "Mock rate limit"},
+                           {"Retry-After": "0"})
+            return True
+        return False
+
+    def read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length).decode() if length else ""
+
+    def bearer_token(self):
+        return self.headers.get("Authorization", "").removeprefix("Bearer ").strip()
+
+    # ----- OpenAI -----
+
+    def openai(self, path):
+        outcome = self.config.outcome(self.bearer_token())
+        if outcome == "invalid":
+            return self.send_json(401, {"error": {"message": "Incorrect API key provided",
+                                                  "type": "invalid_request_error", "code": "invalid_api_key"}})
+        if outcome == "forbidden":
+            return self.send_json(429, {"error": {"message": "You exceeded your current quota",
+                                                  "type": "insufficient_quota", "code": "insufficient_quota"}})
+        if path == "/v1/models":
+            return self.send_json(200, {"object": "list", "data": [
+                {"id": "gpt-3.5-turbo", "object": "model", "created": 0, "owned_by": "openai"}]})
+        return self.send_json(200, {
+            "id": "chatcmpl-mock", "object": "chat.completion", "created": int(time.time()),
+            "model": "gpt-3.5-turbo",
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": "Hello! Your API key is working."}}],
+            "usage": {"prompt_tokens": 10, "completion_tokens": 8, "total_tokens": 18},
+        })
+
+    # ----- Facebook -----
+
+    def facebook(self, path, query):
+        """Return (status, body) for one Graph API call."""
+        token = query.get("input_token") or query.get("access_token") or ""
+        outcome = self.config.outcome(token)
+        if path == "/debug_token":
+            if outcome == "invalid":
+                if "|" in query.get("access_token", ""):
+                    # Introspected with an app token, a dead token is described rather than rejected
+                    return 200, {"data": {"app_id": "1234567890", "is_valid": False, "scopes": [],
+                                          "error": {"code": 190, "message": "Error validating access token: "
+                                                                           "Session has expired."}}}
+                return 400, {"error": {"message": "Invalid OAuth access token.", "type": "OAuthException", "code": 190}}
+            return 200, {"data": self.facebook_token_data(token)}
+        if path.endswith("/me"):
+            if outcome == "invalid":
+                return 400, {"error": {"message": "Invalid OAuth access token.", "type": "OAuthException", "code": 190}}
+            if outcome == "forbidden":
+                return 403, {"error": {"message": "Permissions error", "type": "OAuthException", "code": 200}}
+            return 200, {"id": "42", "name": "Mock Page"}
+        return 404, {"error": {"message": f"Unknown path {path}"}}
+
+    def facebook_token_data(self, token):
+        """Deterministic debug_token metadata: token type, scopes and expiry vary per token."""
+        digest = hashlib.sha256(token.encode()).digest()
+        if "|" in token:
+            return {"app_id": token.split("|")[0], "type": "APP", "application": "Mock App", "is_valid": True}
+        scopes = ["public_profile"] + [scope for i, scope in enumerate(MOCK_SCOPES) if digest[8] >> i & 1]
+        # Half the tokens are long-lived; the rest expire within the next 90 days
+        expires_at = 0 if digest[9] < 128 else int(time.time()) + digest[10] * 90 * 86400 // 256
+        return {"app_id": "1234567890", "type": "PAGE" if digest[11] < 64 else "USER", "user_id": "42",
+                "expires_at": expires_at, "is_valid": True, "scopes": scopes}
+
+    def facebook_batch(self):
+        form = {key: values[0] for key, values in parse_qs(self.read_body()).items()}
+        authorizer = form.get("access_token", "")
+        if "|" not in authorizer and self.config.outcome(authorizer) == "invalid":
+            # Like the Graph API, a batch authorized by a dead token is rejected as a whole
+            return self.send_json(400, {"error": {"message": "Invalid OAuth access token.",
+                                                  "type": "OAuthException", "code": 190}})
+        responses = []
+        for request in json.loads(form.get("batch", "[]")):
+            url = urlsplit("/" + request["relative_url"].lstrip("/"))
+            query = {key: values[0] for key, values in parse_qs(url.query).items()}
+            # Sub-requests without their own token use the batch's
+            query.setdefault("access_token", form.get("access_token", ""))
+            status, body = self.facebook(url.path, query)
+            responses.append({"code": status, "headers": [], "body": json.dumps(body)})
+        self.send_json(200, responses)
+
+    # ----- Sentry -----
+
+    def sentry(self, url):
+        outcome = self.config.outcome(self.bearer_token())
+        if outcome == "invalid":
+            return self.send_json(401, {"detail": "Invalid token"})
+        if outcome == "forbidden":
+            return self.send_json(403, {"detail": "You do not have permission to perform this action."})
+
+        detail = ORGANIZATION_PATH.match(url.path)
+        if detail:
+            slug = detail.group(1)
+            return self.send_json(200, {"slug": slug, "name": slug.replace("-", " ").title(), "id": slug.split("-")[-1],
+                                        "status": {"id": "active", "name": "active"}, "access": MOCK_SENTRY_ACCESS})
+
+        if url.path == "/api/0/organizations/":
+            total = self.config.orgs
+            make = lambda i: {"slug": f"org-{i}", "name": f"Organization {i}", "id": str(i),
+                              "status": {"id": "active", "name": "active"}}
+        else:
+            match = PROJECTS_PATH.match(url.path)
+            if not match:
+                return self.send_json(404, {"detail": "Not found"})
+            kind = match.group(2)
+            total = self.config.projects
+            make = lambda i: {"slug": f"{kind}-{i}", "name": f"{kind.title()} {i}", "id": str(i),
+                              "platform": "python"}
+
+        query = parse_qs(url.query)
+        start = int(query.get("cursor", ["0:0:0"])[0].split(":")[1])
+        page_size = self.config.page_size
+        items = [make(i) for i in range(start, min(start + page_size, total))]
+
+        base = f"http://{self.headers.get('Host')}{url.path}"
+        has_previous = "true" if start > 0 else "false"
+        has_next = "true" if start + page_size < total else "false"
+        link = (f'<{base}?cursor=0:{max(0, start - page_size)}:1>; rel="previous"; '
+                f'results="{has_previous}"; cursor="0:{max(0, start - page_size)}:1", '
+                f'<{base}?cursor=0:{start + page_size}:0>; rel="next"; '
+                f'results="{has_next}"; cursor="0:{start + page_size}:0"')
+        self.send_json(200, items, {"Link": link})
+
+    # ----- Dispatch -----
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if self.simulate_network():
+            return
+        if url.path.startswith("/v1/"):
+            return self.openai(url.path)
+        if url.path.startswith("/api/0/"):
+            return self.sentry(url)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        status, body = self.facebook(url.path, query)
+        self.send_json(status, body)
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        if self.simulate_network():
+            self.read_body()
+            return
+        if url.path.startswith("/v1/"):
+            self.read_body()
+            return self.openai(url.path)
+        if url.path == "/":
+            return self.facebook_batch()
+        self.read_body()
+        self.send_json(404, {"error": {"message": f"Unknown path {url.path}"}})
+
+
+class MockServer(ThreadingHTTPServer):
+    # The default backlog of 5 drops connections under benchmark concurrency
+    request_queue_size = 1024
+    daemon_threads = True
+
+
+def start_server(config, host="127.0.0.1", port=0, certfile=None, keyfile=None):
+    """Start the mock server in a background thread and return it (server.server_port has the port)."""
+    handler = type("ConfiguredMockHandler", (MockHandler,), {"config": config})
+    server = MockServer((host, port), handler)
+    if certfile:
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(certfile, keyfile)
+        server.socket = context.wrap_socket(server.socket, server_side=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def add_config_arguments(parser):
+    parser.add_argument("--latency", type=float, default=0.0, help="mean response latency in milliseconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="uniform latency jitter in milliseconds")
+    parser.add_argument("--slow-rate", type=float, default=0.0,
+                        help="fraction of requests delayed by an extra --slow-latency")
+    parser.add_argument("--slow-latency", type=float, default=1000.0,
+                        help="extra latency of slow requests in milliseconds (default: 1000)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with a 500")
+    parser.add_argument("--throttle-rate", type=float, default=0.0,
+                        help="fraction of requests answered with a transient 429")
+    parser.add_argument("--outage", type=parse_outage, metavar="START:DURATION",
+                        help="answer every request with a 503 from START until START+DURATION seconds after startup")
+    parser.add_argument("--mix", type=parse_mix, default={"active": 1.0},
+                        help="token outcome weights, e.g. active=0.7,invalid=0.2,forbidden=0.1")
+    parser.add_argument("--orgs", type=int, default=3, help="Sentry organizations per token")
+    parser.add_argument("--projects", type=int, default=10, help="Sentry projects/teams/members per organization")
+    parser.add_argument("--page-size", type=int, default=100, help="Sentry items per page")
+
+
+def config_from_args(args):
+    return MockConfig(
+        latency=args.latency / 1000, jitter=args.jitter / 1000,
+        error_rate=args.error_rate, throttle_rate=args.throttle_rate, mix=args.mix,
+        orgs=args.orgs, projects=args.projects, page_size=args.page_size,
+        slow_rate=args.slow_rate, slow_latency=args.slow_latency / 1000, outage=args.outage,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run local mock OpenAI, Facebook and Sentry endpoints.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--certfile", metavar="FILE", help="serve HTTPS with this PEM certificate")
+    parser.add_argument("--keyfile", metavar="FILE", help="private key for --certfile (default: in the certificate file)")
+    add_config_arguments(parser)
+    args = parser.parse_args()
+
+    server = start_server(config_from_args(args), args.host, args.port, args.certfile, args.keyfile)
+    base_url = f"{'https' if args.certfile else 'http'}://{args.host}:{server.server_port}"
+    print("=" * 60)
+    print("Mock Provider Server")
+    print("=" * 60)
+    print(f"✓ Listening on {base_url}")
+    print(f"\n  OPENAI_BASE_URL={base_url}/v1")
+    print(f"  FACEBOOK_GRAPH_URL={base_url}")
+    print(f"  SENTRY_URL={base_url}")
+    print("\nPress Ctrl+C to stop.")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Expiry-Aware Secret Monitor
+Keeps re-checking a list of known secrets and reports only when something
+changes: a secret becomes invalid (or comes back), or a token is about to
+expire.
+
+Secrets wait in a priority queue ordered by their next check time, which is
+derived from the provider's cadence, the last status and, for Facebook
+tokens, the `expires_at` reported by debug_token. The monitor sleeps until the
+earliest one is due, so tens of thousands of secrets cost one heap operation
+per check rather than a fixed-interval sweep. Check times are jittered so
+checks do not arrive in bursts.
+
+Usage:
+  python monitor.py secrets.txt
+  python monitor.py secrets.txt --interval facebook=900 --expiry-warning 259200 --output ndjson
+
+The provider of each secret is detected with the offline pre-checks.
+"""
+
+import argparse
+import heapq
+import os
+import random
+import sys
+import time
+
+import transport
+from bulk_validate import Validator
+from precheck import detect_provider
+from provider_specs import SPECS
+from secret_io import (
+    STATUS_ACTIVE,
+    STATUS_ERROR,
+    STATUS_INVALID,
+    UNRESOLVED_STATUSES,
+    NDJSONWriter,
+    read_secrets,
+    redact,
+)
+
+# Seconds between checks of an active secret, per provider
+DEFAULT_INTERVALS = dict.fromkeys(SPECS, 3600)
+
+# Invalid secrets rarely come back; check them this much less often
+INVALID_INTERVAL_FACTOR = 24
+
+# Failed checks are retried after MIN_INTERVAL, doubling up to the normal cadence
+MIN_INTERVAL = 60
+
+DEFAULT_JITTER = 0.1
+DEFAULT_EXPIRY_WARNING = 7 * 24 * 3600
+DEFAULT_BATCH_SIZE = 200
+
+EVENT_STATUS = "status-changed"
+EVENT_EXPIRING = "expiring"
+EVENT_EXPIRED = "expired"
+
+
+def parse_intervals(value):
+    intervals = dict(DEFAULT_INTERVALS)
+    for item in value.split(","):
+        provider, _, seconds = item.partition("=")
+        provider = provider.strip()
+        if provider not in intervals:
+            raise argparse.ArgumentTypeError(f"unknown provider '{provider}'")
+        intervals[provider] = float(seconds)
+    return intervals
+
+
+class Monitor:
+    """Priority queue of secrets keyed by next check time."""
+
+    def __init__(self, intervals=None, jitter=DEFAULT_JITTER, expiry_warning=DEFAULT_EXPIRY_WARNING,
+                 batch_size=DEFAULT_BATCH_SIZE, concurrency=10, on_event=None):
+        self.intervals = intervals or dict(DEFAULT_INTERVALS)
+        self.jitter = jitter
+        self.expiry_warning = expiry_warning
+        self.batch_size = batch_size
+        self.validator = Validator(concurrency)
+        self.on_event = on_event or (lambda event: None)
+        self.entries = []
+        self.queue = []
+        self.sequence = 0
+
+    def add(self, provider, secret, warmup):
+        """Queue a secret for its first check somewhere within the next `warmup` seconds."""
+        entry = {"provider": provider, "secret": secret, "status": None,
+                 "expires_at": 0, "failures": 0, "warned": False}
+        self.entries.append(entry)
+        self.schedule(len(self.entries) - 1, time.time() + random.uniform(0, warmup))
+
+    def schedule(self, index, due):
+        self.sequence += 1
+        heapq.heappush(self.queue, (due, self.sequence, index))
+
+    def next_check(self, entry, now):
+        """When to check an entry again, given the outcome of its last check."""
+        interval = self.intervals[entry["provider"]]
+        if entry["failures"]:
+            interval = min(interval, MIN_INTERVAL * 2 ** (entry["failures"] - 1))
+        elif entry["status"] == STATUS_INVALID:
+            interval *= INVALID_INTERVAL_FACTOR
+        interval *= 1 + random.uniform(-self.jitter, self.jitter)
+        due = now + interval
+
+        expires_at = entry["expires_at"]
+        if expires_at and entry["status"] != STATUS_INVALID:
+            warn_at = expires_at - self.expiry_warning
+            if not entry["warned"] and warn_at > now:
+                due = min(due, warn_at)
+            elif expires_at > now:
+                # Confirm the token really is dead shortly after it expires
+                due = min(due, expires_at + MIN_INTERVAL)
+        return max(due, now + 1)
+
+    def emit(self, kind, entry, **fields):
+        self.on_event({"time": time.time(), "event": kind, "provider": entry["provider"],
+                       "prefix": redact(entry["secret"]), **fields})
+
+    def update(self, entry, result, now):
+        previous = entry["status"]
+        status = result["status"]
+        entry["failures"] = entry["failures"] + 1 if status in UNRESOLVED_STATUSES else 0
+        expires_at = result.get("token_data", {}).get("expires_at") or 0
+        if expires_at != entry["expires_at"]:
+            entry["expires_at"] = expires_at
+            entry["warned"] = False
+
+        # An error or an outage says nothing about the secret; keep the last real status
+        if status not in UNRESOLVED_STATUSES or previous is None:
+            entry["status"] = status
+            if previous not in (None, *UNRESOLVED_STATUSES) and status != previous:
+                self.emit(EVENT_STATUS, entry, previous=previous, status=status, error=result.get("error"))
+
+        if expires_at and entry["status"] != STATUS_INVALID and not entry["warned"]:
+            if expires_at <= now:
+                entry["warned"] = True
+                self.emit(EVENT_EXPIRED, entry, expires_at=expires_at)
+            elif expires_at - now <= self.expiry_warning:
+                entry["warned"] = True
+                self.emit(EVENT_EXPIRING, entry, expires_at=expires_at,
+                          remaining=round(expires_at - now))
+
+    def run_due(self):
+        """Check every secret that is due (up to batch_size) and reschedule it."""
+        now = time.time()
+        due = {}
+        while self.queue and self.queue[0][0] <= now and len(due) < self.batch_size:
+            _, _, index = heapq.heappop(self.queue)
+            due[index] = self.entries[index]
+
+        by_provider = {}
+        for index, entry in due.items():
+            by_provider.setdefault(entry["provider"], {})[entry["secret"]] = index
+
+        for provider, indexes in by_provider.items():
+            def on_result(result):
+                index = indexes.pop(result["secret"])
+                entry = self.entries[index]
+                self.update(entry, result, time.time())
+                self.schedule(index, self.next_check(entry, time.time()))
+
+            try:
+                self.validator.check(provider, list(indexes), on_result)
+            except BrokenPipeError:
+                raise
+            except Exception as e:
+                print(f"⚠ {provider} checks failed: {e}", file=sys.stderr)
+            # Secrets left without a result count as failed checks and stay queued
+            for secret in list(indexes):
+                on_result({"secret": secret, "provider": provider, "status": STATUS_ERROR, "error": "No result"})
+        return len(due)
+
+    def run(self, duration=None):
+        stop_at = time.time() + duration if duration else None
+        while self.queue:
+            now = time.time()
+            if stop_at is not None and now >= stop_at:
+                return
+            wait = self.queue[0][0] - now
+            if wait > 0:
+                time.sleep(min(wait, stop_at - now) if stop_at is not None else wait)
+                continue
+            self.run_due()
+
+    def status_counts(self):
+        counts = {}
+        for entry in self.entries:
+            status = entry["status"] or "pending"
+            counts[status] = counts.get(status, 0) + 1
+        return counts
+
+    def close(self):
+        self.validator.close()
+
+
+def print_event(event):
+    stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(event["time"]))
+    prefix = f"{stamp} [{event['provider']}] {event['prefix']}"
+    if event["event"] == EVENT_STATUS:
+        marker = "✓" if event["status"] == STATUS_ACTIVE else "✗"
+        print(f"{marker} {prefix}  {event['previous']} -> {event['status']}", flush=True)
+    else:
+        expiry = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(event["expires_at"]))
+        label = "expires" if event["event"] == EVENT_EXPIRING else "expired"
+        print(f"⚠ {prefix}  {label} at {expiry}", flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Continuously monitor known secrets and report state changes.")
+    parser.add_argument("secrets", help="file with one secret per line ('-' for stdin)")
+    parser.add_argument("--interval", type=parse_intervals, default=dict(DEFAULT_INTERVALS),
+                        metavar="PROVIDER=SECONDS[,...]",
+                        help="seconds between checks of an active secret (default: 3600 for every provider)")
+    parser.add_argument("--jitter", type=float, default=DEFAULT_JITTER,
+                        help=f"random spread applied to every interval, as a fraction (default: {DEFAULT_JITTER})")
+    parser.add_argument("--expiry-warning", type=int, default=DEFAULT_EXPIRY_WARNING, metavar="SECONDS",
+                        help="report tokens expiring within SECONDS (default: 7 days)")
+    parser.add_argument("--warmup", type=float, default=60, metavar="SECONDS",
+                        help="spread the first check of every secret over SECONDS (default: 60)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                        help=f"most secrets checked per round (default: {DEFAULT_BATCH_SIZE})")
+    parser.add_argument("--concurrency", type=int, default=10, help="secrets checked at once (default: 10)")
+    parser.add_argument("--duration", type=float, metavar="SECONDS", help="stop after SECONDS (default: run forever)")
+    parser.add_argument("--output", choices=("text", "ndjson"), default="text",
+                        help="event format on stdout (default: text)")
+    transport.add_transport_arguments(parser)
+    args = parser.parse_args()
+    if args.ca_bundle:
+        transport.set_ca_bundle(args.ca_bundle)
+
+    print("=" * 60, file=sys.stderr)
+    print("Expiry-Aware Secret Monitor", file=sys.stderr)
+    print("=" * 60, file=sys.stderr)
+    try:
+        from dotenv import load_dotenv
+        load_dotenv()
+    except ImportError:
+        pass
+
+    writer = NDJSONWriter(sys.stdout, flush_interval=0) if args.output == "ndjson" else None
+    monitor = Monitor(args.interval, max(0.0, args.jitter), args.expiry_warning,
+                      max(1, args.batch_size), max(1, args.concurrency),
+                      on_event=writer.write if writer else print_event)
+
+    skipped = 0
+    for secret in read_secrets(args.secrets):
+        provider = detect_provider(secret)
+        if provider is None:
+            skipped += 1
+            continue
+        monitor.add(provider, secret, args.warmup)
+    print(f"✓ Monitoring {len(monitor.entries)} secret(s)"
+          + (f", skipped {skipped} unrecognized line(s)" if skipped else ""), file=sys.stderr)
+    if not monitor.entries:
+        sys.exit(1)
+
+    try:
+        monitor.run(args.duration)
+    except KeyboardInterrupt:
+        pass
+    except BrokenPipeError:
+        # The reader went away; silence the interpreter's final flush of stdout
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        writer = None
+    finally:
+        monitor.close()
+        if writer is not None:
+            writer.flush()
+        counts = ", ".join(f"{status}: {count}" for status, count in sorted(monitor.status_counts().items()))
+        print(f"\nLast known states: {counts}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
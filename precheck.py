@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Offline Token Pre-Checks
+Rejects malformed candidates by prefix, length and charset before any network
+call is made, and decodes the payload embedded in Sentry organization tokens
+(`sntrys_`) to find which Sentry host the token belongs to.
+"""
+
+import base64
+import binascii
+import json
+import re
+
+from secret_io import STATUS_INVALID
+
+PLACEHOLDERS = {
+    "your-openai-api-key-here",
+    "your-facebook-access-token-here",
+    "your-sentry-auth-token-here",
+}
+
+OPENAI_PATTERN = re.compile(r"sk-(?:proj-|svcacct-|admin-)?[A-Za-z0-9_-]+")
+OPENAI_LENGTH = (40, 400)
+
+FACEBOOK_PATTERN = re.compile(r"EAA[A-Za-z0-9]+")
+FACEBOOK_LENGTH = (40, 1024)
+
+SENTRY_ORG_PREFIX = "sntrys_"
+SENTRY_USER_PATTERN = re.compile(r"sntryu_[0-9a-f]{64}")
+# Auth tokens created before prefixes were introduced are plain 64-char hex
+SENTRY_LEGACY_PATTERN = re.compile(r"[0-9a-f]{64}")
+SENTRY_PAYLOAD_PATTERN = re.compile(r"[A-Za-z0-9+/]+=*")
+SENTRY_SECRET_PATTERN = re.compile(r"[A-Za-z0-9+/]{20,}=*")
+
+
+def check_length(secret, bounds):
+    low, high = bounds
+    if not low <= len(secret) <= high:
+        return f"length {len(secret)} outside {low}-{high}"
+    return None
+
+
+def precheck_openai(secret):
+    if not secret.startswith("sk-"):
+        return "missing 'sk-' prefix"
+    if not OPENAI_PATTERN.fullmatch(secret):
+        return "unexpected characters"
+    return check_length(secret, OPENAI_LENGTH)
+
+
+def precheck_facebook(secret):
+    if not secret.startswith("EAA"):
+        return "missing 'EAA' prefix"
+    if not FACEBOOK_PATTERN.fullmatch(secret):
+        return "unexpected characters"
+    return check_length(secret, FACEBOOK_LENGTH)
+
+
+def sentry_org_token_payload(token):
+    """Decode the JSON payload of a `sntrys_` token, or return None if it is malformed.
+
+    Organization tokens look like `sntrys_<base64 JSON>_<base64 secret>`, where
+    the JSON holds the issue time, the instance URL, the region URL and the
+    organization slug.
+    """
+    if not token.startswith(SENTRY_ORG_PREFIX):
+        return None
+    encoded, _, secret = token[len(SENTRY_ORG_PREFIX):].rpartition("_")
+    if not SENTRY_PAYLOAD_PATTERN.fullmatch(encoded) or not SENTRY_SECRET_PATTERN.fullmatch(secret):
+        return None
+    try:
+        payload = json.loads(base64.b64decode(encoded + "=" * (-len(encoded) % 4)))
+    except (binascii.Error, ValueError):
+        return None
+    return payload if isinstance(payload, dict) else None
+
+
+def precheck_sentry(secret):
+    if secret.startswith(SENTRY_ORG_PREFIX):
+        payload = sentry_org_token_payload(secret)
+        if payload is None:
+            return "undecodable organization token payload"
+        if not payload.get("url"):
+            return "organization token payload has no instance URL"
+        return None
+    if secret.startswith("sntryu_"):
+        return None if SENTRY_USER_PATTERN.fullmatch(secret) else "malformed user token"
+    if SENTRY_LEGACY_PATTERN.fullmatch(secret):
+        return None
+    return "missing 'sntrys_'/'sntryu_' prefix"
+
+
+PRECHECKS = {
+    "openai": precheck_openai,
+    "facebook": precheck_facebook,
+    "sentry": precheck_sentry,
+}
+
+
+def precheck(provider, secret):
+    """Return None if the secret is plausible for the provider, otherwise the reason it is not."""
+    if not secret or secret in PLACEHOLDERS:
+        return "empty or placeholder value"
+    return PRECHECKS[provider](secret)
+
+
+def detect_provider(secret):
+    """Return the first provider whose pre-check the secret passes, or None."""
+    for provider in PRECHECKS:
+        if precheck(provider, secret) is None:
+            return provider
+    return None
+
+
+def split_plausible(provider, secret_values):
+    """Split secrets into offline rejections (as result dicts) and plausible candidates."""
+    rejected = []
+    plausible = []
+    for secret in secret_values:
+        reason = precheck(provider, secret)
+        if reason is None:
+            plausible.append(secret)
+        else:
+            rejected.append({"secret": secret, "provider": provider, "status": STATUS_INVALID,
+                             "error": f"Malformed: {reason}", "offline": True})
+    return rejected, plausible
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Provider Specs
+Declarative description of how each provider's secrets are validated, run by
+validation_engine.py.
+
+A spec names the provider's base URL, how the secret is sent (a header or a
+query parameter) and one or more probes. Each probe is a GET whose response is
+matched against an ordered list of rules; the first matching rule gives the
+verdict. A rule can match on:
+
+  status      an HTTP status code, or a collection of them (e.g. range(400, 500))
+  error_code  the JSON body's `error.code`, or a collection of codes
+  json        {"dotted.path": value} pairs that must all be equal in the body
+
+and its verdict is one of the shared statuses from secret_io.py, CONTINUE (go
+on to the next probe) or RETRY (throttled: back off and try again; once the
+retries are used up the rule's `exhausted` status, by default error, is
+reported). A response matching no rule is an error. `capture` copies parts of
+a probe's JSON body into the result, e.g. Facebook's token metadata.
+
+Adding a provider is a matter of adding an entry to SPECS; the bulk validator,
+the monitor and the daemon pick it up, along with the engine's pooling,
+concurrency limit, rate limiting, retries, adaptive timeouts and hedging.
+"""
+
+import os
+from urllib.parse import urlsplit
+
+from precheck import sentry_org_token_payload
+from secret_io import (
+    STATUS_ACTIVE,
+    STATUS_ACTIVE_INSUFFICIENT_SCOPE,
+    STATUS_ACTIVE_RATE_LIMITED,
+    STATUS_INVALID,
+)
+
+CONTINUE = "continue"
+RETRY = "retry"
+
+# Graph API error codes that mean "slow down" rather than "bad token"
+FACEBOOK_THROTTLE_CODES = {4, 17, 32, 613} | set(range(80000, 80015))
+
+# Overridable so the specs can be pointed at mock_providers.py
+OPENAI_URL = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1").rstrip("/")
+GRAPH_URL = os.getenv("FACEBOOK_GRAPH_URL", "https://graph.facebook.com").rstrip("/")
+GRAPH_API_VERSION = "v18.0"
+SENTRY_URL = os.getenv("SENTRY_URL", "https://sentry.io").rstrip("/")
+# Whether the user named the Sentry instance (SENTRY_URL or --sentry-url) rather than relying on the default
+SENTRY_URL_EXPLICIT = bool(os.getenv("SENTRY_URL"))
+
+SENTRY_CLOUD_DOMAIN = "sentry.io"
+
+
+def set_sentry_url(url):
+    """Send Sentry calls to the instance at `url`, here and in child processes."""
+    global SENTRY_URL, SENTRY_URL_EXPLICIT
+    SENTRY_URL = url.rstrip("/")
+    SENTRY_URL_EXPLICIT = True
+    os.environ["SENTRY_URL"] = SENTRY_URL
+
+
+def origin(url):
+    parts = urlsplit(url)
+    return parts.scheme, (parts.hostname or "").lower(), parts.port
+
+
+def trusted_sentry_url(url):
+    """Whether a token may be sent to a URL read from its own payload.
+
+    The payload of an organization token is not authenticated, so a crafted
+    token could name any host. Only https on sentry.io or one of its
+    subdomains is trusted, plus the instance the user configured explicitly.
+    """
+    try:
+        scheme, host, port = origin(url)
+    except ValueError:
+        return False
+    if SENTRY_URL_EXPLICIT and (scheme, host, port) == origin(SENTRY_URL):
+        return True
+    return (scheme == "https" and port in (None, 443)
+            and (host == SENTRY_CLOUD_DOMAIN or host.endswith("." + SENTRY_CLOUD_DOMAIN)))
+
+
+def sentry_payload_url(token, *fields):
+    """The first of `fields` present in an organization token's payload, if trusted; otherwise SENTRY_URL."""
+    payload = sentry_org_token_payload(token) or {}
+    for field in fields:
+        url = payload.get(field)
+        if url:
+            url = str(url).rstrip("/")
+            return url if trusted_sentry_url(url) else SENTRY_URL
+    return SENTRY_URL
+
+
+def sentry_instance_url(token):
+    """Organization tokens name their own Sentry instance; everything else goes to SENTRY_URL."""
+    return sentry_payload_url(token, "url")
+
+
+SPECS = {
+    "openai": {
+        "base_url": OPENAI_URL,
+        "auth": {"header": "Authorization", "format": "Bearer {secret}"},
+        "probes": [
+            {
+                # Listing models costs no tokens
+                "path": "/models",
+                "rules": [
+                    {"status": 200, "verdict": STATUS_ACTIVE},
+                    {"status": 401, "verdict": STATUS_INVALID},
+                    # Authenticated, but restricted (for example without the models scope)
+                    {"status": 403, "verdict": STATUS_ACTIVE_INSUFFICIENT_SCOPE},
+                    {"status": 429, "error_code": "insufficient_quota", "verdict": STATUS_ACTIVE_RATE_LIMITED},
+                    {"status": 429, "verdict": RETRY, "exhausted": STATUS_ACTIVE_RATE_LIMITED},
+                ],
+            },
+        ],
+    },
+    "facebook": {
+        "base_url": GRAPH_URL,
+        "auth": {"param": "access_token"},
+        "probes": [
+            {
+                "path": "/debug_token",
+                "params": {"input_token": "{secret}"},
+                "capture": {"token_data": "data"},
+                "rules": [
+                    {"status": 429, "verdict": RETRY},
+                    {"error_code": FACEBOOK_THROTTLE_CODES, "verdict": RETRY},
+                    {"status": 200, "json": {"data.is_valid": True}, "verdict": CONTINUE},
+                    {"status": 200, "verdict": STATUS_INVALID},
+                    {"status": range(400, 500), "verdict": STATUS_INVALID},
+                ],
+            },
+            {
+                "path": f"/{GRAPH_API_VERSION}/me",
+                "params": {"fields": "id,name"},
+                "capture": {"entity": ""},
+                "rules": [
+                    {"status": 429, "verdict": RETRY},
+                    {"error_code": FACEBOOK_THROTTLE_CODES, "verdict": RETRY},
+                    {"status": 200, "verdict": STATUS_ACTIVE},
+                ],
+            },
+        ],
+    },
+    "sentry": {
+        "base_url": sentry_instance_url,
+        "auth": {"header": "Authorization", "format": "Bearer {secret}"},
+        "probes": [
+            {
+                "path": "/api/0/organizations/",
+                "rules": [
+                    {"status": 200, "verdict": STATUS_ACTIVE},
+                    {"status": 401, "verdict": STATUS_INVALID},
+                    {"status": 403, "verdict": STATUS_ACTIVE_INSUFFICIENT_SCOPE},
+                    {"status": 429, "verdict": RETRY},
+                ],
+            },
+        ],
+    },
+}
+
+# Where a human-readable error message may be found in a JSON error body
+ERROR_MESSAGE_PATHS = ("error.message", "data.error.message", "detail")
@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+Adaptive Per-Provider Rate Limiter
+Token-bucket pacing shared by every OpenAI, Facebook Graph and Sentry call site.
+
+Each provider gets one bucket per process. Buckets start at a conservative
+rate and adapt to what the provider reports. `Retry-After` is a provider-wide
+signal and holds back the shared bucket. OpenAI's `x-ratelimit-*`, Sentry's
+`X-Sentry-Rate-Limit-*` and Facebook's `x-app-usage` headers describe the
+quota of the key or app that made the call, so they only pace further calls
+with that key; one leaked key with a tiny quota does not slow down the rest
+of a sweep. Throttled requests are retried after a jittered exponential
+backoff instead of being reported as failures.
+
+Starting rates can be overridden with an environment variable, e.g.
+  SECRET_TESTER_RATE_LIMITS="openai=50,facebook=5,sentry=20"
+"""
+
+import asyncio
+import collections
+import json
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+# (requests per second, burst size) used until the provider tells us otherwise
+DEFAULT_RATES = {
+    "openai": (20.0, 20),
+    "facebook": (10.0, 5),
+    "sentry": (10.0, 10),
+}
+
+MIN_RATE = 0.2
+MAX_RETRIES = 5
+BASE_BACKOFF = 0.5
+MAX_BACKOFF = 60.0
+
+# Keys whose own limits are being tracked; the least recently limited are forgotten first
+MAX_KEY_BUCKETS = 10_000
+
+# Facebook reports usage as a percentage of the app's quota; slow down past this
+FACEBOOK_USAGE_THRESHOLD = 75
+
+
+class TokenBucket:
+    """Thread-safe token bucket whose rate can change while it is in use."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.max_rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self):
+        """Take one token and return how long the caller must wait before using it."""
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.tokens -= 1
+            wait = max(0.0, -self.tokens / self.rate)
+            return max(wait, self.paused_until - now)
+
+    def try_acquire(self):
+        """Take one token only if it can be used right away; never waits."""
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+            if self.tokens < 1 or self.paused_until > now:
+                return False
+            self.tokens -= 1
+            return True
+
+    def acquire(self):
+        time.sleep(self.reserve())
+
+    async def acquire_async(self):
+        await asyncio.sleep(self.reserve())
+
+    def set_rate(self, rate):
+        with self.lock:
+            self._refill(time.monotonic())
+            self.rate = min(self.max_rate, max(MIN_RATE, rate))
+
+    def pause(self, seconds):
+        """Hold back every caller for `seconds`, e.g. after a Retry-After."""
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+_buckets = {}
+_key_buckets = collections.OrderedDict()
+_buckets_lock = threading.Lock()
+_rate_share = 1
+
+
+def configured_rates():
+    rates = dict(DEFAULT_RATES)
+    for item in os.getenv("SECRET_TESTER_RATE_LIMITS", "").split(","):
+        provider, _, rate = item.partition("=")
+        try:
+            rate = float(rate)
+        except ValueError:
+            continue
+        if rate > 0:
+            rates[provider.strip()] = (rate, max(1, int(rate)))
+    return rates
+
+
+def share_rates(count):
+    """Give this process 1/count of every provider's rate, for `count` processes sharing one quota.
+
+    Must be called before the first request; buckets that already exist keep their rate.
+    """
+    global _rate_share
+    _rate_share = max(1, count)
+
+
+def get_bucket(provider):
+    """Return the process-wide bucket for a provider."""
+    with _buckets_lock:
+        if provider not in _buckets:
+            rate, burst = configured_rates().get(provider, (10.0, 10))
+            _buckets[provider] = TokenBucket(rate / _rate_share, max(1, burst // _rate_share))
+        return _buckets[provider]
+
+
+def key_bucket(provider, key, create=False):
+    """Return the bucket for one key's own limits, or None if the key has not been limited."""
+    if key is None:
+        return None
+    shared = get_bucket(provider)
+    with _buckets_lock:
+        bucket = _key_buckets.get((provider, key))
+        if bucket is None and create:
+            bucket = _key_buckets[(provider, key)] = TokenBucket(shared.max_rate, shared.burst)
+            if len(_key_buckets) > MAX_KEY_BUCKETS:
+                _key_buckets.popitem(last=False)
+        elif bucket is not None:
+            _key_buckets.move_to_end((provider, key))
+        return bucket
+
+
+def acquire(provider, key=None):
+    """Wait until a request with `key` may be sent: first for the key's own limits, then the provider's."""
+    bucket = key_bucket(provider, key)
+    if bucket is not None:
+        bucket.acquire()
+    get_bucket(provider).acquire()
+
+
+async def acquire_async(provider, key=None):
+    bucket = key_bucket(provider, key)
+    if bucket is not None:
+        await bucket.acquire_async()
+    await get_bucket(provider).acquire_async()
+
+
+def parse_retry_after(value):
+    """Seconds to wait for a Retry-After header given as seconds or an HTTP date."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_duration(value):
+    """Parse OpenAI reset durations such as '20ms', '1s' or '6m0s' into seconds."""
+    if not value:
+        return None
+    total = 0.0
+    number = ""
+    i = 0
+    while i < len(value):
+        char = value[i]
+        if char.isdigit() or char == ".":
+            number += char
+        elif value.startswith("ms", i):
+            total += float(number or 0) / 1000
+            number = ""
+            i += 1
+        elif char in "hms":
+            total += float(number or 0) * {"h": 3600, "m": 60, "s": 1}[char]
+            number = ""
+        else:
+            return None
+        i += 1
+    return total + float(number or 0)
+
+
+def header(headers, name):
+    value = headers.get(name)
+    if value is None:
+        value = headers.get(name.lower())
+    return value
+
+
+def update_from_headers(provider, headers, key=None):
+    """Adapt pacing to the rate-limit headers of a response to a request made with `key`.
+
+    Retry-After pauses the provider's shared bucket. The per-key and per-app
+    quota headers only limit `key`; without a key they fall back to the
+    shared bucket.
+    """
+    if headers is None:
+        return
+
+    retry_after = parse_retry_after(header(headers, "Retry-After"))
+    if retry_after:
+        get_bucket(provider).pause(retry_after)
+
+    remaining = reset = None
+    if provider == "openai":
+        remaining = header(headers, "x-ratelimit-remaining-requests")
+        reset = parse_duration(header(headers, "x-ratelimit-reset-requests"))
+    elif provider == "sentry":
+        remaining = header(headers, "X-Sentry-Rate-Limit-Remaining")
+        reset_at = header(headers, "X-Sentry-Rate-Limit-Reset")
+        if reset_at:
+            try:
+                reset = float(reset_at) - time.time()
+            except ValueError:
+                reset = None
+    elif provider == "facebook":
+        try:
+            usage = json.loads(header(headers, "x-app-usage") or "{}")
+        except ValueError:
+            usage = {}
+        busiest = max([value for value in usage.values() if isinstance(value, (int, float))] or [0])
+        if busiest >= 100:
+            limit_key(provider, key, pause=60)
+        elif busiest >= FACEBOOK_USAGE_THRESHOLD:
+            limit_key(provider, key, fraction=(100 - busiest) / (100 - FACEBOOK_USAGE_THRESHOLD))
+        return
+
+    if remaining is None or reset is None:
+        return
+    try:
+        remaining = int(remaining)
+    except ValueError:
+        return
+    if remaining <= 0:
+        limit_key(provider, key, pause=max(reset, 0))
+    elif reset > 0:
+        # Spread what is left of the window evenly over the time until it resets
+        limit_key(provider, key, rate=remaining / reset)
+
+
+def limit_key(provider, key, pause=None, rate=None, fraction=None):
+    """Pause or slow down the bucket for `key`, or the shared bucket when there is no key.
+
+    A key bucket is only created once the key's own limit is tighter than the
+    provider's rate, so keys with ample quota cost nothing to track.
+    """
+    shared = get_bucket(provider)
+    if fraction is not None:
+        rate = shared.max_rate * fraction
+    constraining = pause or (rate is not None and rate < shared.max_rate)
+    bucket = shared if key is None else key_bucket(provider, key, create=constraining)
+    if bucket is None:
+        return
+    if pause is not None:
+        bucket.pause(pause)
+    else:
+        bucket.set_rate(rate)
+
+
+def backoff_delay(attempt, retry_after=None):
+    """Jittered exponential backoff, never shorter than the server's Retry-After."""
+    delay = random.uniform(0, min(MAX_BACKOFF, BASE_BACKOFF * 2 ** attempt))
+    if retry_after:
+        delay = max(delay, retry_after)
+    return delay
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+Validation Result Cache
+On-disk SQLite cache of validation verdicts shared by the key test scripts.
+
+Secrets are never stored: entries are keyed by an HMAC-SHA256 of the provider
+and secret, using a random salt generated once per cache file. Every entry has
+a TTL, and the least recently used entries are evicted once the cache grows
+past its entry or size limits.
+"""
+
+import atexit
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import sqlite3
+import time
+
+from secret_io import (
+    ACTIVE_STATUSES,
+    STATUS_ACTIVE,
+    STATUS_ACTIVE_RATE_LIMITED,
+    STATUS_ACTIVE_INSUFFICIENT_SCOPE,
+    STATUS_INVALID,
+)
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "secret-tester", "results.sqlite")
+DEFAULT_MAX_ENTRIES = 100_000
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+# Expired and least recently used entries are dropped every this many writes, and on close
+EVICT_EVERY = 256
+# Cache hits refresh last_used in batches of this many, with the next write, or on close
+TOUCH_BATCH = 256
+
+# How long each verdict stays trustworthy. Errors are never cached.
+DEFAULT_TTLS = {
+    STATUS_ACTIVE: 24 * 3600,
+    STATUS_ACTIVE_RATE_LIMITED: 3600,
+    STATUS_ACTIVE_INSUFFICIENT_SCOPE: 24 * 3600,
+    STATUS_INVALID: 7 * 24 * 3600,
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS results (
+    secret_hash TEXT PRIMARY KEY,
+    provider TEXT NOT NULL,
+    status TEXT NOT NULL,
+    metadata TEXT NOT NULL,
+    checked_at REAL NOT NULL,
+    expires_at REAL NOT NULL,
+    last_used REAL NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used);
+CREATE INDEX IF NOT EXISTS results_expires_at ON results (expires_at);
+"""
+
+
+def default_cache_path():
+    return os.getenv("SECRET_TESTER_CACHE", DEFAULT_CACHE_PATH)
+
+
+def ttl_until(expires_at, status):
+    """TTL for a token that stops working at the Unix timestamp `expires_at` (0 means never).
+
+    Only active verdicts are cut short by the expiry; a token that is already
+    invalid stays invalid, so its verdict keeps the full invalid TTL.
+    """
+    ttl = DEFAULT_TTLS.get(status, 0)
+    if status in ACTIVE_STATUSES and expires_at and expires_at > 0:
+        ttl = min(ttl, max(0, expires_at - time.time()))
+    return ttl
+
+
+class ResultCache:
+    """SQLite-backed verdict cache keyed by salted secret hashes."""
+
+    def __init__(self, path=None, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path or default_cache_path()
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, mode=0o700, exist_ok=True)
+        # The file holds the HMAC salt next to the hashes, so only its owner may read it
+        os.close(os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600))
+        self.db = sqlite3.connect(self.path, check_same_thread=False)
+        self.db.executescript(SCHEMA)
+        self.salt = self._load_salt()
+        self.touched = {}
+        self.writes = 0
+        atexit.register(self.close)
+
+    def _load_salt(self):
+        row = self.db.execute("SELECT value FROM meta WHERE key = 'salt'").fetchone()
+        if row:
+            return bytes(row[0])
+        salt = secrets.token_bytes(32)
+        with self.db:
+            self.db.execute("INSERT INTO meta (key, value) VALUES ('salt', ?)", (salt,))
+        return salt
+
+    def secret_hash(self, provider, secret):
+        return hmac.new(self.salt, f"{provider}:{secret}".encode(), hashlib.sha256).hexdigest()
+
+    def get(self, provider, secret, max_age):
+        """Return the cached entry for a secret if it is fresh enough, otherwise None.
+
+        An entry is returned only if it was checked at most `max_age` seconds ago
+        and its own TTL has not run out.
+        """
+        now = time.time()
+        secret_hash = self.secret_hash(provider, secret)
+        row = self.db.execute(
+            "SELECT status, metadata, checked_at FROM results "
+            "WHERE secret_hash = ? AND checked_at >= ? AND expires_at > ?",
+            (secret_hash, now - max_age, now),
+        ).fetchone()
+        if row is None:
+            return None
+
+        self.touched[secret_hash] = now
+        if len(self.touched) >= TOUCH_BATCH:
+            with self.db:
+                self._flush_touched()
+        status, metadata, checked_at = row
+        return {
+            "provider": provider,
+            "status": status,
+            "metadata": json.loads(metadata),
+            "checked_at": checked_at,
+            "age": now - checked_at,
+        }
+
+    def put(self, provider, secret, status, metadata=None, ttl=None):
+        """Store a verdict. Statuses without a TTL (such as errors) are not cached."""
+        if ttl is None:
+            ttl = DEFAULT_TTLS.get(status, 0)
+        if ttl <= 0:
+            return
+
+        now = time.time()
+        encoded = json.dumps(metadata or {}, sort_keys=True)
+        with self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO results "
+                "(secret_hash, provider, status, metadata, checked_at, expires_at, last_used, size) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (self.secret_hash(provider, secret), provider, status, encoded,
+                 now, now + ttl, now, len(encoded) + 128),
+            )
+            self._flush_touched()
+            self.writes += 1
+            if self.writes % EVICT_EVERY == 0:
+                self._evict()
+
+    def _flush_touched(self):
+        """Write the last_used times of recent cache hits; the caller commits."""
+        if self.touched:
+            self.db.executemany("UPDATE results SET last_used = ? WHERE secret_hash = ?",
+                                [(used, secret_hash) for secret_hash, used in self.touched.items()])
+            self.touched = {}
+
+    def _evict(self):
+        """Drop expired entries, then the least recently used ones until within limits."""
+        self.db.execute("DELETE FROM results WHERE expires_at <= ?", (time.time(),))
+
+        count, size = self.db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results").fetchone()
+        if count <= self.max_entries and size <= self.max_bytes:
+            return
+
+        excess = max(0, count - self.max_entries)
+        if excess:
+            self.db.execute(
+                "DELETE FROM results WHERE secret_hash IN "
+                "(SELECT secret_hash FROM results ORDER BY last_used LIMIT ?)",
+                (excess,),
+            )
+            size = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+
+        if size > self.max_bytes:
+            freed = 0
+            victims = []
+            for secret_hash, entry_size in self.db.execute(
+                    "SELECT secret_hash, size FROM results ORDER BY last_used"):
+                if size - freed <= self.max_bytes:
+                    break
+                victims.append((secret_hash,))
+                freed += entry_size
+            self.db.executemany("DELETE FROM results WHERE secret_hash = ?", victims)
+
+    def close(self):
+        if self.db is None:
+            return
+        with self.db:
+            self._flush_touched()
+            if self.writes:
+                self._evict()
+        self.db.close()
+        self.db = None
+        atexit.unregister(self.close)
+
+
+def open_cache(enabled=True):
+    """Open the shared cache, or return None if caching is disabled or unavailable."""
+    if not enabled:
+        return None
+    try:
+        return ResultCache()
+    except sqlite3.Error as e:
+        print(f"⚠ Result cache unavailable ({e}), continuing without it")
+        return None
+
+
+def print_cached_verdict(entry, label, prefix):
+    print(f"\n[Cache] Using cached result from {entry['age']:.0f}s ago (--max-age)")
+    print("\n" + "=" * 60)
+    print("🔑 KEY VALIDATION STATUS (cached)")
+    print("=" * 60)
+    if entry["status"] == STATUS_INVALID:
+        print("✗ Invalid Secret")
+    else:
+        print("✓ Active Secret")
+    print(f"  Prefix: {prefix}")
+    print(f"  Status: {label}")
+    print(f"  Checked at: {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(entry['checked_at']))}")
+    print("=" * 60)
+
+
+def result_metadata(result):
+    """The parts of a result dict that are safe to cache (everything but the secret)."""
+    return {key: value for key, value in result.items()
+            if key not in ("secret", "provider", "status", "cached")}
+
+
+def store_result(cache, result, ttl=None):
+    if cache is not None:
+        cache.put(result["provider"], result["secret"], result["status"], result_metadata(result), ttl)
+
+
+def split_cached(cache, provider, secret_values, max_age):
+    """Split secrets into results answered by the cache and secrets that still need checking."""
+    if cache is None or max_age is None:
+        return [], list(secret_values)
+
+    hits = []
+    misses = []
+    for secret in secret_values:
+        entry = cache.get(provider, secret, max_age)
+        if entry is None:
+            misses.append(secret)
+        else:
+            hits.append({"secret": secret, "provider": provider, "status": entry["status"],
+                         "cached": True, **entry["metadata"]})
+    return hits, misses
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Secret Input/Output Helpers
+Shared helpers used by the bulk modes of the key test scripts.
+"""
+
+import json
+import sys
+import time
+
+# Verdicts shared by every provider check
+STATUS_ACTIVE = "active"
+STATUS_ACTIVE_RATE_LIMITED = "active-rate-limited"
+STATUS_ACTIVE_INSUFFICIENT_SCOPE = "active-insufficient-scope"
+STATUS_INVALID = "invalid"
+STATUS_ERROR = "error"
+# Not checked because the provider was down (see circuit_breaker.py)
+STATUS_UNAVAILABLE = "unavailable"
+
+ACTIVE_STATUSES = (
+    STATUS_ACTIVE,
+    STATUS_ACTIVE_RATE_LIMITED,
+    STATUS_ACTIVE_INSUFFICIENT_SCOPE,
+)
+
+# Outcomes that say nothing about the secret itself
+UNRESOLVED_STATUSES = (STATUS_ERROR, STATUS_UNAVAILABLE)
+
+
+def iter_secrets(source):
+    """Yield one secret per line from a file path, or from stdin when source is '-'.
+
+    Blank lines and lines starting with '#' are skipped. Nothing is kept in
+    memory, so duplicates are yielded again.
+    """
+    if source == "-":
+        lines = sys.stdin
+    else:
+        lines = open(source, encoding="utf-8")
+
+    try:
+        for line in lines:
+            secret = line.strip()
+            if secret and not secret.startswith("#"):
+                yield secret
+    finally:
+        if lines is not sys.stdin:
+            lines.close()
+
+
+def read_secrets(source):
+    """Read one secret per line from a file path, or from stdin when source is '-'.
+
+    Blank lines and lines starting with '#' are skipped, and duplicates are
+    dropped while keeping the original order.
+    """
+    return list(dict.fromkeys(iter_secrets(source)))
+
+
+def chunked(iterable, size):
+    """Yield lists of up to `size` items, deduplicated within each list."""
+    chunk = {}
+    for item in iterable:
+        chunk[item] = None
+        if len(chunk) >= size:
+            yield list(chunk)
+            chunk = {}
+    if chunk:
+        yield list(chunk)
+
+
+def redact(secret, length=10):
+    """Return the printable prefix of a secret, as shown in the status banners."""
+    return f"{secret[:length]}..."
+
+
+def result_record(result, prefix_length=10):
+    """Compact, secret-free record of one result for machine-readable output."""
+    metadata = {key: value for key, value in result.items()
+                if key not in ("secret", "provider", "status", "elapsed", "cached")}
+    record = {
+        "prefix": redact(result["secret"], prefix_length),
+        "provider": result["provider"],
+        "status": result["status"],
+        "metadata": metadata,
+        "elapsed": round(result.get("elapsed", 0.0), 6),
+    }
+    if result.get("cached"):
+        record["cached"] = True
+    return record
+
+
+class NDJSONWriter:
+    """Buffered writer of one JSON object per line.
+
+    Lines are collected up to `buffer_size` bytes and written together, but
+    never held longer than `flush_interval` seconds, so a consumer reading
+    the stream sees verdicts promptly while the writer uses constant memory.
+    """
+
+    def __init__(self, stream=None, buffer_size=64 * 1024, flush_interval=1.0):
+        self.stream = stream or sys.stdout
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self.lines = []
+        self.size = 0
+        self.flushed_at = time.monotonic()
+
+    def write(self, record):
+        line = json.dumps(record, separators=(",", ":"), default=str) + "\n"
+        self.lines.append(line)
+        self.size += len(line)
+        if self.size >= self.buffer_size or time.monotonic() - self.flushed_at >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        if self.lines:
+            self.stream.write("".join(self.lines))
+            self.lines = []
+            self.size = 0
+        self.stream.flush()
+        self.flushed_at = time.monotonic()
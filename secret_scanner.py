@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+Secret Discovery Scanner
+Walks a directory tree looking for OpenAI, Facebook/Meta and Sentry secrets
+and optionally hands the unique candidates to the key test scripts' validators.
+Every occurrence is recorded in the dedupe index (dedupe_index.py), so repeats
+are folded together before validation and later runs can tell new secrets
+from ones already seen.
+
+All provider patterns are matched in a single combined pass over each file.
+Large files are read through mmap and split into overlapping ranges so that
+one huge log can be spread across the whole process pool.
+
+Usage:
+  python secret_scanner.py path/to/repo
+  python secret_scanner.py path/to/repo --workers 8 --validate
+  python secret_scanner.py /var/log --validate --new-only
+"""
+
+import argparse
+import itertools
+import mmap
+import os
+import re
+import sys
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import dedupe_index
+from secret_io import ACTIVE_STATUSES, redact
+
+# One alternation with a named group per provider, so every file is scanned once
+SECRET_PATTERN = re.compile(
+    rb"(?P<openai>\bsk-(?:proj-|svcacct-|admin-)?[A-Za-z0-9_-]{20,})"
+    rb"|(?P<facebook>\bEAA[A-Za-z0-9]{30,})"
+    rb"|(?P<sentry>\bsntry[su]_[A-Za-z0-9+/=_-]{30,})"
+)
+PROVIDERS = ("openai", "facebook", "sentry")
+
+# Longest secret we expect to match; used as the overlap between file ranges
+MAX_SECRET_LENGTH = 1024
+
+# Files larger than this are memory-mapped instead of read into memory
+MMAP_THRESHOLD = 1024 * 1024
+
+# Files larger than this are split into several ranges scanned in parallel
+RANGE_SIZE = 64 * 1024 * 1024
+
+# File ranges sent to a worker per task, to keep inter-process overhead low
+BATCH_SIZE = 16
+
+# Tasks kept in flight per worker; the file walk only runs this far ahead of the scan
+TASKS_PER_WORKER = 2
+
+SKIP_DIRS = {".git", ".hg", ".svn", "node_modules", "__pycache__", ".venv", "venv", ".tox", ".mypy_cache"}
+
+
+def iter_files(root, skip_dirs=SKIP_DIRS):
+    """Yield every regular file below root, without following symlinks."""
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        try:
+            entries = os.scandir(directory)
+        except OSError:
+            continue
+        with entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if entry.name not in skip_dirs:
+                            stack.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        yield entry.path, entry.stat(follow_symlinks=False).st_size
+                except OSError:
+                    continue
+
+
+def iter_work(root):
+    """Yield (path, start, end) ranges covering every non-empty file below root."""
+    if os.path.isfile(root):
+        files = [(root, os.path.getsize(root))]
+    else:
+        files = iter_files(root)
+
+    for path, size in files:
+        if size == 0:
+            continue
+        for start in range(0, size, RANGE_SIZE):
+            yield path, start, min(start + RANGE_SIZE, size)
+
+
+def find_secrets(data, start=0, end=None):
+    """Return (provider, secret, offset) for matches starting inside [start, end).
+
+    The search runs up to MAX_SECRET_LENGTH bytes past `end` so that a secret
+    straddling the range boundary is still seen whole by the range it starts in.
+    """
+    if end is None:
+        end = len(data)
+    search_end = min(end + MAX_SECRET_LENGTH, len(data))
+
+    found = []
+    for match in SECRET_PATTERN.finditer(data, start, search_end):
+        if match.start() >= end:
+            break
+        provider = match.lastgroup
+        found.append((provider, match.group(provider).decode("ascii"), match.start()))
+    return found
+
+
+def scan_range(work):
+    """Scan one file range; runs inside a worker process."""
+    path, start, end = work
+    try:
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size == 0:
+                return path, []
+            if size <= MMAP_THRESHOLD:
+                return path, find_secrets(f.read(), start, end)
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                return path, find_secrets(data, start, end)
+    except (OSError, ValueError):
+        return path, []
+
+
+def scan_batch(batch):
+    return [scan_range(work) for work in batch]
+
+
+def iter_batches(items, size=BATCH_SIZE):
+    items = iter(items)
+    while True:
+        batch = list(itertools.islice(items, size))
+        if not batch:
+            return
+        yield batch
+
+
+def scan(root, index, workers=None):
+    """Scan a tree, recording every occurrence in the dedupe index.
+
+    Returns {(provider, secret): known} for the unique candidates of this run,
+    where `known` says whether an earlier run had already seen the secret.
+    Locations and counts stay in the index.
+    """
+    candidates = {}
+    workers = workers or os.cpu_count() or 1
+    batches = iter_batches(iter_work(root))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # Submit from a bounded window so memory does not grow with the size of the tree
+        pending = {executor.submit(scan_batch, batch)
+                   for batch in itertools.islice(batches, workers * TASKS_PER_WORKER)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                for path, found in future.result():
+                    for provider, secret, offset in found:
+                        record_occurrence(index, candidates, provider, secret, f"{path}@{offset}")
+                batch = next(batches, None)
+                if batch is not None:
+                    pending.add(executor.submit(scan_batch, batch))
+    return candidates
+
+
+def record_occurrence(index, candidates, provider, secret, location):
+    outcome = index.add(provider, secret, location)
+    if outcome != dedupe_index.OCCURRENCE_REPEAT:
+        candidates[(provider, secret)] = outcome == dedupe_index.OCCURRENCE_KNOWN
+
+
+def print_candidates(candidates, index):
+    """Print every unique candidate with its counts and latest locations from the index."""
+    known = sum(candidates.values())
+    print(f"✓ Found {len(candidates)} unique candidate(s) in {index.run_occurrences} occurrence(s)")
+    if known:
+        print(f"  {known} already seen in an earlier scan, {len(candidates) - known} new")
+    for (provider, secret), seen_before in sorted(candidates.items()):
+        info = index.describe(provider, secret)
+        note = f", {info['total']} across all scans" if seen_before else ", new"
+        print(f"\n  [{provider}] {redact(secret, 12)}  ({info['count']} occurrence(s){note})")
+        for location in info["locations"]:
+            print(f"    {location}")
+
+
+def to_validate(candidates, new_only):
+    """The candidates to validate: all unique ones, or only those never seen before."""
+    if not new_only:
+        return list(candidates)
+    return [candidate for candidate, seen_before in candidates.items() if not seen_before]
+
+
+def validate(candidates, concurrency):
+    """Hand unique candidates to the per-provider validators of the key test scripts."""
+    secrets_by_provider = {provider: [] for provider in PROVIDERS}
+    for provider, secret in candidates:
+        secrets_by_provider[provider].append(secret)
+
+    results = []
+    if secrets_by_provider["openai"]:
+        import test_openai_key
+        results += test_openai_key.check_keys(secrets_by_provider["openai"], concurrency=concurrency)
+    if secrets_by_provider["facebook"]:
+        import test_facebook_key
+        results += test_facebook_key.check_tokens(secrets_by_provider["facebook"])
+    if secrets_by_provider["sentry"]:
+        import test_sentry_key
+        results += test_sentry_key.check_tokens(secrets_by_provider["sentry"])
+    return results
+
+
+def print_validation_summary(results):
+    """Print one line per validated candidate and return the number of active secrets."""
+    active = [result for result in results if result["status"] in ACTIVE_STATUSES]
+    print("\n" + "=" * 60)
+    print("🔑 KEY VALIDATION SUMMARY")
+    print("=" * 60)
+    for result in results:
+        marker = "✓" if result["status"] in ACTIVE_STATUSES else "✗"
+        print(f"{marker} [{result['provider']}] {redact(result['secret'], 12)}  {result['status']}")
+    print(f"\n  Active secrets: {len(active)} of {len(results)}")
+    print("=" * 60)
+    return len(active)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Find OpenAI, Facebook and Sentry secrets in a directory tree.")
+    parser.add_argument("path", help="directory or file to scan")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="number of scanner processes (default: one per CPU)")
+    parser.add_argument("--validate", action="store_true",
+                        help="check every unique candidate against its provider")
+    parser.add_argument("--concurrency", type=int, default=10,
+                        help="concurrent OpenAI checks when validating (default: 10)")
+    dedupe_index.add_index_arguments(parser)
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("Secret Discovery Scanner")
+    print("=" * 60)
+
+    print(f"\n[Step 1] Scanning {args.path}...")
+    if not os.path.exists(args.path):
+        print(f"✗ Path not found: {args.path}")
+        sys.exit(1)
+    index = dedupe_index.open_index(args.index, persistent=not args.no_index)
+    try:
+        candidates = scan(args.path, index, args.workers)
+        print_candidates(candidates, index)
+    finally:
+        index.close()
+
+    pending = to_validate(candidates, args.new_only)
+    if not args.validate or not pending:
+        return
+
+    print(f"\n[Step 2] Validating {len(pending)} unique candidate(s)...")
+    results = validate(pending, max(1, args.concurrency))
+
+    if print_validation_summary(results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
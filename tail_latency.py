@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Adaptive Timeouts and Hedged Requests
+Keeps the tail latency of bulk validation in check.
+
+Every provider call records how long it took, per provider. Once enough
+samples have been seen, `timeout(provider)` returns a multiple of the
+observed p99 instead of a fixed ten seconds, so a stalled edge node costs a
+couple of seconds per token rather than ten.
+
+With hedging enabled (--hedge, or SECRET_TESTER_HEDGE=1), a read-only probe
+that is still unanswered after the provider's observed p95 is sent a second
+time and whichever copy answers first is used. Hedges are limited to
+HEDGE_BUDGET of all calls and each one needs a free token from the provider's
+rate-limit bucket, so a provider that is slow across the board is not sent
+twice the traffic.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import rate_limiter
+
+# Used until MIN_SAMPLES latencies have been observed, and as the upper bound afterwards
+DEFAULT_TIMEOUT = 10.0
+MIN_TIMEOUT = 2.0
+TIMEOUT_MULTIPLIER = 4.0
+MIN_SAMPLES = 20
+# Percentiles are computed over the most recent WINDOW calls only
+WINDOW = 500
+
+HEDGE_PERCENTILE = 0.95
+HEDGE_BUDGET = 0.1
+HEDGE_WORKERS = 64
+
+_hedging = os.getenv("SECRET_TESTER_HEDGE", "").lower() in ("1", "true", "yes")
+
+
+class LatencyTracker:
+    """Thread-safe sliding window of one provider's call latencies."""
+
+    def __init__(self, window=WINDOW):
+        self.samples = deque(maxlen=window)
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def observe(self, seconds):
+        with self.lock:
+            self.samples.append(seconds)
+
+    def percentile(self, fraction):
+        """Nearest-rank percentile of the window, or None while there are too few samples."""
+        with self.lock:
+            if len(self.samples) < MIN_SAMPLES:
+                return None
+            values = sorted(self.samples)
+        return values[min(len(values) - 1, int(fraction * len(values)))]
+
+    def timeout(self):
+        p99 = self.percentile(0.99)
+        if p99 is None:
+            return DEFAULT_TIMEOUT
+        return max(MIN_TIMEOUT, min(DEFAULT_TIMEOUT, p99 * TIMEOUT_MULTIPLIER))
+
+    def start_call(self):
+        with self.lock:
+            self.calls += 1
+
+    def allow_hedge(self):
+        """Reserve one hedge if the budget allows it."""
+        with self.lock:
+            if self.hedges >= HEDGE_BUDGET * self.calls:
+                return False
+            self.hedges += 1
+            return True
+
+    def count_hedge_win(self):
+        with self.lock:
+            self.hedge_wins += 1
+
+    def stats(self):
+        with self.lock:
+            return {"calls": self.calls, "hedges": self.hedges, "hedge_wins": self.hedge_wins,
+                    "samples": len(self.samples)}
+
+
+_trackers = {}
+_trackers_lock = threading.Lock()
+_executor = None
+
+
+def get_tracker(provider):
+    """Return the process-wide latency tracker for a provider."""
+    with _trackers_lock:
+        if provider not in _trackers:
+            _trackers[provider] = LatencyTracker()
+        return _trackers[provider]
+
+
+def timeout(provider):
+    """Request timeout for a provider, derived from its observed p99 latency."""
+    return get_tracker(provider).timeout()
+
+
+def enable_hedging(enabled=True):
+    global _hedging
+    _hedging = enabled
+
+
+def add_hedging_argument(parser):
+    parser.add_argument("--hedge", action="store_true",
+                        help="re-send read-only probes slower than the provider's p95 and use the first answer")
+
+
+def hedging_summary():
+    """One line per provider that sent hedged requests, for the end-of-run output."""
+    lines = []
+    with _trackers_lock:
+        trackers = dict(_trackers)
+    for provider, tracker in sorted(trackers.items()):
+        stats = tracker.stats()
+        if stats["hedges"]:
+            lines.append(f"{provider}: {stats['hedges']} of {stats['calls']} call(s), "
+                         f"{stats['hedge_wins']} answered first by the hedge")
+    return lines
+
+
+def _get_executor():
+    global _executor
+    with _trackers_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=HEDGE_WORKERS, thread_name_prefix="hedge")
+        return _executor
+
+
+def _hedge_delay(tracker):
+    if not _hedging:
+        return None
+    return tracker.percentile(HEDGE_PERCENTILE)
+
+
+def _may_hedge(provider, tracker):
+    return tracker.allow_hedge() and rate_limiter.get_bucket(provider).try_acquire()
+
+
+def _first_answer(done, attempts, answers):
+    """The first finished attempt that produced an answer, and the first error seen otherwise."""
+    error = None
+    for attempt in attempts:
+        if attempt not in done:
+            continue
+        exception = attempt.exception()
+        if exception is None or isinstance(exception, answers):
+            return attempt, None
+        error = error or exception
+    return None, error
+
+
+def _discard(future):
+    if future.cancelled() or future.exception() is not None:
+        return
+    close = getattr(future.result(), "close", None)
+    if close:
+        close()
+
+
+def hedged(provider, call, answers=()):
+    """Run `call()` (one read-only request), hedging it once if it is slower than p95.
+
+    Exceptions listed in `answers` count as a definitive answer; any other
+    exception only wins if no attempt succeeds. The caller has already taken
+    a rate-limit token for the first attempt.
+    """
+    tracker = get_tracker(provider)
+    tracker.start_call()
+    delay = _hedge_delay(tracker)
+    started = time.monotonic()
+    if delay is None:
+        try:
+            return call()
+        finally:
+            tracker.observe(time.monotonic() - started)
+
+    executor = _get_executor()
+    attempts = [executor.submit(call)]
+    done, pending = wait(attempts, timeout=delay)
+    if not done and _may_hedge(provider, tracker):
+        attempts.append(executor.submit(call))
+        pending = set(attempts)
+
+    winner, error = _first_answer(done, attempts, answers)
+    while winner is None and pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        winner, error = _first_answer(set(attempts) - pending, attempts, answers)
+    tracker.observe(time.monotonic() - started)
+
+    for attempt in attempts:
+        if attempt is not winner:
+            attempt.add_done_callback(_discard)
+    if winner is None:
+        raise error
+    if winner is not attempts[0]:
+        tracker.count_hedge_win()
+    return winner.result()
+
+
+async def hedged_async(provider, make_call, answers=()):
+    """Async counterpart of hedged(); `make_call()` returns a fresh coroutine per attempt.
+
+    The losing attempt is cancelled as soon as an answer arrives.
+    """
+    tracker = get_tracker(provider)
+    tracker.start_call()
+    delay = _hedge_delay(tracker)
+    started = time.monotonic()
+    if delay is None:
+        try:
+            return await make_call()
+        finally:
+            tracker.observe(time.monotonic() - started)
+
+    attempts = [asyncio.ensure_future(make_call())]
+    try:
+        done, pending = await asyncio.wait(attempts, timeout=delay)
+        if not done and _may_hedge(provider, tracker):
+            attempts.append(asyncio.ensure_future(make_call()))
+            pending = set(attempts)
+
+        winner, error = _first_answer(done, attempts, answers)
+        while winner is None and pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            winner, error = _first_answer(set(attempts) - pending, attempts, answers)
+    finally:
+        for attempt in attempts:
+            if not attempt.done():
+                attempt.cancel()
+    tracker.observe(time.monotonic() - started)
+
+    if winner is None:
+        raise error
+    if winner is not attempts[0]:
+        tracker.count_hedge_win()
+    return winner.result()
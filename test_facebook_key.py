@@ -2,206 +2,691 @@
 """
 Facebook/Meta API Key Test Script
 Tests whether your Facebook/Meta API access token is active and can make successful API calls.
+
+Batch mode packs the debug_token and /me checks for many tokens into Graph API
+batch requests (up to 50 sub-requests per POST):
+  python test_facebook_key.py --batch tokens.txt
+  cat tokens.txt | python test_facebook_key.py --batch -
+
+With --output ndjson, batch mode streams one JSON record per token to stdout
+(progress and the summary go to stderr):
+  python test_facebook_key.py --batch tokens.txt --output ndjson > results.ndjson
+
+Results are cached on disk (see result_cache.py) until the token's own
+expiry at the latest; pass --max-age SECONDS to accept a cached verdict.
+
+Step and HTTP timings can be exported with --metrics-json FILE and
+--metrics-prom FILE (see instrumentation.py).
+
+Requests go over the shared HTTP/2 transport (see transport.py) and
+certificates are always verified; behind a TLS-intercepting proxy, pass
+--ca-bundle FILE.
 """
 
+import argparse
+import hashlib
+import hmac
+import json
 import os
 import sys
-import requests
+import time
+from contextlib import redirect_stdout
 from datetime import datetime
-import urllib3
-
-# Disable SSL warnings if verification is disabled
-urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
-
-print("=" * 60)
-print("Facebook/Meta API Key Test Script")
-print("=" * 60)
-
-# Load environment variables from .env file
-print("\n[Step 1] Loading environment variables from .env file...")
-try:
-    from dotenv import load_dotenv
-    load_dotenv()
-    print("✓ Environment variables loaded from .env file")
-except ImportError:
-    print("✗ python-dotenv package not found!")
-    print("\nPlease install it using:")
-    print("  pip install python-dotenv requests")
-    sys.exit(1)
-
-# Check if requests package is installed
-print("\n[Step 2] Checking if 'requests' package is installed...")
-try:
-    import requests
-    print(f"✓ Requests package found (version: {requests.__version__})")
-except ImportError:
-    print("✗ Requests package not found!")
-    print("\nPlease install it using:")
-    print("  pip install requests")
-    sys.exit(1)
-
-# Check for API key
-print("\n[Step 3] Checking for Facebook/Meta access token...")
-access_token = os.getenv("FACEBOOK_ACCESS_TOKEN")
-
-if not access_token or access_token == "your-facebook-access-token-here":
-    print("✗ FACEBOOK_ACCESS_TOKEN not set or still has default value!")
-    print("\nPlease update the .env file with your actual access token:")
-    print("  1. Open the .env file in this directory")
-    print("  2. Replace 'your-facebook-access-token-here' with your actual Facebook access token")
-    sys.exit(1)
-
-print(f"✓ Access token found (starts with: {access_token[:15]}...)")
-
-# Test 1: Debug token to get token info
-print("\n[Step 4] Validating access token with Facebook's debug endpoint...")
-print("Checking token validity and metadata...")
-
-# Try with SSL verification first, fall back to without if needed
-verify_ssl = True
-ssl_error_occurred = False
-
-try:
-    debug_url = "https://graph.facebook.com/debug_token"
-    params = {
-        "input_token": access_token,
-        "access_token": access_token
+from urllib.parse import urlencode
+
+import httpx
+
+import circuit_breaker
+import rate_limiter
+import tail_latency
+import transport
+from instrumentation import RECORDER, add_metrics_arguments, export_metrics
+from precheck import precheck, split_plausible
+from provider_specs import FACEBOOK_THROTTLE_CODES, GRAPH_API_VERSION, GRAPH_URL
+from result_cache import open_cache, print_cached_verdict, split_cached, store_result, ttl_until
+from secret_io import (
+    STATUS_ACTIVE,
+    STATUS_ERROR,
+    STATUS_INVALID,
+    STATUS_UNAVAILABLE,
+    ACTIVE_STATUSES,
+    NDJSONWriter,
+    chunked,
+    iter_secrets,
+    read_secrets,
+    redact,
+    result_record,
+)
+
+# The Graph API accepts at most 50 sub-requests per batch call, and every
+# token needs two of them (debug_token and /me).
+MAX_BATCH_REQUESTS = 50
+TOKENS_PER_BATCH = MAX_BATCH_REQUESTS // 2
+
+# Batch calls tried per chunk, each authorized by a different token, before
+# the chunk falls back to individual checks
+MAX_BATCH_AUTHORIZERS = 3
+
+# Failures that count against the Graph API's circuit breaker
+NETWORK_ERRORS = (httpx.TransportError,)
+
+# Tokens validated per round when streaming NDJSON output
+STREAM_CHUNK_SIZE = 1000
+
+STATUS_LABELS = {
+    STATUS_ACTIVE: "ACTIVE and operational",
+    STATUS_INVALID: "INVALID or EXPIRED",
+    STATUS_ERROR: "UNKNOWN (API call failed)",
+    STATUS_UNAVAILABLE: "UNKNOWN (provider unavailable)",
+}
+
+
+def load_environment():
+    print("\n[Step 1] Loading environment variables from .env file...")
+    with RECORDER.span("load_environment", "facebook"):
+        try:
+            from dotenv import load_dotenv
+            load_dotenv()
+            print("✓ Environment variables loaded from .env file")
+        except ImportError:
+            print("✗ python-dotenv package not found!")
+            print("\nPlease install it using:")
+            print("  pip install python-dotenv 'httpx[http2]'")
+            sys.exit(1)
+
+
+def check_http2_support():
+    print("\n[Step 2] Checking HTTP client support...")
+    print(f"✓ httpx package found (version: {httpx.__version__})")
+    if transport.HTTP2_AVAILABLE:
+        print("✓ h2 package found, connections will use HTTP/2")
+    else:
+        print("⚠ h2 package not found, connections will use HTTP/1.1 (pip install 'httpx[http2]')")
+
+
+def format_expiry(token_data):
+    if "expires_at" in token_data and token_data["expires_at"] > 0:
+        expiry_date = datetime.fromtimestamp(token_data["expires_at"])
+        return expiry_date.strftime('%Y-%m-%d %H:%M:%S')
+    return "Never (long-lived token)"
+
+
+def print_token_details(token_data, indent="  "):
+    print(f"{indent}App ID: {token_data.get('app_id', 'N/A')}")
+    print(f"{indent}Type: {token_data.get('type', 'N/A')}")
+    print(f"{indent}User ID: {token_data.get('user_id', 'N/A')}")
+    print(f"{indent}Expires at: {format_expiry(token_data)}")
+    if "scopes" in token_data:
+        print(f"{indent}Scopes: {', '.join(token_data['scopes'])}")
+
+
+def app_token_from_env():
+    app_token = os.getenv("FACEBOOK_APP_TOKEN")
+    if app_token:
+        return app_token
+    app_id, app_secret = os.getenv("FACEBOOK_APP_ID"), os.getenv("FACEBOOK_APP_SECRET")
+    if app_id and app_secret:
+        return f"{app_id}|{app_secret}"
+    return None
+
+
+def appsecret_proof(app_token):
+    """HMAC of the access token keyed with the app secret, required by apps that enforce it."""
+    _, _, app_secret = app_token.partition("|")
+    return hmac.new(app_secret.encode(), app_token.encode(), hashlib.sha256).hexdigest()
+
+
+def auth_params(app_token):
+    return {"access_token": app_token, "appsecret_proof": appsecret_proof(app_token)}
+
+
+def batch_authorizers(tokens):
+    """Tokens to authorize a chunk's batch call with, in order: the app token if one is configured, then the chunk's own."""
+    app_token = app_token_from_env()
+    authorizers = [app_token] if app_token else []
+    return (authorizers + tokens)[:MAX_BATCH_AUTHORIZERS]
+
+
+def batch_auth_params(authorizer):
+    if "|" in authorizer:
+        return auth_params(authorizer)
+    return {"access_token": authorizer}
+
+
+def build_batch(tokens):
+    """Build the Graph API sub-requests for a chunk of tokens, two per token."""
+    batch = []
+    for token in tokens:
+        debug_query = urlencode({"input_token": token, "access_token": token})
+        me_query = urlencode({"fields": "id,name", "access_token": token})
+        batch.append({"method": "GET", "relative_url": f"debug_token?{debug_query}"})
+        batch.append({"method": "GET", "relative_url": f"{GRAPH_API_VERSION}/me?{me_query}"})
+    return batch
+
+
+def parse_sub_response(sub_response):
+    """Return (status_code, json_body) for one entry of a batch response."""
+    # Sub-requests that time out on Facebook's side come back as null
+    if sub_response is None:
+        return None, {}
+    try:
+        body = json.loads(sub_response.get("body") or "{}")
+    except ValueError:
+        body = {}
+    return sub_response.get("code"), body
+
+
+def is_throttled(code, body):
+    return code == 429 or body.get("error", {}).get("code") in FACEBOOK_THROTTLE_CODES
+
+
+def throttled_result(token, body):
+    return {
+        "secret": token,
+        "provider": "facebook",
+        "status": STATUS_ERROR,
+        "error": body.get("error", {}).get("message", "Rate limited"),
+        "throttled": True,
     }
-    
+
+
+def build_result(token, debug_code, debug_body, me_code, me_body):
+    """Turn the debug_token and /me responses for one token into a result dict."""
+    if is_throttled(debug_code, debug_body):
+        return throttled_result(token, debug_body)
+    if is_throttled(me_code, me_body):
+        return throttled_result(token, me_body)
+
+    result = {"secret": token, "provider": "facebook"}
+
+    if debug_code != 200 or "data" not in debug_body:
+        error = debug_body.get("error", {})
+        # A server-side failure says nothing about the token
+        result["status"] = STATUS_INVALID if debug_code and debug_code < 500 else STATUS_ERROR
+        result["error"] = error.get("message", "Unknown error") if debug_code else "Sub-request timed out"
+        return result
+
+    token_data = debug_body["data"]
+    result["token_data"] = token_data
+    if not token_data.get("is_valid", False):
+        result["status"] = STATUS_INVALID
+        return result
+
+    if me_code == 200:
+        result["status"] = STATUS_ACTIVE
+        result["entity"] = {"id": me_body.get("id", "N/A"), "name": me_body.get("name", "N/A")}
+    else:
+        error = me_body.get("error", {})
+        result["status"] = STATUS_ERROR
+        result["error"] = error.get("message", "Unknown error") if me_code else "Sub-request timed out"
+    return result
+
+
+def cache_ttl(result):
+    """Never trust a cached verdict past the expiry reported by debug_token."""
+    return ttl_until(result.get("token_data", {}).get("expires_at", 0), result["status"])
+
+
+def json_body(response):
+    """A response's JSON body, or {} for an error page that is not JSON."""
     try:
-        response = requests.get(debug_url, params=params, verify=verify_ssl, timeout=10)
-    except requests.exceptions.SSLError as ssl_err:
-        print(f"⚠ SSL certificate verification failed, retrying without verification...")
-        ssl_error_occurred = True
-        verify_ssl = False
-        response = requests.get(debug_url, params=params, verify=verify_ssl, timeout=10)
-    
-    if response.status_code == 200:
-        data = response.json()
-        
-        if "data" in data:
-            token_data = data["data"]
-            is_valid = token_data.get("is_valid", False)
-            
-            print("✓ Token debug successful!")
-            print(f"\n[Token Details]")
-            print(f"  App ID: {token_data.get('app_id', 'N/A')}")
-            print(f"  Type: {token_data.get('type', 'N/A')}")
-            print(f"  User ID: {token_data.get('user_id', 'N/A')}")
-            
-            if "expires_at" in token_data and token_data["expires_at"] > 0:
-                expiry_timestamp = token_data["expires_at"]
-                expiry_date = datetime.fromtimestamp(expiry_timestamp)
-                print(f"  Expires at: {expiry_date.strftime('%Y-%m-%d %H:%M:%S')}")
-            else:
-                print(f"  Expires at: Never (long-lived token)")
-            
-            if "scopes" in token_data:
-                print(f"  Scopes: {', '.join(token_data['scopes'])}")
-            
-            if is_valid:
-                print(f"  Valid: Yes")
+        return response.json()
+    except ValueError:
+        return {}
+
+
+def check_token_individually(session, token):
+    """Validate one token with the same two GET calls the single-token mode makes."""
+    started = time.monotonic()
+
+    def paced_get(url, params):
+        rate_limiter.acquire("facebook", token)
+        return tail_latency.hedged("facebook", lambda: session.get(
+            url, params=params, timeout=tail_latency.timeout("facebook")))
+
+    debug_response = circuit_breaker.guarded(GRAPH_URL, lambda: paced_get(
+        f"{GRAPH_URL}/debug_token", {"input_token": token, "access_token": token}), NETWORK_ERRORS)
+    rate_limiter.update_from_headers("facebook", debug_response.headers, token)
+    if debug_response.status_code >= 500:
+        return circuit_breaker.unavailable_result(token, "facebook", f"Graph API returned {debug_response.status_code}")
+    me_response = circuit_breaker.guarded(GRAPH_URL, lambda: paced_get(
+        f"{GRAPH_URL}/{GRAPH_API_VERSION}/me", {"access_token": token, "fields": "id,name"}), NETWORK_ERRORS)
+    rate_limiter.update_from_headers("facebook", me_response.headers, token)
+    if me_response.status_code >= 500:
+        return circuit_breaker.unavailable_result(token, "facebook", f"Graph API returned {me_response.status_code}")
+    with RECORDER.span("parse_response", "facebook"):
+        result = build_result(
+            token,
+            debug_response.status_code, json_body(debug_response),
+            me_response.status_code, json_body(me_response),
+        )
+    result["elapsed"] = time.monotonic() - started
+    return result
+
+
+def check_token_chunk(session, tokens):
+    """Validate up to TOKENS_PER_BATCH tokens with a single batch POST.
+
+    The batch call itself needs a token; each sub-request carries its own. If
+    the authorizing token is rejected (leaked lists are full of dead tokens),
+    the call is retried with the next of batch_authorizers() before the chunk
+    falls back to individual checks.
+    """
+    batch = json.dumps(build_batch(tokens))
+
+    def post_batch(authorizer):
+        rate_limiter.acquire("facebook", authorizer)
+        return session.post(
+            GRAPH_URL,
+            data={**batch_auth_params(authorizer), "batch": batch, "include_headers": "false"},
+            timeout=30,
+        )
+
+    started = time.monotonic()
+    for authorizer in batch_authorizers(tokens):
+        response = circuit_breaker.guarded(GRAPH_URL, lambda: post_batch(authorizer), NETWORK_ERRORS)
+        rate_limiter.update_from_headers("facebook", response.headers, authorizer)
+
+        if response.status_code >= 500:
+            return [circuit_breaker.unavailable_result(token, "facebook", f"Graph API returned {response.status_code}")
+                    for token in tokens]
+        if response.status_code == 200:
+            break
+        body = json_body(response)
+        if is_throttled(response.status_code, body):
+            return [{**throttled_result(token, body), "elapsed": time.monotonic() - started}
+                    for token in tokens]
+    else:
+        # Every authorizer was rejected: check this chunk token by token
+        return [check_token_individually(session, token) for token in tokens]
+
+    with RECORDER.span("parse_batch_response", "facebook", tokens=len(tokens)):
+        sub_responses = response.json()
+        results = []
+        for i, token in enumerate(tokens):
+            debug_code, debug_body = parse_sub_response(sub_responses[2 * i])
+            me_code, me_body = parse_sub_response(sub_responses[2 * i + 1])
+            results.append(build_result(token, debug_code, debug_body, me_code, me_body))
+
+    # Every token in the batch shares the latency of the one round trip
+    elapsed = time.monotonic() - started
+    for result in results:
+        result["elapsed"] = elapsed
+    return results
+
+
+def check_chunk(session, tokens, emit):
+    """Validate one chunk, retrying throttled tokens with backoff.
+
+    Returns the tokens that were parked because the Graph API failed to answer.
+    """
+    parked = []
+    for attempt in range(rate_limiter.MAX_RETRIES + 1):
+        try:
+            chunk_results = check_token_chunk(session, tokens)
+        except (circuit_breaker.ProviderUnavailable, *NETWORK_ERRORS):
+            return parked + tokens
+        retry = attempt < rate_limiter.MAX_RETRIES
+        for result in chunk_results:
+            if result["status"] == STATUS_UNAVAILABLE:
+                parked.append(result["secret"])
+            elif not (result.get("throttled") and retry):
+                emit(result)
+
+        tokens = [result["secret"] for result in chunk_results if result.get("throttled")]
+        if not tokens or not retry:
+            break
+        time.sleep(rate_limiter.backoff_delay(attempt))
+    return parked
+
+
+def check_tokens(tokens, session=None, on_result=None, outage_wait=circuit_breaker.OUTAGE_WAIT):
+    """Validate many tokens, TOKENS_PER_BATCH per HTTP round trip.
+
+    Malformed tokens are rejected offline without any request. Tokens whose
+    checks were throttled are retried with backoff; they are only reported as
+    errors once every retry has been throttled too. Tokens the Graph API
+    failed to answer for are parked and retried whenever its circuit breaker
+    lets a request through, for up to `outage_wait` seconds, after which they
+    are reported as unavailable.
+    """
+    results, tokens = split_plausible("facebook", tokens)
+    if on_result:
+        for result in results:
+            on_result(result)
+
+    def emit(result):
+        if on_result:
+            on_result(result)
+        results.append(result)
+
+    owns_session = session is None
+    if owns_session:
+        session = transport.client("facebook")
+    try:
+        parked = []
+        for start in range(0, len(tokens), TOKENS_PER_BATCH):
+            parked += check_chunk(session, tokens[start:start + TOKENS_PER_BATCH], emit)
+
+        deadline = time.monotonic() + outage_wait
+        while parked and circuit_breaker.wait_for(GRAPH_URL, deadline):
+            waiting, parked = parked, []
+            for start in range(0, len(waiting), TOKENS_PER_BATCH):
+                parked += check_chunk(session, waiting[start:start + TOKENS_PER_BATCH], emit)
+
+        for token in parked:
+            emit(circuit_breaker.unavailable_result(token, "facebook"))
+        return results
+    finally:
+        if owns_session:
+            session.close()
+
+
+def print_batch_result(result):
+    status = result["status"]
+    marker = "✓" if status in ACTIVE_STATUSES else "✗"
+    cached = " (cached)" if result.get("cached") else ""
+    print(f"\n{marker} {redact(result['secret'], 15)}  {STATUS_LABELS[status]}{cached}")
+    if "token_data" in result:
+        print_token_details(result["token_data"], indent="    ")
+        print(f"    Valid: {'Yes' if result['token_data'].get('is_valid', False) else 'No'}")
+    if "entity" in result:
+        print(f"    Entity: {result['entity']['name']} (ID: {result['entity']['id']})")
+    if "error" in result:
+        print(f"    Error: {result['error']}")
+
+
+def run_batch(source, max_age=None, use_cache=True, writer=None):
+    """Validate tokens from a file or stdin.
+
+    With an NDJSONWriter the input is streamed in chunks of STREAM_CHUNK_SIZE
+    and every verdict is written as one record instead of being printed.
+    """
+    print("=" * 60)
+    print("Facebook/Meta API Key Test Script (batch mode)")
+    print("=" * 60)
+
+    load_environment()
+    check_http2_support()
+
+    print(f"\n[Step 3] Reading access tokens from {'stdin' if source == '-' else source}...")
+    if writer is None:
+        tokens = read_secrets(source)
+        if not tokens:
+            print("✗ No access tokens found in input!")
+            sys.exit(1)
+        print(f"✓ {len(tokens)} unique token(s) loaded")
+        chunks = [tokens]
+    else:
+        chunks = chunked(iter_secrets(source), STREAM_CHUNK_SIZE)
+        print(f"✓ Streaming tokens in chunks of {STREAM_CHUNK_SIZE}")
+
+    cache = open_cache(use_cache)
+    counts = {status: 0 for status in STATUS_LABELS}
+
+    def emit(result):
+        counts[result["status"]] += 1
+        RECORDER.count_verdict("facebook", result["status"])
+        if writer is None:
+            print_batch_result(result)
+        else:
+            writer.write(result_record(result, 15))
+
+    def on_result(result):
+        if not result.get("offline"):
+            store_result(cache, result, cache_ttl(result))
+        emit(result)
+
+    if writer is None:
+        batches = (len(tokens) + TOKENS_PER_BATCH - 1) // TOKENS_PER_BATCH
+        print(f"\n[Step 4] Validating tokens with {batches} Graph API batch request(s)...")
+    else:
+        print(f"\n[Step 4] Validating tokens with Graph API batch requests ({TOKENS_PER_BATCH} per request)...")
+
+    session = transport.client("facebook")
+    try:
+        for chunk in chunks:
+            cached, pending = split_cached(cache, "facebook", chunk, max_age)
+            if cached and writer is None:
+                print(f"✓ {len(cached)} token(s) answered from cache")
+            for result in cached:
+                emit(result)
+            with RECORDER.span("validate_tokens", "facebook", tokens=len(pending)):
+                check_tokens(pending, session=session, on_result=on_result)
+    except transport.TLSError as e:
+        transport.print_tls_help(e)
+        sys.exit(1)
+    except httpx.HTTPError as e:
+        print(f"✗ Network error: {e}")
+        sys.exit(1)
+    finally:
+        session.close()
+        if writer is not None:
+            writer.flush()
+        if cache is not None:
+            cache.close()
+
+    if not sum(counts.values()):
+        print("✗ No access tokens found in input!")
+        sys.exit(1)
+
+    print("\n" + "=" * 60)
+    print("🔑 KEY VALIDATION SUMMARY")
+    print("=" * 60)
+    for status, label in STATUS_LABELS.items():
+        print(f"  {label}: {counts[status]}")
+    for line in tail_latency.hedging_summary():
+        print(f"  Hedged {line}")
+    for line in circuit_breaker.outage_summary():
+        print(f"  Outage {line}")
+    print("=" * 60)
+
+    if counts[STATUS_ERROR] or counts[STATUS_UNAVAILABLE]:
+        sys.exit(1)
+
+
+def run_single_check(max_age=None, use_cache=True):
+    print("=" * 60)
+    print("Facebook/Meta API Key Test Script")
+    print("=" * 60)
+
+    load_environment()
+    check_http2_support()
+
+    # Check for API key
+    print("\n[Step 3] Checking for Facebook/Meta access token...")
+    access_token = os.getenv("FACEBOOK_ACCESS_TOKEN")
+
+    if not access_token or access_token == "your-facebook-access-token-here":
+        print("✗ FACEBOOK_ACCESS_TOKEN not set or still has default value!")
+        print("\nPlease update the .env file with your actual access token:")
+        print("  1. Open the .env file in this directory")
+        print("  2. Replace 'your-facebook-access-token-here' with your actual Facebook access token")
+        sys.exit(1)
+
+    print(f"✓ Access token found (starts with: {access_token[:15]}...)")
+
+    reason = precheck("facebook", access_token)
+    if reason:
+        print(f"⚠ Token does not look like a Facebook access token ({reason}), checking anyway...")
+
+    cache = open_cache(use_cache)
+    if cache is not None and max_age is not None:
+        entry = cache.get("facebook", access_token, max_age)
+        if entry is not None:
+            RECORDER.count_verdict("facebook", entry["status"])
+            print_cached_verdict(entry, STATUS_LABELS[entry["status"]], redact(access_token, 15))
+            sys.exit(0 if entry["status"] == STATUS_ACTIVE else 1)
+
+    result = {"secret": access_token, "provider": "facebook"}
+    session = transport.client("facebook")
+
+    # Test 1: Debug token to get token info
+    print("\n[Step 4] Validating access token with Facebook's debug endpoint...")
+    print("Checking token validity and metadata...")
+
+    try:
+        debug_url = f"{GRAPH_URL}/debug_token"
+        params = {
+            "input_token": access_token,
+            "access_token": access_token
+        }
+
+        with RECORDER.span("debug_token", "facebook"):
+            response = session.get(debug_url, params=params, timeout=tail_latency.timeout("facebook"))
+
+        if response.status_code == 200:
+            with RECORDER.span("parse_response", "facebook"):
+                data = response.json()
+
+            if "data" in data:
+                token_data = data["data"]
+                is_valid = token_data.get("is_valid", False)
+
+                print("✓ Token debug successful!")
+                print(f"\n[Token Details]")
+                print_token_details(token_data)
+                result["token_data"] = token_data
+
+                if is_valid:
+                    print(f"  Valid: Yes")
+                else:
+                    print(f"  Valid: No")
+                    result["status"] = STATUS_INVALID
+                    store_result(cache, result, cache_ttl(result))
+                    RECORDER.count_verdict("facebook", STATUS_INVALID)
+                    print("\n" + "=" * 60)
+                    print("🔑 KEY VALIDATION STATUS")
+                    print("=" * 60)
+                    print("✗ Invalid Secret - Facebook rejected this access token")
+                    print(f"  Token prefix: {access_token[:15]}...")
+                    print(f"  Status: INVALID or EXPIRED")
+                    print("=" * 60)
+                    sys.exit(1)
             else:
-                print(f"  Valid: No")
-                print("\n" + "=" * 60)
-                print("🔑 KEY VALIDATION STATUS")
-                print("=" * 60)
-                print("✗ Invalid Secret - Facebook rejected this access token")
-                print(f"  Token prefix: {access_token[:15]}...")
-                print(f"  Status: INVALID or EXPIRED")
-                print("=" * 60)
+                print("✗ Unexpected response format from debug endpoint")
                 sys.exit(1)
         else:
-            print("✗ Unexpected response format from debug endpoint")
+            print(f"✗ Token debug failed with status code: {response.status_code}")
+            error_data = response.json()
+            if "error" in error_data:
+                print(f"  Error: {error_data['error'].get('message', 'Unknown error')}")
+            result["status"] = STATUS_INVALID
+            store_result(cache, result, cache_ttl(result))
+            RECORDER.count_verdict("facebook", STATUS_INVALID)
+
+            print("\n" + "=" * 60)
+            print("🔑 KEY VALIDATION STATUS")
+            print("=" * 60)
+            print("✗ Invalid Secret - Facebook rejected this access token")
+            print(f"  Token prefix: {access_token[:15]}...")
+            print(f"  Status: INVALID or EXPIRED")
+            print("=" * 60)
             sys.exit(1)
-    else:
-        print(f"✗ Token debug failed with status code: {response.status_code}")
-        error_data = response.json()
-        if "error" in error_data:
-            print(f"  Error: {error_data['error'].get('message', 'Unknown error')}")
-        
-        print("\n" + "=" * 60)
-        print("🔑 KEY VALIDATION STATUS")
-        print("=" * 60)
-        print("✗ Invalid Secret - Facebook rejected this access token")
-        print(f"  Token prefix: {access_token[:15]}...")
-        print(f"  Status: INVALID or EXPIRED")
-        print("=" * 60)
+
+    except transport.TLSError as e:
+        transport.print_tls_help(e)
         sys.exit(1)
-        
-except requests.exceptions.SSLError as e:
-    print(f"✗ SSL certificate error: {e}")
-    print("\n⚠ SSL Certificate Issue Detected!")
-    print("To fix this on macOS, run:")
-    print("  /Applications/Python\\ 3.*/Install\\ Certificates.command")
-    print("\nOr install certifi:")
-    print("  pip install --upgrade certifi")
-    sys.exit(1)
-except requests.exceptions.RequestException as e:
-    print(f"✗ Network error: {e}")
-    sys.exit(1)
-except Exception as e:
-    print(f"✗ Unexpected error: {e}")
-    sys.exit(1)
-
-if ssl_error_occurred:
-    print("\n⚠ Note: SSL verification was bypassed due to certificate issues.")
-    print("For security, please fix SSL certificates:")
-    print("  /Applications/Python\\ 3.*/Install\\ Certificates.command")
-
-# Test 2: Make a simple API call to /me endpoint
-print("\n[Step 5] Making a test API call to /me endpoint...")
-print("Fetching basic user/page information...")
-
-try:
-    me_url = "https://graph.facebook.com/v18.0/me"
-    params = {
-        "access_token": access_token,
-        "fields": "id,name"
-    }
-    
-    response = requests.get(me_url, params=params, verify=verify_ssl, timeout=10)
-    
-    if response.status_code == 200:
-        data = response.json()
-        print("✓ API call successful!")
-        print(f"\n[Response Details]")
-        print(f"  ID: {data.get('id', 'N/A')}")
-        print(f"  Name: {data.get('name', 'N/A')}")
-        
-        # Key validation confirmation
-        print("\n" + "=" * 60)
-        print("🔑 KEY VALIDATION STATUS")
-        print("=" * 60)
-        print("✓ Active Secret - Facebook confirmed this access token is active")
-        print(f"  Token prefix: {access_token[:15]}...")
-        print(f"  Status: ACTIVE and operational")
-        print(f"  Entity: {data.get('name', 'N/A')} (ID: {data.get('id', 'N/A')})")
-        print("=" * 60)
-    else:
-        error_data = response.json()
-        print(f"✗ API call failed with status code: {response.status_code}")
-        if "error" in error_data:
-            print(f"  Error: {error_data['error'].get('message', 'Unknown error')}")
-            print(f"  Code: {error_data['error'].get('code', 'N/A')}")
-            print(f"  Type: {error_data['error'].get('type', 'N/A')}")
+    except httpx.HTTPError as e:
+        print(f"✗ Network error: {e}")
+        sys.exit(1)
+    except Exception as e:
+        print(f"✗ Unexpected error: {e}")
+        sys.exit(1)
+
+    # Test 2: Make a simple API call to /me endpoint
+    print("\n[Step 5] Making a test API call to /me endpoint...")
+    print("Fetching basic user/page information...")
+
+    try:
+        me_url = f"{GRAPH_URL}/{GRAPH_API_VERSION}/me"
+        params = {
+            "access_token": access_token,
+            "fields": "id,name"
+        }
+
+        with RECORDER.span("me", "facebook"):
+            response = session.get(me_url, params=params, timeout=tail_latency.timeout("facebook"))
+
+        if response.status_code == 200:
+            with RECORDER.span("parse_response", "facebook"):
+                data = response.json()
+            print("✓ API call successful!")
+            print(f"\n[Response Details]")
+            print(f"  ID: {data.get('id', 'N/A')}")
+            print(f"  Name: {data.get('name', 'N/A')}")
+
+            # Key validation confirmation
+            print("\n" + "=" * 60)
+            print("🔑 KEY VALIDATION STATUS")
+            print("=" * 60)
+            print("✓ Active Secret - Facebook confirmed this access token is active")
+            print(f"  Token prefix: {access_token[:15]}...")
+            print(f"  Status: ACTIVE and operational")
+            print(f"  Entity: {data.get('name', 'N/A')} (ID: {data.get('id', 'N/A')})")
+            print("=" * 60)
+            result["status"] = STATUS_ACTIVE
+            result["entity"] = {"id": data.get("id", "N/A"), "name": data.get("name", "N/A")}
+            store_result(cache, result, cache_ttl(result))
+            RECORDER.count_verdict("facebook", STATUS_ACTIVE)
+        else:
+            RECORDER.count_verdict("facebook", STATUS_ERROR)
+            error_data = response.json()
+            print(f"✗ API call failed with status code: {response.status_code}")
+            if "error" in error_data:
+                print(f"  Error: {error_data['error'].get('message', 'Unknown error')}")
+                print(f"  Code: {error_data['error'].get('code', 'N/A')}")
+                print(f"  Type: {error_data['error'].get('type', 'N/A')}")
+            sys.exit(1)
+
+    except transport.TLSError as e:
+        transport.print_tls_help(e)
         sys.exit(1)
-        
-except requests.exceptions.SSLError as e:
-    print(f"✗ SSL certificate error: {e}")
-    print("\n⚠ SSL Certificate Issue Detected!")
-    print("To fix this on macOS, run:")
-    print("  /Applications/Python\\ 3.*/Install\\ Certificates.command")
-    sys.exit(1)
-except requests.exceptions.RequestException as e:
-    print(f"✗ Network error: {e}")
-    sys.exit(1)
-except Exception as e:
-    print(f"✗ Unexpected error: {e}")
-    sys.exit(1)
-
-print("\n✓ All tests passed! Your Facebook/Meta access token is active and working.")
-
-if ssl_error_occurred:
-    print("\n⚠ Warning: SSL verification was bypassed. Please install certificates for security.")
+    except httpx.HTTPError as e:
+        print(f"✗ Network error: {e}")
+        sys.exit(1)
+    except Exception as e:
+        print(f"✗ Unexpected error: {e}")
+        sys.exit(1)
+    finally:
+        session.close()
+
+    print("\n✓ All tests passed! Your Facebook/Meta access token is active and working.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Test whether Facebook/Meta access tokens are active.")
+    parser.add_argument("--batch", metavar="FILE",
+                        help="validate one token per line from FILE ('-' for stdin) instead of FACEBOOK_ACCESS_TOKEN")
+    parser.add_argument("--max-age", type=int, metavar="SECONDS",
+                        help="accept cached verdicts checked at most SECONDS ago instead of calling Facebook")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="neither read nor write the on-disk result cache")
+    parser.add_argument("--output", choices=("text", "ndjson"), default="text",
+                        help="batch output format; ndjson writes one JSON record per token to stdout (default: text)")
+    tail_latency.add_hedging_argument(parser)
+    transport.add_transport_arguments(parser)
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+    if args.hedge:
+        tail_latency.enable_hedging()
+    if args.ca_bundle:
+        transport.set_ca_bundle(args.ca_bundle)
+    if args.output == "ndjson" and not args.batch:
+        parser.error("--output ndjson requires --batch")
+
+    try:
+        if args.batch and args.output == "ndjson":
+            writer = NDJSONWriter(sys.stdout)
+            with redirect_stdout(sys.stderr):
+                run_batch(args.batch, args.max_age, not args.no_cache, writer)
+        elif args.batch:
+            run_batch(args.batch, args.max_age, not args.no_cache)
+        else:
+            run_single_check(args.max_age, not args.no_cache)
+    finally:
+        export_metrics(args)
+
 
+if __name__ == "__main__":
+    main()
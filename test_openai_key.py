@@ -2,119 +2,366 @@
 """
 OpenAI API Key Test Script
 Tests whether the OpenAI API key is active and can make successful API calls.
+
+Batch mode validates many keys concurrently with the free /v1/models endpoint,
+on the shared validation engine (see validation_engine.py):
+  python test_openai_key.py --batch keys.txt --concurrency 20
+  cat keys.txt | python test_openai_key.py --batch -
+
+With --output ndjson, batch mode streams one JSON record per key to stdout
+(progress and the summary go to stderr):
+  python test_openai_key.py --batch keys.txt --output ndjson > results.ndjson
+
+Results are cached on disk (see result_cache.py); pass --max-age SECONDS to
+accept a cached verdict instead of calling OpenAI again.
+
+Step and HTTP timings can be exported with --metrics-json FILE and
+--metrics-prom FILE (see instrumentation.py).
 """
 
+import argparse
 import os
 import sys
+from contextlib import redirect_stdout
 
-print("=" * 60)
-print("OpenAI API Key Test Script")
-print("=" * 60)
-
-# Load environment variables from .env file
-print("\n[Step 1] Loading environment variables from .env file...")
-try:
-    from dotenv import load_dotenv
-    load_dotenv()
-    print("✓ Environment variables loaded from .env file")
-except ImportError:
-    print("✗ python-dotenv package not found!")
-    print("\nPlease install it using:")
-    print("  pip install python-dotenv")
-    sys.exit(1)
-
-# Check if openai package is installed
-print("\n[Step 2] Checking if 'openai' package is installed...")
-try:
-    import openai
-    print(f"✓ OpenAI package found (version: {openai.__version__})")
-except ImportError:
-    print("✗ OpenAI package not found!")
-    print("\nPlease install it using:")
-    print("  pip install openai")
-    sys.exit(1)
-
-# Check for API key
-print("\n[Step 3] Checking for OpenAI API key...")
-api_key = os.getenv("OPENAI_API_KEY")
-
-if not api_key or api_key == "your-openai-api-key-here":
-    print("✗ OPENAI_API_KEY not set or still has default value!")
-    print("\nPlease update the .env file with your actual API key:")
-    print("  1. Open the .env file in this directory")
-    print("  2. Replace 'your-openai-api-key-here' with your actual OpenAI API key")
-    sys.exit(1)
-
-print(f"✓ API key found (starts with: {api_key[:8]}...)")
-
-# Initialize OpenAI client
-print("\n[Step 4] Initializing OpenAI client...")
-try:
-    client = openai.OpenAI(api_key=api_key)
-    print("✓ OpenAI client initialized successfully")
-except Exception as e:
-    print(f"✗ Failed to initialize client: {e}")
-    sys.exit(1)
-
-# Test API call with a simple completion
-print("\n[Step 5] Making a test API call...")
-print("Sending a simple chat completion request...")
-
-try:
-    response = client.chat.completions.create(
-        model="gpt-3.5-turbo",
-        messages=[
-            {"role": "user", "content": "Say 'Hello! Your API key is working.'"}
-        ],
-        max_tokens=20
-    )
-    
-    print("✓ API call successful!")
-    print(f"\n[Response Details]")
-    print(f"  Model used: {response.model}")
-    print(f"  Tokens used: {response.usage.total_tokens} (prompt: {response.usage.prompt_tokens}, completion: {response.usage.completion_tokens})")
-    print(f"  Response: {response.choices[0].message.content}")
-    
-    # Key validation confirmation
-    print("\n" + "=" * 60)
-    print("🔑 KEY VALIDATION STATUS")
+import circuit_breaker
+import tail_latency
+import transport
+from instrumentation import RECORDER, add_metrics_arguments, export_metrics, httpx_event_hooks
+from precheck import precheck
+from result_cache import open_cache, print_cached_verdict, split_cached, store_result
+from secret_io import (
+    STATUS_ACTIVE,
+    STATUS_ACTIVE_INSUFFICIENT_SCOPE,
+    STATUS_ACTIVE_RATE_LIMITED,
+    STATUS_ERROR,
+    STATUS_INVALID,
+    STATUS_UNAVAILABLE,
+    ACTIVE_STATUSES,
+    NDJSONWriter,
+    chunked,
+    iter_secrets,
+    read_secrets,
+    redact,
+    result_record,
+)
+from validation_engine import ValidationEngine
+
+DEFAULT_CONCURRENCY = 10
+
+# Keys validated per round when streaming NDJSON output
+STREAM_CHUNK_SIZE = 1000
+
+STATUS_LABELS = {
+    STATUS_ACTIVE: "ACTIVE and operational",
+    STATUS_ACTIVE_RATE_LIMITED: "ACTIVE but rate-limited",
+    STATUS_ACTIVE_INSUFFICIENT_SCOPE: "ACTIVE but restricted (insufficient permissions)",
+    STATUS_INVALID: "INVALID or REVOKED",
+    STATUS_ERROR: "UNKNOWN (API error)",
+    STATUS_UNAVAILABLE: "UNKNOWN (provider unavailable)",
+}
+
+
+def load_environment():
+    print("\n[Step 1] Loading environment variables from .env file...")
+    with RECORDER.span("load_environment", "openai"):
+        try:
+            from dotenv import load_dotenv
+            load_dotenv()
+            print("✓ Environment variables loaded from .env file")
+        except ImportError:
+            print("✗ python-dotenv package not found!")
+            print("\nPlease install it using:")
+            print("  pip install python-dotenv")
+            sys.exit(1)
+
+
+def import_openai():
+    print("\n[Step 2] Checking if 'openai' package is installed...")
+    with RECORDER.span("import_openai", "openai"):
+        try:
+            import openai
+            print(f"✓ OpenAI package found (version: {openai.__version__})")
+        except ImportError:
+            print("✗ OpenAI package not found!")
+            print("\nPlease install it using:")
+            print("  pip install openai")
+            sys.exit(1)
+    return openai
+
+
+def check_keys(api_keys, on_result=None, concurrency=DEFAULT_CONCURRENCY, engine=None):
+    """Validate many keys concurrently with the shared validation engine.
+
+    Each key gets one call to the free /models endpoint, as described by the
+    "openai" entry of provider_specs.py. Malformed keys are rejected offline
+    and come first; the remaining results follow in input order. A long-lived
+    `engine` can be passed to reuse its warm connections; it is left open.
+    """
+    owns_engine = engine is None
+    if owns_engine:
+        engine = ValidationEngine(concurrency)
+    try:
+        return engine.run(engine.check("openai", api_keys, on_result))
+    finally:
+        if owns_engine:
+            engine.close()
+
+
+def print_batch_result(result):
+    status = result["status"]
+    marker = "✓" if status in ACTIVE_STATUSES else "✗"
+    cached = " (cached)" if result.get("cached") else ""
+    print(f"{marker} {redact(result['secret'])}  {STATUS_LABELS[status]}{cached}")
+    if result.get("offline"):
+        print(f"    {result['error']}")
+
+
+def run_batch(source, concurrency, max_age=None, use_cache=True, writer=None):
+    """Validate keys from a file or stdin.
+
+    With an NDJSONWriter the input is streamed in chunks of STREAM_CHUNK_SIZE
+    and every verdict is written as one record instead of being printed, so
+    memory stays flat however many keys are piped in.
+    """
     print("=" * 60)
-    print("✓ Active Secret - OpenAI confirmed this API key is active")
-    print(f"  Key prefix: {api_key[:10]}...")
-    print(f"  Status: ACTIVE and operational")
-    print(f"  Validated at: {response.created}")
+    print("OpenAI API Key Test Script (batch mode)")
     print("=" * 60)
-    
-except openai.AuthenticationError as e:
-    print(f"✗ Authentication failed: {e}")
+
+    load_environment()
+
+    print(f"\n[Step 2] Reading API keys from {'stdin' if source == '-' else source}...")
+    if writer is None:
+        api_keys = read_secrets(source)
+        if not api_keys:
+            print("✗ No API keys found in input!")
+            sys.exit(1)
+        print(f"✓ {len(api_keys)} unique key(s) loaded")
+        chunks = [api_keys]
+    else:
+        chunks = chunked(iter_secrets(source), STREAM_CHUNK_SIZE)
+        print(f"✓ Streaming keys in chunks of {STREAM_CHUNK_SIZE}")
+
+    cache = open_cache(use_cache)
+    counts = {status: 0 for status in STATUS_LABELS}
+
+    def emit(result):
+        counts[result["status"]] += 1
+        RECORDER.count_verdict("openai", result["status"])
+        if writer is None:
+            print_batch_result(result)
+        else:
+            writer.write(result_record(result))
+
+    def on_result(result):
+        if not result.get("offline"):
+            store_result(cache, result)
+        emit(result)
+
+    print(f"\n[Step 3] Validating keys via /v1/models (concurrency: {concurrency})...")
+    engine = ValidationEngine(concurrency)
+    try:
+        for chunk in chunks:
+            cached, pending = split_cached(cache, "openai", chunk, max_age)
+            if cached and writer is None:
+                print(f"✓ {len(cached)} key(s) answered from cache")
+            for result in cached:
+                emit(result)
+            with RECORDER.span("validate_keys", "openai", keys=len(pending), concurrency=concurrency):
+                check_keys(pending, on_result=on_result, engine=engine)
+    finally:
+        engine.close()
+        if writer is not None:
+            writer.flush()
+        if cache is not None:
+            cache.close()
+
+    if not sum(counts.values()):
+        print("✗ No API keys found in input!")
+        sys.exit(1)
+
     print("\n" + "=" * 60)
-    print("🔑 KEY VALIDATION STATUS")
+    print("🔑 KEY VALIDATION SUMMARY")
     print("=" * 60)
-    print("✗ Invalid Secret - OpenAI rejected this API key")
-    print(f"  Key prefix: {api_key[:10]}...")
-    print(f"  Status: INVALID or REVOKED")
-    print("  The key appears to be inactive, expired, or incorrectly formatted.")
+    for status, label in STATUS_LABELS.items():
+        print(f"  {label}: {counts[status]}")
+    for line in tail_latency.hedging_summary():
+        print(f"  Hedged {line}")
+    for line in circuit_breaker.outage_summary():
+        print(f"  Outage {line}")
     print("=" * 60)
-    sys.exit(1)
-    
-except openai.RateLimitError as e:
-    print(f"✗ Rate limit exceeded: {e}")
-    print("\n" + "=" * 60)
-    print("🔑 KEY VALIDATION STATUS")
+
+    if counts[STATUS_ERROR] or counts[STATUS_UNAVAILABLE]:
+        sys.exit(1)
+
+
+def run_single_check(max_age=None, use_cache=True):
     print("=" * 60)
-    print("✓ Active Secret - OpenAI confirmed this API key is active")
-    print(f"  Key prefix: {api_key[:10]}...")
-    print(f"  Status: ACTIVE but rate-limited")
-    print("  The key is valid but you've exceeded your usage quota/limits.")
+    print("OpenAI API Key Test Script")
     print("=" * 60)
-    sys.exit(1)
-    
-except openai.APIError as e:
-    print(f"✗ API error: {e}")
-    sys.exit(1)
-    
-except Exception as e:
-    print(f"✗ Unexpected error: {e}")
-    sys.exit(1)
-
-print("\n✓ All tests passed! Your OpenAI API key is active and working.")
+
+    load_environment()
+    openai = import_openai()
+
+    # Check for API key
+    print("\n[Step 3] Checking for OpenAI API key...")
+    api_key = os.getenv("OPENAI_API_KEY")
+
+    if not api_key or api_key == "your-openai-api-key-here":
+        print("✗ OPENAI_API_KEY not set or still has default value!")
+        print("\nPlease update the .env file with your actual API key:")
+        print("  1. Open the .env file in this directory")
+        print("  2. Replace 'your-openai-api-key-here' with your actual OpenAI API key")
+        sys.exit(1)
+
+    print(f"✓ API key found (starts with: {api_key[:8]}...)")
+
+    reason = precheck("openai", api_key)
+    if reason:
+        print(f"⚠ Key does not look like an OpenAI API key ({reason}), checking anyway...")
+
+    cache = open_cache(use_cache)
+    if cache is not None and max_age is not None:
+        entry = cache.get("openai", api_key, max_age)
+        if entry is not None:
+            RECORDER.count_verdict("openai", entry["status"])
+            print_cached_verdict(entry, STATUS_LABELS[entry["status"]], redact(api_key))
+            sys.exit(0 if entry["status"] == STATUS_ACTIVE else 1)
+
+    # Initialize OpenAI client
+    print("\n[Step 4] Initializing OpenAI client...")
+    try:
+        with RECORDER.span("client_init", "openai"):
+            client = openai.OpenAI(
+                api_key=api_key,
+                http_client=openai.DefaultHttpxClient(event_hooks=httpx_event_hooks("openai")),
+            )
+        print("✓ OpenAI client initialized successfully")
+    except Exception as e:
+        print(f"✗ Failed to initialize client: {e}")
+        sys.exit(1)
+
+    # Test API call with a simple completion
+    print("\n[Step 5] Making a test API call...")
+    print("Sending a simple chat completion request...")
+
+    try:
+        with RECORDER.span("chat_completion", "openai"):
+            response = client.chat.completions.create(
+                model="gpt-3.5-turbo",
+                messages=[
+                    {"role": "user", "content": "Say 'Hello! Your API key is working.'"}
+                ],
+                max_tokens=20
+            )
+
+        print("✓ API call successful!")
+        print(f"\n[Response Details]")
+        print(f"  Model used: {response.model}")
+        print(f"  Tokens used: {response.usage.total_tokens} (prompt: {response.usage.prompt_tokens}, completion: {response.usage.completion_tokens})")
+        print(f"  Response: {response.choices[0].message.content}")
+
+        # Key validation confirmation
+        print("\n" + "=" * 60)
+        print("🔑 KEY VALIDATION STATUS")
+        print("=" * 60)
+        print("✓ Active Secret - OpenAI confirmed this API key is active")
+        print(f"  Key prefix: {api_key[:10]}...")
+        print(f"  Status: ACTIVE and operational")
+        print(f"  Validated at: {response.created}")
+        print("=" * 60)
+        store_result(cache, {"secret": api_key, "provider": "openai", "status": STATUS_ACTIVE})
+        RECORDER.count_verdict("openai", STATUS_ACTIVE)
+
+    except openai.AuthenticationError as e:
+        store_result(cache, {"secret": api_key, "provider": "openai", "status": STATUS_INVALID})
+        RECORDER.count_verdict("openai", STATUS_INVALID)
+        print(f"✗ Authentication failed: {e}")
+        print("\n" + "=" * 60)
+        print("🔑 KEY VALIDATION STATUS")
+        print("=" * 60)
+        print("✗ Invalid Secret - OpenAI rejected this API key")
+        print(f"  Key prefix: {api_key[:10]}...")
+        print(f"  Status: INVALID or REVOKED")
+        print("  The key appears to be inactive, expired, or incorrectly formatted.")
+        print("=" * 60)
+        sys.exit(1)
+
+    except openai.PermissionDeniedError as e:
+        store_result(cache, {"secret": api_key, "provider": "openai", "status": STATUS_ACTIVE_INSUFFICIENT_SCOPE})
+        RECORDER.count_verdict("openai", STATUS_ACTIVE_INSUFFICIENT_SCOPE)
+        print(f"✗ Permission denied: {e}")
+        print("\n" + "=" * 60)
+        print("🔑 KEY VALIDATION STATUS")
+        print("=" * 60)
+        print("✓ Active Secret - OpenAI confirmed this API key is active")
+        print(f"  Key prefix: {api_key[:10]}...")
+        print(f"  Status: ACTIVE but restricted (insufficient permissions)")
+        print("  The key is valid but lacks permission for this endpoint or model.")
+        print("=" * 60)
+        sys.exit(1)
+
+    except openai.RateLimitError as e:
+        store_result(cache, {"secret": api_key, "provider": "openai", "status": STATUS_ACTIVE_RATE_LIMITED})
+        RECORDER.count_verdict("openai", STATUS_ACTIVE_RATE_LIMITED)
+        print(f"✗ Rate limit exceeded: {e}")
+        print("\n" + "=" * 60)
+        print("🔑 KEY VALIDATION STATUS")
+        print("=" * 60)
+        print("✓ Active Secret - OpenAI confirmed this API key is active")
+        print(f"  Key prefix: {api_key[:10]}...")
+        print(f"  Status: ACTIVE but rate-limited")
+        print("  The key is valid but you've exceeded your usage quota/limits.")
+        print("=" * 60)
+        sys.exit(1)
+
+    except openai.APIError as e:
+        RECORDER.count_verdict("openai", STATUS_ERROR)
+        print(f"✗ API error: {e}")
+        sys.exit(1)
+
+    except Exception as e:
+        print(f"✗ Unexpected error: {e}")
+        sys.exit(1)
+
+    print("\n✓ All tests passed! Your OpenAI API key is active and working.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Test whether OpenAI API keys are active.")
+    parser.add_argument("--batch", metavar="FILE",
+                        help="validate one key per line from FILE ('-' for stdin) instead of OPENAI_API_KEY")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help=f"maximum number of keys validated at once in batch mode (default: {DEFAULT_CONCURRENCY})")
+    parser.add_argument("--max-age", type=int, metavar="SECONDS",
+                        help="accept cached verdicts checked at most SECONDS ago instead of calling OpenAI")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="neither read nor write the on-disk result cache")
+    parser.add_argument("--output", choices=("text", "ndjson"), default="text",
+                        help="batch output format; ndjson writes one JSON record per key to stdout (default: text)")
+    tail_latency.add_hedging_argument(parser)
+    transport.add_transport_arguments(parser)
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+    if args.hedge:
+        tail_latency.enable_hedging()
+    if args.ca_bundle:
+        transport.set_ca_bundle(args.ca_bundle)
+    if args.output == "ndjson" and not args.batch:
+        parser.error("--output ndjson requires --batch")
+
+    try:
+        if args.batch and args.output == "ndjson":
+            writer = NDJSONWriter(sys.stdout)
+            with redirect_stdout(sys.stderr):
+                run_batch(args.batch, max(1, args.concurrency), args.max_age, not args.no_cache, writer)
+        elif args.batch:
+            run_batch(args.batch, max(1, args.concurrency), args.max_age, not args.no_cache)
+        else:
+            run_single_check(args.max_age, not args.no_cache)
+    finally:
+        export_metrics(args)
+
+
+if __name__ == "__main__":
+    main()
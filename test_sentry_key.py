@@ -2,221 +2,686 @@
 """
 Sentry API Key Test Script
 Tests whether your Sentry auth token is active and can make successful API calls.
+
+Organizations and projects are streamed page by page by following Sentry's
+Link header cursors, so tokens with access to very large orgs are fully counted
+without loading every page into memory:
+  python test_sentry_key.py --max-projects 500
+  python test_sentry_key.py --until-scope project:read
+
+With --all-orgs, projects are enumerated for every accessible organization in
+parallel over a shared client:
+  python test_sentry_key.py --all-orgs --workers 16 --with-counts
+
+Organization tokens (sntrys_) carry their Sentry instance and region in an
+embedded payload, so requests go straight to the right host (US or DE region)
+instead of always to sentry.io. The payload is not authenticated, so only
+https hosts on sentry.io are trusted; name a self-hosted instance explicitly:
+  python test_sentry_key.py --sentry-url https://sentry.example.com
+
+Batch mode classifies many tokens with one organizations call each over a
+pooled client; --output ndjson streams one JSON record per token to stdout:
+  python test_sentry_key.py --batch tokens.txt
+  python test_sentry_key.py --batch tokens.txt --output ndjson > results.ndjson
+
+Verdicts are cached on disk (see result_cache.py); pass --max-age SECONDS to
+accept a cached verdict instead of calling Sentry again.
+
+Step and HTTP timings can be exported with --metrics-json FILE and
+--metrics-prom FILE (see instrumentation.py).
+
+Requests go over the shared HTTP/2 transport (see transport.py), so --all-orgs
+workers share one multiplexed connection per host. Certificates are always
+verified; behind a TLS-intercepting proxy, pass --ca-bundle FILE.
 """
 
+import argparse
 import os
 import sys
-import requests
-import urllib3
-
-# Disable SSL warnings if verification is disabled
-urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
-
-print("=" * 60)
-print("Sentry API Key Test Script")
-print("=" * 60)
-
-# Load environment variables from .env file
-print("\n[Step 1] Loading environment variables from .env file...")
-try:
-    from dotenv import load_dotenv
-    load_dotenv()
-    print("✓ Environment variables loaded from .env file")
-except ImportError:
-    print("✗ python-dotenv package not found!")
-    print("\nPlease install it using:")
-    print("  pip install python-dotenv requests")
-    sys.exit(1)
-
-# Check if requests package is installed
-print("\n[Step 2] Checking if 'requests' package is installed...")
-try:
-    import requests
-    print(f"✓ Requests package found (version: {requests.__version__})")
-except ImportError:
-    print("✗ Requests package not found!")
-    print("\nPlease install it using:")
-    print("  pip install requests")
-    sys.exit(1)
-
-# Check for API key
-print("\n[Step 3] Checking for Sentry auth token...")
-auth_token = os.getenv("SENTRY_AUTH_TOKEN")
-
-if not auth_token or auth_token == "your-sentry-auth-token-here":
-    print("✗ SENTRY_AUTH_TOKEN not set or still has default value!")
-    print("\nPlease update the .env file with your actual auth token:")
-    print("  1. Open the .env file in this directory")
-    print("  2. Replace 'your-sentry-auth-token-here' with your actual Sentry auth token")
-    print("\nTo create a Sentry auth token:")
-    print("  1. Go to https://sentry.io/settings/account/api/auth-tokens/")
-    print("  2. Click 'Create New Token'")
-    print("  3. Give it a name and select scopes (at minimum: org:read, project:read)")
-    sys.exit(1)
-
-print(f"✓ Auth token found (starts with: {auth_token[:20]}...)")
-
-# Try with SSL verification first, fall back to without if needed
-verify_ssl = True
-ssl_error_occurred = False
-
-# Test 1: Get user/organization info
-print("\n[Step 4] Validating auth token with Sentry API...")
-print("Fetching organization information...")
-
-try:
-    # Get organizations
-    orgs_url = "https://sentry.io/api/0/organizations/"
-    headers = {
+import time
+from contextlib import redirect_stdout
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import httpx
+
+import circuit_breaker
+import provider_specs
+import rate_limiter
+import tail_latency
+import transport
+from instrumentation import RECORDER, add_metrics_arguments, export_metrics
+from precheck import precheck, sentry_org_token_payload
+from provider_specs import sentry_instance_url, sentry_payload_url
+from result_cache import open_cache, print_cached_verdict, split_cached, store_result
+from secret_io import (
+    STATUS_ACTIVE,
+    STATUS_ACTIVE_INSUFFICIENT_SCOPE,
+    STATUS_ERROR,
+    STATUS_INVALID,
+    STATUS_UNAVAILABLE,
+    ACTIVE_STATUSES,
+    NDJSONWriter,
+    chunked,
+    iter_secrets,
+    read_secrets,
+    redact,
+    result_record,
+)
+from validation_engine import ValidationEngine
+
+# Number of organizations/projects printed in detail; the rest are only counted
+DISPLAY_LIMIT = 3
+
+# Scope proven by a successful read of each endpoint
+ORGANIZATIONS_SCOPE = "org:read"
+PROJECTS_SCOPE = "project:read"
+
+DEFAULT_WORKERS = 8
+
+STATUS_LABELS = {
+    STATUS_ACTIVE: "ACTIVE and operational",
+    STATUS_ACTIVE_INSUFFICIENT_SCOPE: "ACTIVE but with insufficient permissions",
+    STATUS_INVALID: "INVALID, EXPIRED, or REVOKED",
+    STATUS_ERROR: "UNKNOWN (API call failed)",
+    STATUS_UNAVAILABLE: "UNKNOWN (provider unavailable)",
+}
+
+# Failures that count against a Sentry host's circuit breaker
+NETWORK_ERRORS = (httpx.TransportError,)
+
+# Tokens validated per round when streaming NDJSON output
+STREAM_CHUNK_SIZE = 1000
+
+
+def region_url(token):
+    """Base URL for organization-scoped calls, which are served by the token's region."""
+    return sentry_payload_url(token, "region_url", "url")
+
+
+def sentry_get(session, url, **kwargs):
+    """GET from Sentry, paced by the shared rate limiter and retried when throttled.
+
+    Every Sentry call is a read, so slow ones are hedged when hedging is enabled;
+    without an explicit timeout the adaptive one from tail_latency is used.
+    Calls go through the host's circuit breaker, which raises
+    circuit_breaker.ProviderUnavailable while the host is down.
+    """
+    if kwargs.get("timeout") is None:
+        kwargs["timeout"] = tail_latency.timeout("sentry")
+    # X-Sentry-Rate-Limit-* headers describe the token's own quota
+    key = session.headers.get("Authorization")
+
+    def paced_get():
+        rate_limiter.acquire("sentry", key)
+        return tail_latency.hedged("sentry", lambda: session.get(url, **kwargs))
+
+    for attempt in range(rate_limiter.MAX_RETRIES + 1):
+        response = circuit_breaker.guarded(url, paced_get, NETWORK_ERRORS)
+        rate_limiter.update_from_headers("sentry", response.headers, key)
+        if response.status_code != 429 or attempt == rate_limiter.MAX_RETRIES:
+            return response
+        retry_after = rate_limiter.parse_retry_after(response.headers.get("Retry-After"))
+        time.sleep(rate_limiter.backoff_delay(attempt, retry_after))
+
+
+def paginate(session, url, params=None, first_response=None, limit=None, stop_when=None, timeout=None):
+    """Yield items from a paginated Sentry endpoint, following Link header cursors.
+
+    Only one page is held in memory at a time. Iteration stops after `limit`
+    items, or right after yielding an item for which `stop_when(item)` is true.
+    An already fetched `first_response` can be passed to avoid requesting the
+    first page twice.
+    """
+    response = first_response
+    yielded = 0
+    while True:
+        if response is None:
+            response = sentry_get(session, url, params=params, timeout=timeout)
+        response.raise_for_status()
+
+        with RECORDER.span("parse_page", "sentry"):
+            items = response.json()
+        for item in items:
+            yield item
+            yielded += 1
+            if limit is not None and yielded >= limit:
+                return
+            if stop_when is not None and stop_when(item):
+                return
+
+        # Sentry always sends a "next" link; results="false" marks the last page
+        next_link = response.links.get("next", {})
+        if next_link.get("results") != "true" or not next_link.get("url"):
+            return
+        url, params, response = next_link["url"], None, None
+
+
+def organization_scopes(session, base_url, slug):
+    """Scopes the token holds in one organization, from the `access` list of its detail endpoint."""
+    response = sentry_get(session, f"{base_url}/api/0/organizations/{slug}/")
+    if response.status_code != 200:
+        return set()
+    with RECORDER.span("parse_response", "sentry"):
+        return set(response.json().get("access", ()))
+
+
+def scope_confirmed(session, base_url, scope, endpoint_scope, org_slug=None):
+    """Build a stop_when predicate that fires once `scope` has been proven.
+
+    Reading an endpoint proves its own scope. List items do not carry the
+    token's access, so any other scope is looked up once per organization
+    (the item's own, or `org_slug` for items inside one) on its detail endpoint.
+    """
+    confirmed = {}
+
+    def predicate(item):
+        if scope == endpoint_scope:
+            return True
+        slug = org_slug or item.get("slug")
+        if slug not in confirmed:
+            confirmed[slug] = scope in organization_scopes(session, base_url, slug)
+        return confirmed[slug]
+    return predicate
+
+
+def create_session(auth_token, workers=1):
+    """Create a client that can serve `workers` threads at once, multiplexed over HTTP/2."""
+    return transport.client("sentry", max_connections=max(workers, 1), headers={
         "Authorization": f"Bearer {auth_token}",
         "Content-Type": "application/json"
-    }
-    
+    })
+
+
+def count_items(session, url, limit=None):
+    count = 0
+    for count, _ in enumerate(paginate(session, url, limit=limit), 1):
+        pass
+    return count
+
+
+def summarize_organization(session, base_url, slug, max_projects=None, with_counts=False):
+    """Count the projects (and optionally teams and members) of one organization."""
+    org_url = f"{base_url}/api/0/organizations/{slug}"
+    summary = {"slug": slug}
+    started = time.monotonic()
     try:
-        response = requests.get(orgs_url, headers=headers, verify=verify_ssl, timeout=10)
-    except requests.exceptions.SSLError as ssl_err:
-        print(f"⚠ SSL certificate verification failed, retrying without verification...")
-        ssl_error_occurred = True
-        verify_ssl = False
-        response = requests.get(orgs_url, headers=headers, verify=verify_ssl, timeout=10)
-    
-    if response.status_code == 200:
-        orgs = response.json()
-        
-        if orgs and len(orgs) > 0:
-            print("✓ API call successful!")
-            print(f"\n[Organization Details]")
-            print(f"  Total organizations: {len(orgs)}")
-            
-            for i, org in enumerate(orgs[:3], 1):  # Show first 3 orgs
-                print(f"\n  Organization {i}:")
-                print(f"    Slug: {org.get('slug', 'N/A')}")
-                print(f"    Name: {org.get('name', 'N/A')}")
-                print(f"    ID: {org.get('id', 'N/A')}")
-                print(f"    Status: {org.get('status', {}).get('name', 'N/A')}")
-            
-            if len(orgs) > 3:
-                print(f"\n  ... and {len(orgs) - 3} more organization(s)")
-        else:
-            print("✓ API call successful!")
-            print("\n⚠ No organizations found for this auth token.")
-            print("  The token is valid but may have limited access.")
-    
-    elif response.status_code == 401:
-        print(f"✗ Authentication failed (401 Unauthorized)")
+        summary["projects"] = count_items(session, f"{org_url}/projects/", limit=max_projects)
+        if with_counts:
+            summary["teams"] = count_items(session, f"{org_url}/teams/")
+            summary["members"] = count_items(session, f"{org_url}/members/")
+    except (circuit_breaker.ProviderUnavailable, httpx.HTTPError, ValueError) as e:
+        # An outage or a malformed page is reported against this organization instead of aborting the whole run
+        summary["error"] = str(e)
+    summary["elapsed"] = time.monotonic() - started
+    return summary
+
+
+def check_tokens(tokens, on_result=None, concurrency=DEFAULT_WORKERS, engine=None):
+    """Validate many tokens concurrently with the shared validation engine.
+
+    Each token gets the organizations call the single-token mode starts with,
+    as described by the "sentry" entry of provider_specs.py. Malformed tokens
+    are rejected offline. A long-lived `engine` can be passed to reuse its
+    warm connections; it is left open.
+    """
+    owns_engine = engine is None
+    if owns_engine:
+        engine = ValidationEngine(concurrency)
+    try:
+        return engine.run(engine.check("sentry", tokens, on_result))
+    finally:
+        if owns_engine:
+            engine.close()
+
+
+def print_organization_summary(summary):
+    if "error" in summary:
+        print(f"  ⚠ {summary['slug']}: {summary['error']}")
+        return
+    counts = f"{summary['projects']} project(s)"
+    if "teams" in summary:
+        counts += f", {summary['teams']} team(s), {summary['members']} member(s)"
+    print(f"  ✓ {summary['slug']}: {counts} ({summary['elapsed']:.2f}s)")
+
+
+def load_environment():
+    print("\n[Step 1] Loading environment variables from .env file...")
+    with RECORDER.span("load_environment", "sentry"):
         try:
-            error_data = response.json()
-            if "detail" in error_data:
-                print(f"  Error: {error_data['detail']}")
-        except:
-            pass
-        
-        print("\n" + "=" * 60)
-        print("🔑 KEY VALIDATION STATUS")
-        print("=" * 60)
-        print("✗ Invalid Secret - Sentry rejected this auth token")
-        print(f"  Token prefix: {auth_token[:20]}...")
-        print(f"  Status: INVALID, EXPIRED, or REVOKED")
-        print("  The token appears to be inactive or incorrectly formatted.")
-        print("=" * 60)
-        sys.exit(1)
-    
-    elif response.status_code == 403:
-        print(f"✗ Access forbidden (403)")
-        print("  The token is valid but lacks necessary permissions.")
-        print("\n" + "=" * 60)
-        print("🔑 KEY VALIDATION STATUS")
-        print("=" * 60)
-        print("✓ Active Secret - Sentry confirmed this auth token is active")
-        print(f"  Token prefix: {auth_token[:20]}...")
-        print(f"  Status: ACTIVE but with insufficient permissions")
-        print("  Consider adding org:read and project:read scopes.")
-        print("=" * 60)
-        sys.exit(0)
-    
+            from dotenv import load_dotenv
+            load_dotenv()
+            print("✓ Environment variables loaded from .env file")
+        except ImportError:
+            print("✗ python-dotenv package not found!")
+            print("\nPlease install it using:")
+            print("  pip install python-dotenv 'httpx[http2]'")
+            sys.exit(1)
+
+
+def check_http2_support():
+    print("\n[Step 2] Checking HTTP client support...")
+    print(f"✓ httpx package found (version: {httpx.__version__})")
+    if transport.HTTP2_AVAILABLE:
+        print("✓ h2 package found, connections will use HTTP/2")
     else:
-        print(f"✗ API call failed with status code: {response.status_code}")
-        try:
-            error_data = response.json()
-            if "detail" in error_data:
-                print(f"  Error: {error_data['detail']}")
-        except:
-            pass
+        print("⚠ h2 package not found, connections will use HTTP/1.1 (pip install 'httpx[http2]')")
+
+
+def print_organization(i, org):
+    print(f"\n  Organization {i}:")
+    print(f"    Slug: {org.get('slug', 'N/A')}")
+    print(f"    Name: {org.get('name', 'N/A')}")
+    print(f"    ID: {org.get('id', 'N/A')}")
+    print(f"    Status: {org.get('status', {}).get('name', 'N/A')}")
+
+
+def print_project(i, project):
+    print(f"\n  Project {i}:")
+    print(f"    Slug: {project.get('slug', 'N/A')}")
+    print(f"    Name: {project.get('name', 'N/A')}")
+    print(f"    Platform: {project.get('platform', 'N/A')}")
+    print(f"    ID: {project.get('id', 'N/A')}")
+
+
+def print_batch_result(result):
+    status = result["status"]
+    marker = "✓" if status in ACTIVE_STATUSES else "✗"
+    cached = " (cached)" if result.get("cached") else ""
+    print(f"{marker} {redact(result['secret'], 20)}  {STATUS_LABELS[status]}{cached}")
+    if "error" in result:
+        print(f"    Error: {result['error']}")
+
+
+def run_batch(source, max_age=None, use_cache=True, writer=None, concurrency=DEFAULT_WORKERS):
+    """Validate tokens from a file or stdin.
+
+    With an NDJSONWriter the input is streamed in chunks of STREAM_CHUNK_SIZE
+    and every verdict is written as one record instead of being printed.
+    """
+    print("=" * 60)
+    print("Sentry API Key Test Script (batch mode)")
+    print("=" * 60)
+
+    load_environment()
+    check_http2_support()
+
+    print(f"\n[Step 3] Reading auth tokens from {'stdin' if source == '-' else source}...")
+    if writer is None:
+        tokens = read_secrets(source)
+        if not tokens:
+            print("✗ No auth tokens found in input!")
+            sys.exit(1)
+        print(f"✓ {len(tokens)} unique token(s) loaded")
+        chunks = [tokens]
+    else:
+        chunks = chunked(iter_secrets(source), STREAM_CHUNK_SIZE)
+        print(f"✓ Streaming tokens in chunks of {STREAM_CHUNK_SIZE}")
+
+    cache = open_cache(use_cache)
+    counts = {status: 0 for status in STATUS_LABELS}
+
+    def emit(result):
+        counts[result["status"]] += 1
+        RECORDER.count_verdict("sentry", result["status"])
+        if writer is None:
+            print_batch_result(result)
+        else:
+            writer.write(result_record(result, 20))
+
+    def on_result(result):
+        if not result.get("offline"):
+            store_result(cache, result)
+        emit(result)
+
+    print("\n[Step 4] Validating tokens with Sentry's organizations endpoint...")
+    engine = ValidationEngine(concurrency)
+    try:
+        for chunk in chunks:
+            cached, pending = split_cached(cache, "sentry", chunk, max_age)
+            if cached and writer is None:
+                print(f"✓ {len(cached)} token(s) answered from cache")
+            for result in cached:
+                emit(result)
+            with RECORDER.span("validate_tokens", "sentry", tokens=len(pending)):
+                check_tokens(pending, on_result=on_result, engine=engine)
+    finally:
+        engine.close()
+        if writer is not None:
+            writer.flush()
+        if cache is not None:
+            cache.close()
+
+    if not sum(counts.values()):
+        print("✗ No auth tokens found in input!")
+        sys.exit(1)
+
+    print("\n" + "=" * 60)
+    print("🔑 KEY VALIDATION SUMMARY")
+    print("=" * 60)
+    for status, label in STATUS_LABELS.items():
+        print(f"  {label}: {counts[status]}")
+    for line in tail_latency.hedging_summary():
+        print(f"  Hedged {line}")
+    for line in circuit_breaker.outage_summary():
+        print(f"  Outage {line}")
+    print("=" * 60)
+
+    if counts[STATUS_ERROR] or counts[STATUS_UNAVAILABLE]:
         sys.exit(1)
-        
-except requests.exceptions.SSLError as e:
-    print(f"✗ SSL certificate error: {e}")
-    print("\n⚠ SSL Certificate Issue Detected!")
-    print("To fix this on macOS, run:")
-    print("  /Applications/Python\\ 3.*/Install\\ Certificates.command")
-    print("\nOr install certifi:")
-    print("  pip install --upgrade certifi")
-    sys.exit(1)
-except requests.exceptions.RequestException as e:
-    print(f"✗ Network error: {e}")
-    sys.exit(1)
-except Exception as e:
-    print(f"✗ Unexpected error: {e}")
-    sys.exit(1)
-
-if ssl_error_occurred:
-    print("\n⚠ Note: SSL verification was bypassed due to certificate issues.")
-    print("For security, please fix SSL certificates:")
-    print("  /Applications/Python\\ 3.*/Install\\ Certificates.command")
-
-# Test 2: Get projects for first organization
-if orgs and len(orgs) > 0:
-    first_org_slug = orgs[0].get('slug')
-    
-    print(f"\n[Step 5] Testing project access for organization '{first_org_slug}'...")
-    print("Fetching project list...")
-    
+
+
+def run_single_check(max_orgs=None, max_projects=None, until_scope=None,
+                     all_orgs=False, workers=DEFAULT_WORKERS, with_counts=False,
+                     max_age=None, use_cache=True):
+    print("=" * 60)
+    print("Sentry API Key Test Script")
+    print("=" * 60)
+
+    load_environment()
+    check_http2_support()
+
+    # Check for API key
+    print("\n[Step 3] Checking for Sentry auth token...")
+    auth_token = os.getenv("SENTRY_AUTH_TOKEN")
+
+    if not auth_token or auth_token == "your-sentry-auth-token-here":
+        print("✗ SENTRY_AUTH_TOKEN not set or still has default value!")
+        print("\nPlease update the .env file with your actual auth token:")
+        print("  1. Open the .env file in this directory")
+        print("  2. Replace 'your-sentry-auth-token-here' with your actual Sentry auth token")
+        print("\nTo create a Sentry auth token:")
+        print("  1. Go to https://sentry.io/settings/account/api/auth-tokens/")
+        print("  2. Click 'Create New Token'")
+        print("  3. Give it a name and select scopes (at minimum: org:read, project:read)")
+        sys.exit(1)
+
+    print(f"✓ Auth token found (starts with: {auth_token[:20]}...)")
+
+    reason = precheck("sentry", auth_token)
+    if reason:
+        print(f"⚠ Token does not look like a Sentry auth token ({reason}), checking anyway...")
+    api_base_url = sentry_instance_url(auth_token)
+    org_base_url = region_url(auth_token)
+    payload_urls = [url for url in (sentry_org_token_payload(auth_token) or {}).values()
+                    if isinstance(url, str) and url.startswith(("http://", "https://"))]
+    if any(not provider_specs.trusted_sentry_url(url.rstrip("/")) for url in payload_urls):
+        print(f"⚠ Token names an untrusted Sentry host, using {provider_specs.SENTRY_URL} instead "
+              "(pass --sentry-url for a self-hosted instance)")
+    if api_base_url != provider_specs.SENTRY_URL or org_base_url != provider_specs.SENTRY_URL:
+        print(f"✓ Routing to {api_base_url} (organization data: {org_base_url})")
+
+    cache = open_cache(use_cache)
+    if cache is not None and max_age is not None:
+        entry = cache.get("sentry", auth_token, max_age)
+        if entry is not None:
+            RECORDER.count_verdict("sentry", entry["status"])
+            print_cached_verdict(entry, STATUS_LABELS[entry["status"]], redact(auth_token, 20))
+            sys.exit(1 if entry["status"] == STATUS_INVALID else 0)
+
+    with RECORDER.span("client_init", "sentry"):
+        session = create_session(auth_token, workers if all_orgs else 1)
+
+    # Organizations are handed to the worker pool as soon as they are streamed
+    executor = ThreadPoolExecutor(max_workers=workers) if all_orgs else None
     try:
-        projects_url = f"https://sentry.io/api/0/organizations/{first_org_slug}/projects/"
-        
-        response = requests.get(projects_url, headers=headers, verify=verify_ssl, timeout=10)
-        
-        if response.status_code == 200:
-            projects = response.json()
-            
-            print("✓ API call successful!")
-            print(f"\n[Project Details]")
-            print(f"  Total projects: {len(projects)}")
-            
-            if projects:
-                for i, project in enumerate(projects[:3], 1):  # Show first 3 projects
-                    print(f"\n  Project {i}:")
-                    print(f"    Slug: {project.get('slug', 'N/A')}")
-                    print(f"    Name: {project.get('name', 'N/A')}")
-                    print(f"    Platform: {project.get('platform', 'N/A')}")
-                    print(f"    ID: {project.get('id', 'N/A')}")
-                
-                if len(projects) > 3:
-                    print(f"\n  ... and {len(projects) - 3} more project(s)")
+        org_futures = []
+
+        org_count = 0
+        first_org_slug = None
+        scope_found = False
+
+        # Test 1: Get user/organization info
+        print("\n[Step 4] Validating auth token with Sentry API...")
+        print("Fetching organization information...")
+
+        try:
+            # Get organizations
+            orgs_url = f"{api_base_url}/api/0/organizations/"
+
+            with RECORDER.span("organizations", "sentry"):
+                response = sentry_get(session, orgs_url)
+
+            if response.status_code == 200:
+                stop_when = (scope_confirmed(session, org_base_url, until_scope, ORGANIZATIONS_SCOPE)
+                             if until_scope else None)
+
+                print("✓ API call successful!")
+                print(f"\n[Organization Details]")
+
+                orgs = paginate(session, orgs_url, first_response=response, limit=max_orgs, stop_when=stop_when)
+                for org_count, org in enumerate(orgs, 1):
+                    if org_count == 1:
+                        first_org_slug = org.get('slug')
+                    if org_count <= DISPLAY_LIMIT:
+                        print_organization(org_count, org)
+                    if executor is not None:
+                        org_futures.append(executor.submit(
+                            summarize_organization, session, org_base_url, org.get('slug'),
+                            max_projects, with_counts))
+                    scope_found = stop_when is not None and stop_when(org)
+
+                if org_count > DISPLAY_LIMIT:
+                    print(f"\n  ... and {org_count - DISPLAY_LIMIT} more organization(s)")
+
+                if org_count:
+                    print(f"\n  Total organizations: {org_count}")
+                    if scope_found:
+                        print(f"  Stopped early: scope '{until_scope}' confirmed")
+                    elif max_orgs is not None and org_count >= max_orgs:
+                        print(f"  Stopped early: limit of {max_orgs} organization(s) reached")
+                else:
+                    print("\n⚠ No organizations found for this auth token.")
+                    print("  The token is valid but may have limited access.")
+
+            elif response.status_code == 401:
+                print(f"✗ Authentication failed (401 Unauthorized)")
+                try:
+                    error_data = response.json()
+                    if "detail" in error_data:
+                        print(f"  Error: {error_data['detail']}")
+                except:
+                    pass
+
+                store_result(cache, {"secret": auth_token, "provider": "sentry", "status": STATUS_INVALID})
+                RECORDER.count_verdict("sentry", STATUS_INVALID)
+
+                print("\n" + "=" * 60)
+                print("🔑 KEY VALIDATION STATUS")
+                print("=" * 60)
+                print("✗ Invalid Secret - Sentry rejected this auth token")
+                print(f"  Token prefix: {auth_token[:20]}...")
+                print(f"  Status: INVALID, EXPIRED, or REVOKED")
+                print("  The token appears to be inactive or incorrectly formatted.")
+                print("=" * 60)
+                sys.exit(1)
+
+            elif response.status_code == 403:
+                print(f"✗ Access forbidden (403)")
+                print("  The token is valid but lacks necessary permissions.")
+                store_result(cache, {"secret": auth_token, "provider": "sentry",
+                                     "status": STATUS_ACTIVE_INSUFFICIENT_SCOPE})
+                RECORDER.count_verdict("sentry", STATUS_ACTIVE_INSUFFICIENT_SCOPE)
+                print("\n" + "=" * 60)
+                print("🔑 KEY VALIDATION STATUS")
+                print("=" * 60)
+                print("✓ Active Secret - Sentry confirmed this auth token is active")
+                print(f"  Token prefix: {auth_token[:20]}...")
+                print(f"  Status: ACTIVE but with insufficient permissions")
+                print("  Consider adding org:read and project:read scopes.")
+                print("=" * 60)
+                sys.exit(0)
+
             else:
-                print("  No projects found in this organization.")
+                RECORDER.count_verdict("sentry", STATUS_ERROR)
+                print(f"✗ API call failed with status code: {response.status_code}")
+                try:
+                    error_data = response.json()
+                    if "detail" in error_data:
+                        print(f"  Error: {error_data['detail']}")
+                except:
+                    pass
+                sys.exit(1)
+
+        except transport.TLSError as e:
+            transport.print_tls_help(e)
+            sys.exit(1)
+        except circuit_breaker.ProviderUnavailable as e:
+            print(f"✗ Sentry unavailable: {e}")
+            sys.exit(1)
+        except httpx.HTTPError as e:
+            print(f"✗ Network error: {e}")
+            sys.exit(1)
+        except Exception as e:
+            print(f"✗ Unexpected error: {e}")
+            sys.exit(1)
+
+        # Test 2: Get projects for every organization in parallel
+        if executor is not None and org_futures:
+            print(f"\n[Step 5] Testing project access for {len(org_futures)} organization(s) "
+                  f"with {workers} worker(s)...")
+            print("Fetching project lists...\n")
+
+            started = time.monotonic()
+            total_projects = 0
+            failed_orgs = 0
+            for future in as_completed(org_futures):
+                summary = future.result()
+                print_organization_summary(summary)
+                if "error" in summary:
+                    failed_orgs += 1
+                else:
+                    total_projects += summary["projects"]
+
+            print(f"\n[Project Details]")
+            print(f"  Total projects: {total_projects} across {len(org_futures) - failed_orgs} organization(s)")
+            if failed_orgs:
+                print(f"  Organizations that could not be read: {failed_orgs}")
+            print(f"  Completed in {time.monotonic() - started:.2f}s")
+
+        # Test 2: Get projects for first organization
+        elif first_org_slug and not scope_found:
+            print(f"\n[Step 5] Testing project access for organization '{first_org_slug}'...")
+            print("Fetching project list...")
+
+            try:
+                projects_url = f"{org_base_url}/api/0/organizations/{first_org_slug}/projects/"
+
+                with RECORDER.span("projects", "sentry"):
+                    response = sentry_get(session, projects_url)
+
+                if response.status_code == 200:
+                    stop_when = (scope_confirmed(session, org_base_url, until_scope, PROJECTS_SCOPE, first_org_slug)
+                                 if until_scope else None)
+
+                    print("✓ API call successful!")
+                    print(f"\n[Project Details]")
+
+                    project_count = 0
+                    projects = paginate(session, projects_url, first_response=response,
+                                        limit=max_projects, stop_when=stop_when)
+                    for project_count, project in enumerate(projects, 1):
+                        if project_count <= DISPLAY_LIMIT:
+                            print_project(project_count, project)
+                        scope_found = stop_when is not None and stop_when(project)
+
+                    if project_count > DISPLAY_LIMIT:
+                        print(f"\n  ... and {project_count - DISPLAY_LIMIT} more project(s)")
+
+                    if project_count:
+                        print(f"\n  Total projects: {project_count}")
+                        if scope_found:
+                            print(f"  Stopped early: scope '{until_scope}' confirmed")
+                        elif max_projects is not None and project_count >= max_projects:
+                            print(f"  Stopped early: limit of {max_projects} project(s) reached")
+                    else:
+                        print("  No projects found in this organization.")
+                else:
+                    print(f"⚠ Could not fetch projects (status code: {response.status_code})")
+
+            except transport.TLSError as e:
+                print(f"✗ TLS certificate verification failed: {e}")
+            except circuit_breaker.ProviderUnavailable as e:
+                print(f"⚠ Sentry unavailable: {e}")
+            except httpx.HTTPError as e:
+                print(f"⚠ Network error: {e}")
+            except Exception as e:
+                print(f"⚠ Unexpected error: {e}")
+    finally:
+        # Organizations still queued when the check bails out must not keep sending requests
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+        session.close()
+
+    store_result(cache, {"secret": auth_token, "provider": "sentry", "status": STATUS_ACTIVE,
+                         "organizations": org_count})
+    RECORDER.count_verdict("sentry", STATUS_ACTIVE)
+
+    # Final validation status
+    print("\n" + "=" * 60)
+    print("🔑 KEY VALIDATION STATUS")
+    print("=" * 60)
+    print("✓ Active Secret - Sentry confirmed this auth token is active")
+    print(f"  Token prefix: {auth_token[:20]}...")
+    print(f"  Status: ACTIVE and operational")
+    if org_count:
+        print(f"  Organizations accessible: {org_count}")
+    print("=" * 60)
+
+    print("\n✓ All tests passed! Your Sentry auth token is active and working.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Test whether a Sentry auth token is active.")
+    parser.add_argument("--batch", metavar="FILE",
+                        help="validate one token per line from FILE ('-' for stdin) instead of SENTRY_AUTH_TOKEN")
+    parser.add_argument("--max-orgs", type=int, metavar="N",
+                        help="stop after streaming the first N organizations")
+    parser.add_argument("--max-projects", type=int, metavar="N",
+                        help="stop after streaming the first N projects")
+    parser.add_argument("--until-scope", metavar="SCOPE",
+                        help="stop streaming once SCOPE (e.g. org:read, project:read) is confirmed")
+    parser.add_argument("--all-orgs", action="store_true",
+                        help="enumerate projects for every accessible organization, not just the first")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help=f"organizations fetched in parallel with --all-orgs, or tokens checked at once with --batch (default: {DEFAULT_WORKERS})")
+    parser.add_argument("--with-counts", action="store_true",
+                        help="also count teams and members for each organization with --all-orgs")
+    parser.add_argument("--max-age", type=int, metavar="SECONDS",
+                        help="accept a cached verdict checked at most SECONDS ago instead of calling Sentry")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="neither read nor write the on-disk result cache")
+    parser.add_argument("--output", choices=("text", "ndjson"), default="text",
+                        help="batch output format; ndjson writes one JSON record per token to stdout (default: text)")
+    parser.add_argument("--sentry-url", metavar="URL",
+                        help="Sentry instance to use, e.g. a self-hosted one; organization tokens may also "
+                             "point to it (default: $SENTRY_URL or https://sentry.io)")
+    tail_latency.add_hedging_argument(parser)
+    transport.add_transport_arguments(parser)
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+    if args.hedge:
+        tail_latency.enable_hedging()
+    if args.ca_bundle:
+        transport.set_ca_bundle(args.ca_bundle)
+    if args.sentry_url:
+        provider_specs.set_sentry_url(args.sentry_url)
+    if args.output == "ndjson" and not args.batch:
+        parser.error("--output ndjson requires --batch")
+
+    try:
+        if args.batch and args.output == "ndjson":
+            writer = NDJSONWriter(sys.stdout)
+            with redirect_stdout(sys.stderr):
+                run_batch(args.batch, args.max_age, not args.no_cache, writer, max(1, args.workers))
+        elif args.batch:
+            run_batch(args.batch, args.max_age, not args.no_cache, concurrency=max(1, args.workers))
         else:
-            print(f"⚠ Could not fetch projects (status code: {response.status_code})")
-            
-    except requests.exceptions.SSLError as e:
-        print(f"✗ SSL certificate error: {e}")
-    except requests.exceptions.RequestException as e:
-        print(f"⚠ Network error: {e}")
-    except Exception as e:
-        print(f"⚠ Unexpected error: {e}")
-
-# Final validation status
-print("\n" + "=" * 60)
-print("🔑 KEY VALIDATION STATUS")
-print("=" * 60)
-print("✓ Active Secret - Sentry confirmed this auth token is active")
-print(f"  Token prefix: {auth_token[:20]}...")
-print(f"  Status: ACTIVE and operational")
-if orgs and len(orgs) > 0:
-    print(f"  Organizations accessible: {len(orgs)}")
-print("=" * 60)
-
-print("\n✓ All tests passed! Your Sentry auth token is active and working.")
-
-if ssl_error_occurred:
-    print("\n⚠ Warning: SSL verification was bypassed. Please install certificates for security.")
+            run_single_check(args.max_orgs, args.max_projects, args.until_scope,
+                             args.all_orgs, max(1, args.workers), args.with_counts,
+                             args.max_age, not args.no_cache)
+    finally:
+        export_metrics(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Shared HTTP Transport
+Builds the httpx clients every script uses to talk to the provider APIs.
+
+Clients speak HTTP/2 whenever the h2 package is installed, so the concurrent
+calls a bulk run makes to one host are multiplexed over a single connection
+instead of each worker paying for its own TCP and TLS handshake. Hosts that
+only offer HTTP/1.1 are negotiated down through ALPN and get a keep-alive
+pool instead.
+
+Certificates are always verified; there is no insecure fallback. All clients
+share one SSLContext per process, loaded from the first of:
+  --ca-bundle FILE
+  SECRET_TESTER_CA_BUNDLE, SSL_CERT_FILE or REQUESTS_CA_BUNDLE
+  certifi's bundle, if certifi is installed
+  the system trust store
+Point --ca-bundle at your proxy's root certificate when TLS is intercepted.
+"""
+
+import argparse
+import importlib.util
+import os
+import ssl
+import threading
+
+import httpx
+
+from instrumentation import httpx_event_hooks
+
+CA_BUNDLE_ENV_VARS = ("SECRET_TESTER_CA_BUNDLE", "SSL_CERT_FILE", "REQUESTS_CA_BUNDLE")
+
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+# Default for calls that do not pass their own timeout
+DEFAULT_TIMEOUT = 10.0
+
+_ca_bundle = None
+_ssl_context = None
+_ssl_context_lock = threading.Lock()
+
+
+def set_ca_bundle(path):
+    """Use the CA bundle at `path` for every client created from now on, here and in child processes."""
+    global _ca_bundle, _ssl_context
+    with _ssl_context_lock:
+        _ca_bundle = path
+        _ssl_context = None
+    os.environ[CA_BUNDLE_ENV_VARS[0]] = path
+
+
+def ca_bundle():
+    """Path of the CA bundle in use, or None for the system trust store."""
+    if _ca_bundle:
+        return _ca_bundle
+    for name in CA_BUNDLE_ENV_VARS:
+        if os.getenv(name):
+            return os.getenv(name)
+    try:
+        import certifi
+        return certifi.where()
+    except ImportError:
+        return None
+
+
+def ssl_context():
+    """The process-wide SSLContext; the CA bundle is only parsed once."""
+    global _ssl_context
+    with _ssl_context_lock:
+        if _ssl_context is None:
+            _ssl_context = ssl.create_default_context(cafile=ca_bundle())
+        return _ssl_context
+
+
+class TLSError(httpx.HTTPError):
+    """A provider's TLS handshake failed, usually because its certificate could not be verified.
+
+    Deliberately not an httpx.TransportError: it is a local trust problem, so it
+    does not count against the host's circuit breaker and is never retried.
+    """
+
+    def __init__(self, message, request):
+        super().__init__(message)
+        self.request = request
+
+
+def is_tls_error(error):
+    """Whether an exception was caused by a failed TLS handshake or certificate check."""
+    while error is not None:
+        if isinstance(error, ssl.SSLError):
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+
+class VerifiedTransport(httpx.HTTPTransport):
+    def handle_request(self, request):
+        try:
+            return super().handle_request(request)
+        except httpx.ConnectError as e:
+            if is_tls_error(e):
+                raise TLSError(str(e), request) from e
+            raise
+
+
+class AsyncVerifiedTransport(httpx.AsyncHTTPTransport):
+    async def handle_async_request(self, request):
+        try:
+            return await super().handle_async_request(request)
+        except httpx.ConnectError as e:
+            if is_tls_error(e):
+                raise TLSError(str(e), request) from e
+            raise
+
+
+def _transport_options(max_connections):
+    return {
+        "http2": HTTP2_AVAILABLE,
+        "verify": ssl_context(),
+        "limits": httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+    }
+
+
+def client(provider, max_connections=10, headers=None):
+    """A pooled, instrumented httpx.Client for one provider."""
+    options = _transport_options(max_connections)
+    return httpx.Client(
+        transport=VerifiedTransport(**options),
+        timeout=DEFAULT_TIMEOUT,
+        headers=headers,
+        follow_redirects=True,
+        event_hooks=httpx_event_hooks(provider),
+        **options,
+    )
+
+
+def async_client(provider, max_connections=10):
+    """A pooled, instrumented httpx.AsyncClient for one provider."""
+    options = _transport_options(max_connections)
+    return httpx.AsyncClient(
+        transport=AsyncVerifiedTransport(**options),
+        timeout=DEFAULT_TIMEOUT,
+        event_hooks=httpx_event_hooks(provider, asynchronous=True),
+        **options,
+    )
+
+
+def print_tls_help(error):
+    print(f"✗ TLS certificate verification failed: {error}")
+    print(f"  CA bundle in use: {ca_bundle() or 'system trust store'}")
+    print("\n⚠ SSL Certificate Issue Detected!")
+    print("If your network intercepts TLS, pass the proxy's root certificate:")
+    print("  --ca-bundle /path/to/ca.pem  (or set SECRET_TESTER_CA_BUNDLE)")
+    print("Otherwise update the bundled certificates:")
+    print("  pip install --upgrade certifi")
+
+
+def existing_file(path):
+    if not os.path.isfile(path):
+        raise argparse.ArgumentTypeError(f"no such file: {path}")
+    return path
+
+
+def add_transport_arguments(parser):
+    parser.add_argument("--ca-bundle", metavar="FILE", type=existing_file,
+                        help="verify provider certificates against the CA certificates in FILE "
+                             "(default: $SECRET_TESTER_CA_BUNDLE, certifi, or the system store)")
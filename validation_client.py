@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Validation Daemon Client
+Thin, stdlib-only client for validation_daemon.py. It skips the interpreter
+start-up cost of importing openai/requests and the TLS handshakes of a fresh
+process, so a pre-receive hook can check a secret in a few milliseconds.
+
+Usage:
+  python validation_client.py openai sk-proj-...
+  python validation_client.py sentry --batch tokens.txt
+  python validation_client.py facebook EAA... --daemon http://127.0.0.1:8787
+
+Exits 0 when every secret is active, 1 when any is invalid or could not be
+checked, and 2 when the daemon is unreachable.
+"""
+
+import argparse
+import http.client
+import json
+import os
+import socket
+import sys
+
+from provider_specs import SPECS
+from secret_io import ACTIVE_STATUSES, read_secrets, redact
+
+# Unix socket path, or an http://host:port URL for a daemon started with --port
+DEFAULT_DAEMON = os.getenv(
+    "SECRET_TESTER_DAEMON",
+    os.path.join(os.path.expanduser("~"), ".cache", "secret-tester", "daemon.sock"),
+)
+
+PROVIDERS = tuple(SPECS)
+
+STATUS_LABELS = {
+    "active": "ACTIVE and operational",
+    "active-rate-limited": "ACTIVE but rate-limited",
+    "active-insufficient-scope": "ACTIVE but with insufficient permissions",
+    "invalid": "INVALID or REVOKED",
+    "error": "UNKNOWN (check failed)",
+    "unavailable": "UNKNOWN (provider unavailable)",
+}
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path, timeout):
+        super().__init__("localhost", timeout=timeout)
+        self.path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.path)
+
+
+def connect(daemon, timeout=60):
+    if daemon.startswith("http://"):
+        host = daemon[len("http://"):].rstrip("/")
+        return http.client.HTTPConnection(host, timeout=timeout)
+    return UnixHTTPConnection(daemon, timeout)
+
+
+def request(daemon, method, path, body=None, timeout=60):
+    """Send one request to the daemon and return (status_code, decoded JSON body)."""
+    connection = connect(daemon, timeout)
+    try:
+        payload = json.dumps(body).encode() if body is not None else None
+        headers = {"Content-Type": "application/json"} if payload is not None else {}
+        connection.request(method, path, body=payload, headers=headers)
+        response = connection.getresponse()
+        return response.status, json.loads(response.read() or b"{}")
+    finally:
+        connection.close()
+
+
+def validate(provider, secrets, daemon=DEFAULT_DAEMON, max_age=None, timeout=60):
+    """Ask the daemon for verdicts; results come back in input order, without the secrets."""
+    body = {"provider": provider, "secrets": list(secrets)}
+    if max_age is not None:
+        body["max_age"] = max_age
+    status, response = request(daemon, "POST", "/validate", body, timeout)
+    if status != 200:
+        raise RuntimeError(response.get("error", f"daemon answered with status {status}"))
+    return response["results"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Validate secrets through a running validation daemon.")
+    parser.add_argument("provider", choices=PROVIDERS)
+    parser.add_argument("secrets", nargs="*", help="secrets to validate")
+    parser.add_argument("--batch", metavar="FILE", help="read one secret per line from FILE ('-' for stdin)")
+    parser.add_argument("--daemon", default=DEFAULT_DAEMON,
+                        help=f"daemon Unix socket path or http://host:port URL (default: {DEFAULT_DAEMON})")
+    parser.add_argument("--max-age", type=int, metavar="SECONDS",
+                        help="accept verdicts cached by the daemon at most SECONDS ago")
+    parser.add_argument("--timeout", type=float, default=60, help="seconds to wait for the daemon (default: 60)")
+    args = parser.parse_args()
+
+    secrets = list(args.secrets)
+    if args.batch:
+        secrets += read_secrets(args.batch)
+    if not secrets:
+        parser.error("no secrets given")
+
+    try:
+        results = validate(args.provider, secrets, args.daemon, args.max_age, args.timeout)
+    except (OSError, RuntimeError, ValueError) as e:
+        print(f"✗ Validation daemon unavailable at {args.daemon}: {e}", file=sys.stderr)
+        sys.exit(2)
+
+    all_active = True
+    for secret, result in zip(secrets, results):
+        status = result["status"]
+        marker = "✓" if status in ACTIVE_STATUSES else "✗"
+        cached = " (cached)" if result.get("cached") else ""
+        print(f"{marker} {redact(secret)}  {STATUS_LABELS.get(status, status)}{cached}")
+        if result.get("error") and status not in ACTIVE_STATUSES:
+            print(f"    {result['error']}")
+        all_active = all_active and status in ACTIVE_STATUSES
+    sys.exit(0 if all_active else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""
+Resident Validation Daemon
+Keeps the validation engine loaded, with warm keep-alive connection pools
+to every provider in provider_specs.py, and answers validation requests over
+a Unix socket or a local HTTP port. Pair it with validation_client.py to check
+secrets without paying for a fresh interpreter, module imports, `.env`
+parsing and new TLS handshakes on every call.
+
+Usage:
+  python validation_daemon.py                   # Unix socket (see validation_client.py)
+  python validation_daemon.py --port 8787       # http://127.0.0.1:8787
+
+API:
+  POST /validate  {"provider": "openai", "secrets": [...], "max_age": 3600}
+                  -> {"results": [{"prefix": ..., "status": ..., ...}, ...]} in input order
+  GET  /health    -> {"status": "ok", "providers": [...]}
+  GET  /metrics   -> Prometheus text format (see instrumentation.py)
+"""
+
+import argparse
+import asyncio
+import ipaddress
+import json
+import os
+import signal
+import socket
+import socketserver
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import transport
+from instrumentation import RECORDER
+from result_cache import open_cache, split_cached, store_result, ttl_until
+from secret_io import redact
+from validation_client import DEFAULT_DAEMON
+from validation_engine import ValidationEngine
+
+DEFAULT_CONCURRENCY = 10
+DEFAULT_POOL_SIZE = 32
+
+# Largest request body accepted, so a stray client cannot exhaust memory
+MAX_REQUEST_BYTES = 16 * 1024 * 1024
+
+
+class Validators:
+    """Every provider's validator with long-lived, shared connection pools.
+
+    The validation engine runs on one event loop in a background thread;
+    Facebook tokens use test_facebook_key.py's Graph API batch requests over a
+    shared HTTP/2 client.
+    """
+
+    def __init__(self, concurrency=DEFAULT_CONCURRENCY, pool_size=DEFAULT_POOL_SIZE, use_cache=True):
+        import test_facebook_key
+
+        self.facebook = test_facebook_key
+        self.facebook_session = transport.client("facebook", max_connections=pool_size)
+        # Requests are answered straight away; secrets of a provider that is down come back unavailable
+        self.engine = ValidationEngine(concurrency, outage_wait=0)
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self.loop.run_forever, daemon=True).start()
+
+        self.cache = open_cache(use_cache)
+        # One SQLite connection is shared by every handler thread
+        self.cache_lock = threading.Lock()
+
+    def run_async(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+    @property
+    def providers(self):
+        return self.engine.providers
+
+    def check(self, provider, secrets):
+        if provider == "facebook":
+            return self.facebook.check_tokens(secrets, session=self.facebook_session, outage_wait=0)
+        return self.run_async(self.engine.check(provider, secrets))
+
+    def validate(self, provider, secrets, max_age=None):
+        """Return one result per secret, in input order."""
+        unique = list(dict.fromkeys(secrets))
+        with self.cache_lock:
+            cached, pending = split_cached(self.cache, provider, unique, max_age)
+
+        checked = self.check(provider, pending) if pending else []
+        with self.cache_lock:
+            for result in checked:
+                if not result.get("offline"):
+                    store_result(self.cache, result, cache_ttl(result))
+
+        by_secret = {}
+        for result in cached + checked:
+            RECORDER.count_verdict(provider, result["status"])
+            by_secret[result["secret"]] = result
+        return [by_secret[secret] for secret in secrets]
+
+    def close(self):
+        self.facebook_session.close()
+        self.run_async(self.engine.aclose())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        if self.cache is not None:
+            self.cache.close()
+
+
+def cache_ttl(result):
+    """Never trust a cached verdict past the expiry a provider reported for the secret."""
+    return ttl_until(result.get("token_data", {}).get("expires_at", 0), result["status"])
+
+
+def public_result(result):
+    """A result as sent to clients: the secret itself is replaced by its printable prefix."""
+    response = {key: value for key, value in result.items() if key != "secret"}
+    response["prefix"] = redact(result["secret"])
+    return response
+
+
+class DaemonHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    validators = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, body):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        if self.path == "/health":
+            return self.send_json(200, {"status": "ok", "providers": self.validators.providers})
+        if self.path == "/metrics":
+            payload = RECORDER.prometheus_text().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+            return
+        self.send_json(404, {"error": f"Unknown path {self.path}"})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_REQUEST_BYTES:
+            self.close_connection = True
+            return self.send_json(413, {"error": "Request too large"})
+        body = self.rfile.read(length)
+        if self.path != "/validate":
+            return self.send_json(404, {"error": f"Unknown path {self.path}"})
+
+        try:
+            request = json.loads(body or b"{}")
+            provider = request["provider"]
+            secrets = [str(secret).strip() for secret in request["secrets"]]
+            max_age = request.get("max_age")
+        except (ValueError, KeyError, TypeError) as e:
+            return self.send_json(400, {"error": f"Malformed request: {e}"})
+        if provider not in self.validators.providers:
+            return self.send_json(400, {"error": f"Unsupported provider '{provider}'"})
+
+        try:
+            results = self.validators.validate(provider, secrets, max_age)
+        except Exception as e:
+            return self.send_json(502, {"error": f"Validation failed: {e}"})
+        self.send_json(200, {"results": [public_result(result) for result in results]})
+
+
+class UnixDaemonServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def get_request(self):
+        connection, _ = super().get_request()
+        # BaseHTTPRequestHandler expects a (host, port) style client address
+        return connection, ("local", 0)
+
+
+class TCPDaemonServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+
+class TCP6DaemonServer(TCPDaemonServer):
+    address_family = socket.AF_INET6
+
+
+def create_server(validators, socket_path=None, host="127.0.0.1", port=None):
+    handler = type("ConfiguredDaemonHandler", (DaemonHandler,), {"validators": validators})
+    if port is not None:
+        server_class = TCP6DaemonServer if ":" in host else TCPDaemonServer
+        return server_class((host, port), handler)
+
+    directory = os.path.dirname(socket_path)
+    if directory:
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    server = UnixDaemonServer(socket_path, handler)
+    # Anyone who can connect can use the daemon's network identity; keep it private
+    os.chmod(socket_path, 0o600)
+    return server
+
+
+def loopback_host(host):
+    """argparse type for --host: the HTTP API has no authentication, so it must not leave this machine."""
+    if host == "localhost":
+        return host
+    try:
+        if ipaddress.ip_address(host).is_loopback:
+            return host
+    except ValueError:
+        pass
+    raise argparse.ArgumentTypeError(
+        f"{host} is not a loopback address; the daemon has no authentication, so it only listens locally")
+
+
+def load_environment():
+    print("\n[Step 1] Loading environment variables from .env file...")
+    try:
+        from dotenv import load_dotenv
+        load_dotenv()
+        print("✓ Environment variables loaded from .env file")
+    except ImportError:
+        print("⚠ python-dotenv package not found, using the process environment only")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve secret validation requests with warm connection pools.")
+    parser.add_argument("--socket", default=DEFAULT_DAEMON, metavar="PATH",
+                        help=f"Unix socket to listen on (default: {DEFAULT_DAEMON})")
+    parser.add_argument("--port", type=int, help="listen on 127.0.0.1:PORT over HTTP instead of a Unix socket")
+    parser.add_argument("--host", default="127.0.0.1", type=loopback_host,
+                        help="loopback address to bind with --port, e.g. ::1 (default: 127.0.0.1)")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help=f"secrets checked at once per request (default: {DEFAULT_CONCURRENCY})")
+    parser.add_argument("--pool-size", type=int, default=DEFAULT_POOL_SIZE,
+                        help=f"keep-alive connections kept per provider host (default: {DEFAULT_POOL_SIZE})")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="neither read nor write the on-disk result cache")
+    transport.add_transport_arguments(parser)
+    args = parser.parse_args()
+    if args.ca_bundle:
+        transport.set_ca_bundle(args.ca_bundle)
+
+    if args.port is None and args.socket.startswith("http://"):
+        print("✗ SECRET_TESTER_DAEMON is a URL; pass --port to serve over HTTP")
+        sys.exit(1)
+
+    print("=" * 60)
+    print("Resident Validation Daemon")
+    print("=" * 60)
+
+    load_environment()
+
+    print("\n[Step 2] Loading validators and opening connection pools...")
+    validators = Validators(max(1, args.concurrency), max(1, args.pool_size), not args.no_cache)
+    print(f"✓ Providers: {', '.join(validators.providers)}")
+
+    print("\n[Step 3] Starting server...")
+    server = create_server(validators, args.socket, args.host, args.port)
+    host = f"[{args.host}]" if ":" in args.host else args.host
+    address = f"http://{host}:{server.server_address[1]}" if args.port is not None else args.socket
+    print(f"✓ Listening on {address}")
+    print("\nPress Ctrl+C to stop.")
+    # Clean up the socket on a service manager's SIGTERM as well as on Ctrl+C
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if args.port is None and os.path.exists(args.socket):
+            os.unlink(args.socket)
+        validators.close()
+
+
+if __name__ == "__main__":
+    main()
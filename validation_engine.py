@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+Shared Async Validation Engine
+Runs the provider specs from provider_specs.py for many secrets at once.
+
+One pooled httpx.AsyncClient from transport.py is kept per provider and
+reused across calls, so concurrent probes to a host share one HTTP/2
+connection. A semaphore bounds the number of secrets in flight, every request
+is paced by the provider's rate-limit bucket, throttled probes are retried
+with backoff, and timeouts and hedging come from tail_latency.py. Requests go
+through the host's circuit breaker (circuit_breaker.py): while a provider is
+down its secrets are parked and retried once it answers again, for up to
+`outage_wait` seconds. Results are the same dicts the key test scripts
+produce.
+
+Usage from synchronous code:
+  engine = ValidationEngine(concurrency=20)
+  results = engine.run(engine.check("sentry", tokens))
+  engine.close()
+"""
+
+import asyncio
+import time
+
+import httpx
+
+import circuit_breaker
+import rate_limiter
+import tail_latency
+import transport
+from precheck import PRECHECKS, split_plausible
+from provider_specs import CONTINUE, ERROR_MESSAGE_PATHS, RETRY, SPECS
+from secret_io import STATUS_ACTIVE, STATUS_ACTIVE_INSUFFICIENT_SCOPE, STATUS_ERROR, STATUS_UNAVAILABLE
+
+DEFAULT_CONCURRENCY = 10
+
+_MISSING = object()
+
+
+def lookup(body, path):
+    """Value at a dotted path in a JSON body ('' is the body itself), or _MISSING."""
+    value = body
+    for key in path.split(".") if path else ():
+        if not isinstance(value, dict) or key not in value:
+            return _MISSING
+        value = value[key]
+    return value
+
+
+def matches(expected, value):
+    if isinstance(expected, (set, frozenset, tuple, list, range)):
+        return value in expected
+    return value == expected
+
+
+def match_rule(rules, status, body):
+    """The first rule matching a response, or None."""
+    error = body.get("error") if isinstance(body, dict) else None
+    error_code = error.get("code") if isinstance(error, dict) else None
+    for rule in rules:
+        if "status" in rule and not matches(rule["status"], status):
+            continue
+        if "error_code" in rule and not matches(rule["error_code"], error_code):
+            continue
+        if any(lookup(body, path) != value for path, value in rule.get("json", {}).items()):
+            continue
+        return rule
+    return None
+
+
+def error_message(body):
+    for path in ERROR_MESSAGE_PATHS:
+        message = lookup(body, path)
+        if isinstance(message, str):
+            return message
+    return None
+
+
+class ValidationEngine:
+    """Validates secrets for any provider in SPECS over long-lived pooled clients.
+
+    The clients belong to the event loop they were first used on; use the
+    engine from a single loop, e.g. through run().
+    """
+
+    def __init__(self, concurrency=DEFAULT_CONCURRENCY, specs=None, outage_wait=circuit_breaker.OUTAGE_WAIT):
+        self.concurrency = concurrency
+        self.specs = specs or SPECS
+        self.outage_wait = outage_wait
+        self.clients = {}
+        self.loop = None
+
+    @property
+    def providers(self):
+        return list(self.specs)
+
+    def client(self, provider):
+        if provider not in self.clients:
+            self.clients[provider] = transport.async_client(provider, self.concurrency)
+        return self.clients[provider]
+
+    def base_url(self, spec, secret):
+        return spec["base_url"](secret) if callable(spec["base_url"]) else spec["base_url"]
+
+    def build_request(self, spec, probe, secret):
+        base_url = self.base_url(spec, secret)
+        params = {name: value.format(secret=secret) for name, value in probe.get("params", {}).items()}
+        headers = {}
+        auth = spec["auth"]
+        if "header" in auth:
+            headers[auth["header"]] = auth.get("format", "{secret}").format(secret=secret)
+        else:
+            params[auth["param"]] = secret
+        return base_url + probe["path"], params, headers
+
+    async def run_probe(self, provider, spec, probe, secret, result):
+        """Run one probe, retrying while throttled; return the verdict (CONTINUE or a status)."""
+        client = self.client(provider)
+        url, params, headers = self.build_request(spec, probe, secret)
+
+        def send():
+            return client.get(url, params=params, headers=headers, timeout=tail_latency.timeout(provider))
+
+        async def paced_send():
+            await rate_limiter.acquire_async(provider, secret)
+            return await tail_latency.hedged_async(provider, send)
+
+        for attempt in range(rate_limiter.MAX_RETRIES + 1):
+            # The breaker is asked first, so requests it holds back do not use up rate-limit tokens
+            response = await circuit_breaker.guarded_async(url, paced_send, httpx.TransportError)
+            rate_limiter.update_from_headers(provider, response.headers, secret)
+            if response.status_code >= 500:
+                # The provider failed, not the secret: park it until the provider recovers
+                result["error"] = f"Provider returned status code {response.status_code}"
+                return STATUS_UNAVAILABLE
+            try:
+                body = response.json()
+            except ValueError:
+                body = {}
+
+            rule = match_rule(probe["rules"], response.status_code, body)
+            verdict = rule["verdict"] if rule else STATUS_ERROR
+            for key, path in probe.get("capture", {}).items():
+                value = lookup(body, path)
+                if response.status_code == 200 and value is not _MISSING:
+                    result[key] = value
+
+            if verdict == RETRY:
+                if attempt < rate_limiter.MAX_RETRIES:
+                    retry_after = rate_limiter.parse_retry_after(response.headers.get("Retry-After"))
+                    await asyncio.sleep(rate_limiter.backoff_delay(attempt, retry_after))
+                    continue
+                verdict = rule.get("exhausted", STATUS_ERROR)
+                result["throttled"] = True
+            if verdict not in (CONTINUE, STATUS_ACTIVE, STATUS_ACTIVE_INSUFFICIENT_SCOPE):
+                message = error_message(body)
+                if message or rule is None:
+                    result["error"] = message or f"Unexpected status code: {response.status_code}"
+            return verdict
+
+    async def attempt_secret(self, provider, spec, secret, semaphore):
+        """Run the spec's probes once; returns (result, whether a request was actually sent)."""
+        result = {"secret": secret, "provider": provider}
+        sent = True
+        async with semaphore:
+            started = time.monotonic()
+            try:
+                for probe in spec["probes"]:
+                    verdict = await self.run_probe(provider, spec, probe, secret, result)
+                    if verdict != CONTINUE:
+                        break
+                result["status"] = STATUS_ERROR if verdict == CONTINUE else verdict
+            except circuit_breaker.ProviderUnavailable as e:
+                # Held back by the open circuit: nothing was sent, so it is no failure of this secret
+                sent = False
+                result["status"] = STATUS_UNAVAILABLE
+                result["error"] = str(e)
+            except httpx.TransportError as e:
+                result["status"] = STATUS_UNAVAILABLE
+                result["error"] = str(e) or type(e).__name__
+            except httpx.HTTPError as e:
+                result["status"] = STATUS_ERROR
+                result["error"] = str(e) or type(e).__name__
+            result["elapsed"] = time.monotonic() - started
+        return result, sent
+
+    async def check_secret(self, provider, secret, semaphore, deadline):
+        """Check one secret, retrying it while the provider fails to answer.
+
+        While the host's circuit is closed, a failed secret is retried with
+        backoff and reported as an error once its retries are used up. They
+        stop short of the circuit's failure threshold, so one secret the
+        provider keeps failing on cannot open the circuit by itself and stall
+        the whole run. Only while the circuit is open is the secret parked and
+        retried whenever the circuit lets a request through, until `deadline`.
+        """
+        spec = self.specs[provider]
+        base_url = self.base_url(spec, secret)
+        breaker = circuit_breaker.get_breaker(base_url)
+        max_failures = min(rate_limiter.MAX_RETRIES + 1, breaker.threshold - 1)
+        failures = 0
+        while True:
+            result, sent = await self.attempt_secret(provider, spec, secret, semaphore)
+            if result["status"] != STATUS_UNAVAILABLE:
+                return result
+            if sent:
+                failures += 1
+                if failures >= max_failures:
+                    result["status"] = STATUS_ERROR
+                    return result
+            if time.monotonic() >= deadline:
+                return result
+            if not breaker.is_open:
+                await asyncio.sleep(rate_limiter.backoff_delay(max(0, failures - 1)))
+                continue
+            while True:
+                delay = circuit_breaker.parked_delay(base_url, deadline)
+                if delay is None:
+                    return result
+                if not delay:
+                    break
+                await asyncio.sleep(delay)
+
+    async def check(self, provider, secrets, on_result=None, outage_wait=None):
+        """Validate many secrets of one provider concurrently.
+
+        Malformed secrets are rejected offline and come first; the remaining
+        results follow in input order. `on_result` is called as each result
+        arrives. Secrets whose provider is down are retried for up to
+        `outage_wait` seconds (default: the engine's) before being reported
+        as unavailable.
+        """
+        if provider in PRECHECKS:
+            rejected, secrets = split_plausible(provider, secrets)
+        else:
+            rejected = []
+        if on_result:
+            for result in rejected:
+                on_result(result)
+        if not secrets:
+            return rejected
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+        deadline = time.monotonic() + (self.outage_wait if outage_wait is None else outage_wait)
+        tasks = [asyncio.ensure_future(self.check_secret(provider, secret, semaphore, deadline))
+                 for secret in secrets]
+        try:
+            if on_result:
+                for task in asyncio.as_completed(tasks):
+                    on_result(await task)
+            return rejected + [await task for task in tasks]
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def run(self, coroutine):
+        """Run a coroutine on the engine's own event loop, from synchronous code."""
+        if self.loop is None:
+            self.loop = asyncio.new_event_loop()
+        return self.loop.run_until_complete(coroutine)
+
+    async def aclose(self):
+        for client in self.clients.values():
+            await client.aclose()
+        self.clients = {}
+
+    def close(self):
+        if self.loop is not None:
+            self.loop.run_until_complete(self.aclose())
+            self.loop.close()
+            self.loop = None